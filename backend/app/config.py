@@ -2,7 +2,7 @@
 Application configuration from environment variables
 """
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -20,6 +20,78 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "postgresql+asyncpg://localhost/visa_petition"
 
+    # Task store: "memory" (single worker) or "database" (DATABASE_URL, shared
+    # across workers; use sqlite+aiosqlite:///./tasks.db for local runs)
+    TASK_STORE: str = "memory"
+
+    # LLM admission control, per worker process (0 = unlimited)
+    LLM_MAX_IN_FLIGHT: int = 8
+    LLM_TOKENS_PER_MINUTE: int = 0
+
+    # LLM failover: consecutive failures that open a provider's circuit, how long
+    # it stays open, and seconds without Claude output before hedging with OpenAI (0 = off)
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 3
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 120
+    LLM_HEDGE_AFTER_SECONDS: float = 0
+
+    # Local caches (SQLite files under CACHE_DIR)
+    CACHE_DIR: str = ".cache"
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_MB: int = 512
+    LLM_CACHE_TTL_HOURS: float = 168
+
+    # Evidence URL cache: served as-is for URL_CACHE_TTL_HOURS, then served while
+    # revalidating in the background for URL_CACHE_STALE_HOURS more
+    URL_CACHE_ENABLED: bool = True
+    URL_CACHE_MAX_MB: int = 256
+    URL_CACHE_TTL_HOURS: float = 24
+    URL_CACHE_STALE_HOURS: float = 168
+
+    # File parsing process pool: workers, seconds per task, address-space cap per worker
+    EXTRACT_WORKERS: int = 2
+    EXTRACT_TIMEOUT_SECONDS: float = 60
+    EXTRACT_MEMORY_LIMIT_MB: int = 1536
+
+    # PDF rendering: "api2pdf" (remote, needs API2PDF_API_KEY) or "local"
+    # (PyMuPDF in PDF_LOCAL_WORKERS processes, no network)
+    PDF_ENGINE: Literal["api2pdf", "local"] = "api2pdf"
+    PDF_LOCAL_WORKERS: int = 2
+    PDF_LOCAL_TIMEOUT_SECONDS: float = 120
+    PDF_LOCAL_MEMORY_LIMIT_MB: int = 1536
+
+    # Rendered PDFs cached by document content hash; renders in flight at once
+    PDF_CACHE_ENABLED: bool = True
+    PDF_CACHE_MAX_MB: int = 512
+    PDF_RENDER_CONCURRENCY: int = 4
+
+    # Uploads: streamed to memory up to UPLOAD_SPOOL_MB per file, then to a temp
+    # file; files extracted at once per request
+    UPLOAD_MAX_FILE_MB: int = 100
+    UPLOAD_MAX_TOTAL_MB: int = 500
+    UPLOAD_SPOOL_MB: int = 2
+    UPLOAD_CONCURRENCY: int = 3
+
+    # Upload extraction results cached by content hash (SQLite under CACHE_DIR)
+    EXTRACT_CACHE_ENABLED: bool = True
+    EXTRACT_CACHE_MAX_MB: int = 512
+
+    # OCR of scanned PDF pages (Mistral Vision): pages in flight per document
+    OCR_PAGE_CONCURRENCY: int = 4
+    # Images sent to OCR are grayscale JPEGs under this many bytes and pixels on the longest side
+    OCR_IMAGE_MAX_BYTES: int = 700_000
+    OCR_IMAGE_MAX_SIDE_PX: int = 2200
+    OCR_TIMEOUT_SECONDS: float = 120
+
+    # Curated domain tiers (JSON, see app/data/domain_tiers.json; None = bundled file)
+    DOMAIN_TIERS_FILE: Optional[str] = None
+
+    # Outbound HTTP (shared pooled clients, one pool per client profile)
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 50
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30
+    HTTP_PER_HOST_LIMIT: int = 4
+
     # CORS
     CORS_ORIGINS: str = "*"
 
@@ -2,15 +2,15 @@
 Visa Petition Generator V2 - FastAPI Application
 """
 import uuid
+import json
 import asyncio
-from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Optional
 from contextlib import asynccontextmanager
 import logging
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
 import io
 import zipfile
 
@@ -28,10 +28,26 @@ from app.models import (
     BackgroundResponse,
 )
 from app.services.generator import generate_all_documents
+from app.services.task_store import create_task_store, CheckpointWriter, ProgressReporter
 from app.services.perplexity import lookup_beneficiary
-from app.services.file_processor import process_file
-from app.services.ai_client import generate_text
-from app.services.pdf_converter import convert_to_pdf, convert_documents_to_pdf
+from app.services.knowledge_base import kb_cache
+from app.services.kb_index import get_index, index_stats
+from app.services.extraction_pool import extraction_pool
+from app.services.file_processor import extraction_cache_stats
+from app.services.upload_stream import NDJSONResponse, UploadError, check_upload_request, process_uploads
+from app.services.http_client import http_clients
+from app.services.url_cache import url_cache
+from app.services.url_fetcher import fetch_stats
+from app.services.ai_client import generate_text, llm_cache, provider_health
+from app.services.llm_scheduler import current_case, llm_scheduler
+from app.services.pdf_converter import (
+    cached_pdf,
+    convert_documents_to_pdf,
+    document_filename,
+    pdf_available,
+    pdf_cache_stats,
+    pdf_pool,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -41,8 +57,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# In-memory task storage (use Redis/DB for production)
-tasks: Dict[str, dict] = {}
+# Case state and documents (see TASK_STORE setting)
+task_store = create_task_store()
 
 
 @asynccontextmanager
@@ -54,9 +70,19 @@ async def lifespan(app: FastAPI):
         await init_db()
         logger.info("Database initialized")
     except Exception as e:
+        if settings.TASK_STORE == "database":
+            raise
         logger.warning(f"Database init skipped: {e}")
+    # Compile every visa type's knowledge base and load (or build) the
+    # retrieval index before the first request needs them
+    await asyncio.to_thread(kb_cache.warm)
+    await asyncio.to_thread(get_index)
+    await http_clients.open()
     yield
     logger.info("Shutting down...")
+    await http_clients.aclose()
+    extraction_pool.shutdown()
+    pdf_pool.shutdown()
 
 
 app = FastAPI(
@@ -107,7 +133,38 @@ async def root():
 @app.get("/health")
 async def health():
     """Health check for Railway/deployment"""
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "llm_providers": provider_health(),
+        "knowledge_base": kb_cache.stats(),
+        "knowledge_index": index_stats(),
+    }
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Cache and scheduling counters for this worker"""
+    return {
+        "llm_cache": await llm_cache.astats() if llm_cache else None,
+        "llm_scheduler": llm_scheduler.stats(),
+        "http": http_clients.stats(),
+        "url_fetcher": fetch_stats,
+        "url_cache": await url_cache.stats() if url_cache else None,
+        "extraction_pool": extraction_pool.stats(),
+        "pdf_engine": settings.PDF_ENGINE,
+        "pdf_pool": pdf_pool.stats(),
+    }
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Size and hit rates of this worker's caches"""
+    return {
+        "extractions": await extraction_cache_stats(),
+        "url_pages": await url_cache.stats() if url_cache else None,
+        "llm_responses": await llm_cache.astats() if llm_cache else None,
+        "rendered_pdfs": await pdf_cache_stats(),
+    }
 
 
 @app.post("/api/generate", response_model=GenerateResponse)
@@ -122,17 +179,7 @@ async def start_generation(
     case_id = str(uuid.uuid4())
 
     # Initialize task state
-    tasks[case_id] = {
-        "case_id": case_id,
-        "status": "processing",
-        "progress": 0,
-        "current_stage": "Initializing",
-        "current_message": "Starting document generation...",
-        "documents": None,
-        "error_message": None,
-        "created_at": datetime.utcnow(),
-        "completed_at": None,
-    }
+    await task_store.create(case_id, request)
 
     # Start background generation
     background_tasks.add_task(run_generation, case_id, request)
@@ -146,41 +193,75 @@ async def start_generation(
     )
 
 
-async def run_generation(case_id: str, request: GenerateRequest):
+async def run_generation(
+    case_id: str,
+    request: GenerateRequest,
+    checkpoints: Optional[Dict[str, str]] = None,
+):
     """Background task that runs the full generation pipeline"""
+    # Tags every LLM request made below (including from spawned tasks) for fair-share scheduling
+    current_case.set(case_id)
+    update_progress = ProgressReporter(task_store, case_id)
+    save_checkpoint = CheckpointWriter(task_store, case_id)
     try:
-        def update_progress(stage: str, progress: int, message: str):
-            tasks[case_id]["progress"] = progress
-            tasks[case_id]["current_stage"] = stage
-            tasks[case_id]["current_message"] = message
-
-        result = await generate_all_documents(request, update_progress)
+        result = await generate_all_documents(
+            request,
+            update_progress,
+            checkpoints=checkpoints,
+            on_checkpoint=save_checkpoint,
+        )
 
-        tasks[case_id]["status"] = "completed"
-        tasks[case_id]["progress"] = 100
-        tasks[case_id]["current_stage"] = "Complete"
-        tasks[case_id]["current_message"] = "All 8 documents generated!"
-        tasks[case_id]["documents"] = result["documents"]
-        tasks[case_id]["completed_at"] = datetime.utcnow()
+        await save_checkpoint.flush()
+        await update_progress.flush()
+        await task_store.complete(case_id, result["documents"])
 
         logger.info(f"Generation complete for case {case_id}")
 
     except Exception as e:
         logger.error(f"Generation failed for case {case_id}: {e}")
-        tasks[case_id]["status"] = "failed"
-        tasks[case_id]["error_message"] = str(e)
-        tasks[case_id]["current_stage"] = "Error"
-        tasks[case_id]["current_message"] = f"Generation failed: {str(e)}"
+        await save_checkpoint.flush()
+        await update_progress.flush()
+        await task_store.fail(case_id, str(e))
+
+
+@app.post("/api/resume/{case_id}", response_model=GenerateResponse)
+async def resume_generation(case_id: str, background_tasks: BackgroundTasks):
+    """
+    Re-run a failed case, generating only the documents (and Doc 1 parts)
+    that did not finish last time.
+    """
+    task = await task_store.get_status(case_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    if task["status"] != "failed":
+        raise HTTPException(status_code=409, detail=f"Case is {task['status']}, only failed cases can be resumed")
+
+    request = await task_store.get_request(case_id)
+    if request is None:
+        raise HTTPException(status_code=409, detail="Case can no longer be resumed")
+
+    checkpoints = await task_store.get_checkpoints(case_id)
+    if not await task_store.restart(case_id):
+        raise HTTPException(status_code=409, detail="Case is already being resumed")
+
+    background_tasks.add_task(run_generation, case_id, request, checkpoints)
+
+    logger.info(f"Resuming case {case_id} with {len(checkpoints)} checkpoints: {', '.join(sorted(checkpoints))}")
+
+    return GenerateResponse(
+        case_id=case_id,
+        status="processing",
+        message=f"Resuming generation, reusing {len(checkpoints)} finished documents and parts.",
+    )
 
 
 @app.get("/api/status/{case_id}", response_model=StatusResponse)
 async def get_status(case_id: str):
     """Get generation progress and status"""
-    if case_id not in tasks:
+    task = await task_store.get_status(case_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Case not found")
 
-    task = tasks[case_id]
-
     return StatusResponse(
         case_id=case_id,
         status=task["status"],
@@ -188,15 +269,7 @@ async def get_status(case_id: str):
         current_stage=task["current_stage"],
         current_message=task.get("current_message"),
         error_message=task.get("error_message"),
-        documents=[
-            {
-                "number": d["number"],
-                "name": d["name"],
-                "word_count": d["word_count"],
-                "page_count": d["page_count"],
-            }
-            for d in task["documents"]
-        ] if task.get("documents") else None,
+        documents=task.get("documents"),
         created_at=task["created_at"],
         completed_at=task.get("completed_at"),
     )
@@ -260,6 +333,8 @@ Generate the background summary now:"""
             prompt=prompt,
             max_tokens=2000,
             temperature=0.7,
+            # Sampled for variety: a cached answer would return the same text every time
+            use_cache=False,
         )
 
         word_count = len(background.split())
@@ -280,44 +355,73 @@ Generate the background summary now:"""
 
 
 @app.post("/api/upload", response_model=UploadResponse)
-async def upload_files(
-    files: List[UploadFile] = File(...),
-):
+async def upload_files(http_request: Request):
     """
     Upload and process files (PDF, DOCX, TXT, images).
-    Returns extracted text for each file.
+
+    The multipart body is streamed to spooled temp files with size limits
+    enforced as it arrives, and files are extracted as soon as they are
+    received. With `Accept: application/x-ndjson` one JSON line is streamed
+    back per file as it completes (see process_uploads for the events);
+    otherwise extracted text for all files is returned together.
     """
-    processed = []
-    failed = []
+    try:
+        check_upload_request(http_request, settings.UPLOAD_MAX_TOTAL_MB * 1024 * 1024)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
-    for file in files:
-        try:
-            content = await file.read()
-            result = await process_file(file.filename, content)
+    events = process_uploads(http_request)
 
-            processed.append({
-                "filename": result["filename"],
-                "file_type": result["file_type"],
-                "extracted_text": result["extracted_text"],
-                "word_count": result["word_count"],
-            })
+    if "application/x-ndjson" in http_request.headers.get("accept", ""):
+        async def lines():
+            async for event in events:
+                yield json.dumps(event) + "\n"
 
-            logger.info(f"Processed file: {file.filename} ({result['word_count']} words)")
+        return NDJSONResponse(lines())
 
-        except Exception as e:
-            logger.error(f"Failed to process {file.filename}: {e}")
-            failed.append({
-                "filename": file.filename,
-                "error": str(e),
-            })
+    processed = []
+    failed = []
+    try:
+        async for event in events:
+            if event["event"] == "error":
+                raise HTTPException(status_code=event["status_code"], detail=event["error"])
+            if event["event"] == "failed":
+                failed.append(event)
+            elif event["event"] == "file":
+                processed.append(event)
+    finally:
+        await events.aclose()
+
+    # Completion order -> upload order
+    processed.sort(key=lambda event: event["index"])
+    failed.sort(key=lambda event: event["index"])
 
     return UploadResponse(
         success=len(processed) > 0,
-        files=processed,
-        failed=failed if failed else None,
+        files=[
+            {
+                "filename": event["filename"],
+                "file_type": event["file_type"],
+                "extracted_text": event["extracted_text"],
+                "word_count": event["word_count"],
+            }
+            for event in processed
+        ],
+        failed=[{"filename": event["filename"], "error": event["error"]} for event in failed] or None,
     )
 
 
+async def load_completed_documents(case_id: str) -> list:
+    """Documents for a completed case, raising 404/400 if missing or not ready"""
+    task = await task_store.get_status(case_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    if task["status"] != "completed" or not task.get("documents"):
+        raise HTTPException(status_code=400, detail="Documents not ready")
+
+    return await task_store.get_documents(case_id)
+
+
 @app.get("/api/download/{case_id}")
 async def download_all(case_id: str, format: str = "pdf"):
     """
@@ -326,39 +430,29 @@ async def download_all(case_id: str, format: str = "pdf"):
     Query params:
         format: "pdf" (default) or "txt"
     """
-    if case_id not in tasks:
-        raise HTTPException(status_code=404, detail="Case not found")
-
-    task = tasks[case_id]
-    if task["status"] != "completed" or not task.get("documents"):
-        raise HTTPException(status_code=400, detail="Documents not ready")
-
-    # Create ZIP file in memory
-    zip_buffer = io.BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for doc in task["documents"]:
-            doc_name = doc['name'].replace(' ', '_')
-
-            if format == "pdf" and settings.API2PDF_API_KEY:
-                # Convert to PDF
-                pdf_bytes = await convert_to_pdf(
-                    content=doc["content"],
-                    filename=f"Document_{doc['number']}_{doc_name}.pdf"
-                )
-                if pdf_bytes:
-                    zip_file.writestr(f"Document_{doc['number']}_{doc_name}.pdf", pdf_bytes)
-                else:
-                    # Fallback to text if PDF fails
-                    zip_file.writestr(f"Document_{doc['number']}_{doc_name}.txt", doc["content"])
-            else:
-                # Text format
-                zip_file.writestr(f"Document_{doc['number']}_{doc_name}.txt", doc["content"])
-
-    zip_buffer.seek(0)
-
-    return StreamingResponse(
-        zip_buffer,
+    documents = await load_completed_documents(case_id)
+
+    if format == "pdf" and pdf_available():
+        # Rendered concurrently, or straight from the PDF cache on re-download
+        files = await convert_documents_to_pdf(documents)
+    else:
+        files = [
+            {"filename": document_filename(doc, "txt"), "content": doc["content"].encode("utf-8"), "format": "txt"}
+            for doc in documents
+        ]
+
+    def build_zip() -> bytes:
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+            for file in files:
+                # PDFs are already compressed; deflating them again only costs CPU
+                compression = zipfile.ZIP_STORED if file["format"] == "pdf" else zipfile.ZIP_DEFLATED
+                zip_file.writestr(file["filename"], file["content"], compress_type=compression)
+        return zip_buffer.getvalue()
+
+    # Sent as one body: streaming a BytesIO iterates it line by line through the threadpool
+    return Response(
+        await asyncio.to_thread(build_zip),
         media_type="application/zip",
         headers={
             "Content-Disposition": f"attachment; filename=visa_petition_{case_id}.zip"
@@ -374,41 +468,33 @@ async def download_document(case_id: str, doc_number: int, format: str = "pdf"):
     Query params:
         format: "pdf" (default) or "txt"
     """
-    if case_id not in tasks:
-        raise HTTPException(status_code=404, detail="Case not found")
-
-    task = tasks[case_id]
-    if task["status"] != "completed" or not task.get("documents"):
-        raise HTTPException(status_code=400, detail="Documents not ready")
+    documents = await load_completed_documents(case_id)
 
     # Find document
-    doc = next((d for d in task["documents"] if d["number"] == doc_number), None)
+    doc = next((d for d in documents if d["number"] == doc_number), None)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    doc_name = doc['name'].replace(' ', '_')
-
-    if format == "pdf" and settings.API2PDF_API_KEY:
-        # Convert to PDF
-        pdf_bytes = await convert_to_pdf(
+    if format == "pdf" and pdf_available():
+        pdf_bytes = await cached_pdf(
             content=doc["content"],
-            filename=f"Document_{doc['number']}_{doc_name}.pdf"
+            filename=document_filename(doc, "pdf")
         )
         if pdf_bytes:
-            return StreamingResponse(
-                io.BytesIO(pdf_bytes),
+            return Response(
+                pdf_bytes,
                 media_type="application/pdf",
                 headers={
-                    "Content-Disposition": f"attachment; filename=Document_{doc['number']}_{doc_name}.pdf"
+                    "Content-Disposition": f"attachment; filename={document_filename(doc, 'pdf')}"
                 },
             )
 
     # Text format (fallback or explicit)
-    return StreamingResponse(
-        io.BytesIO(doc["content"].encode()),
+    return Response(
+        doc["content"].encode(),
         media_type="text/plain",
         headers={
-            "Content-Disposition": f"attachment; filename=Document_{doc['number']}_{doc_name}.txt"
+            "Content-Disposition": f"attachment; filename={document_filename(doc, 'txt')}"
         },
     )
 
@@ -14,7 +14,7 @@ from app.models.schemas import (
     BackgroundRequest,
     BackgroundResponse,
 )
-from app.models.db_models import Base, Case, Document, CaseURL, CaseFile
+from app.models.db_models import Base, Case, Document, CaseURL, CaseFile, CaseCheckpoint
 
 __all__ = [
     "VisaType",
@@ -36,4 +36,5 @@ __all__ = [
     "Document",
     "CaseURL",
     "CaseFile",
+    "CaseCheckpoint",
 ]
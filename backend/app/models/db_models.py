@@ -1,8 +1,7 @@
 """
 SQLAlchemy database models
 """
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Index
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Index, UniqueConstraint, Uuid
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import uuid
@@ -13,7 +12,7 @@ Base = declarative_base()
 class Case(Base):
     __tablename__ = "cases"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
     # Beneficiary Info
     beneficiary_name = Column(String(255), nullable=False)
@@ -45,6 +44,7 @@ class Case(Base):
     documents = relationship("Document", back_populates="case", cascade="all, delete-orphan")
     urls = relationship("CaseURL", back_populates="case", cascade="all, delete-orphan")
     files = relationship("CaseFile", back_populates="case", cascade="all, delete-orphan")
+    checkpoints = relationship("CaseCheckpoint", back_populates="case", cascade="all, delete-orphan")
 
     __table_args__ = (
         Index("idx_cases_status", "status"),
@@ -54,8 +54,8 @@ class Case(Base):
 class Document(Base):
     __tablename__ = "documents"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    case_id = Column(UUID(as_uuid=True), ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    case_id = Column(Uuid(as_uuid=True), ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
 
     document_number = Column(Integer, nullable=False)
     document_name = Column(String(100), nullable=False)
@@ -76,8 +76,8 @@ class Document(Base):
 class CaseURL(Base):
     __tablename__ = "case_urls"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    case_id = Column(UUID(as_uuid=True), ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    case_id = Column(Uuid(as_uuid=True), ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
 
     url = Column(Text, nullable=False)
     title = Column(String(500))
@@ -99,8 +99,8 @@ class CaseURL(Base):
 class CaseFile(Base):
     __tablename__ = "case_files"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    case_id = Column(UUID(as_uuid=True), ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    case_id = Column(Uuid(as_uuid=True), ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
 
     filename = Column(String(255), nullable=False)
     file_type = Column(String(50))
@@ -116,3 +116,23 @@ class CaseFile(Base):
     __table_args__ = (
         Index("idx_files_case", "case_id"),
     )
+
+
+class CaseCheckpoint(Base):
+    """Original request and partial results kept so a failed case can be resumed"""
+    __tablename__ = "case_checkpoints"
+
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    case_id = Column(Uuid(as_uuid=True), ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
+
+    key = Column(String(50), nullable=False)
+    content = Column(Text, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    case = relationship("Case", back_populates="checkpoints")
+
+    __table_args__ = (
+        UniqueConstraint("case_id", "key", name="uq_checkpoints_case_key"),
+    )
@@ -1,13 +1,27 @@
 """
 AI Client with Claude primary + OpenAI fallback
 """
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional, Tuple
+
 import anthropic
+import httpx
 import openai
 from app.config import settings
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.disk_cache import DiskCache
+from app.services.llm_scheduler import llm_scheduler, estimate_tokens
 import logging
 
 logger = logging.getLogger(__name__)
 
+CLAUDE_MODEL = "claude-sonnet-4-5-20250929"
+OPENAI_MODEL = "gpt-4o"
+OPENAI_MAX_TOKENS = 16384  # GPT-4o limit
+
 # Initialize clients
 claude_client = anthropic.AsyncAnthropic(
     api_key=settings.ANTHROPIC_API_KEY,
@@ -19,11 +33,250 @@ if settings.OPENAI_API_KEY:
     openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the provider is unhealthy: timeouts, connection
+    failures, rate limiting (429) and server errors (5xx). Bad requests,
+    auth errors and unusable responses do not.
+    """
+    if isinstance(error, (
+        anthropic.APIConnectionError,  # includes APITimeoutError
+        openai.APIConnectionError,
+        httpx.TransportError,
+        asyncio.TimeoutError,
+    )):
+        return True
+    if isinstance(error, (anthropic.APIStatusError, openai.APIStatusError)):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+# Per-provider breakers: after repeated failures or timeouts, calls skip the
+# provider for a cool-down instead of waiting out the client timeout each time
+claude_breaker = CircuitBreaker(
+    "claude",
+    failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+    cooldown_seconds=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+    is_failure=is_provider_failure,
+)
+openai_breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+    cooldown_seconds=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+    is_failure=is_provider_failure,
+)
+hedge_stats = {"sent": 0, "won_by_claude": 0, "won_by_openai": 0}
+
+
+class AllProvidersFailedError(Exception):
+    """Raised when neither Claude nor the OpenAI fallback produced a response"""
+
+# Responses keyed by everything that determines them, so re-running a case
+# with unchanged evidence does not pay for the same calls again
+llm_cache: Optional[DiskCache] = None
+if settings.LLM_CACHE_ENABLED:
+    llm_cache = DiskCache(
+        Path(settings.CACHE_DIR) / "llm_responses.sqlite3",
+        max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+        ttl_seconds=settings.LLM_CACHE_TTL_HOURS * 3600,
+        name="llm_responses",
+    )
+
+
+def cache_key(model: str, system_prompt: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    """Content hash of a completion request"""
+    payload = json.dumps([model, system_prompt, prompt, temperature, max_tokens])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def cache_get(*keys: str) -> Optional[str]:
+    try:
+        value = await llm_cache.aget_first(list(keys))
+    except Exception as e:
+        logger.warning(f"LLM cache read failed: {e}")
+        return None
+    return value.decode("utf-8") if value is not None else None
+
+
+async def cache_set(key: str, text: str):
+    try:
+        await llm_cache.aset(key, text.encode("utf-8"))
+    except Exception as e:
+        logger.warning(f"LLM cache write failed: {e}")
+
+
+def build_user_content(prompt: str, cached_prefix: str = ""):
+    """
+    Claude user message content. A cached prefix becomes its own text block
+    carrying a cache breakpoint, so the system prompt plus prefix are served
+    from Anthropic's prompt cache on every call that repeats them byte-for-byte.
+    """
+    if not cached_prefix:
+        return prompt
+    return [
+        {"type": "text", "text": cached_prefix, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": prompt},
+    ]
+
+
+def provider_health() -> dict:
+    """Circuit breaker state per provider, for the health endpoint"""
+    return {
+        "claude": claude_breaker.stats(),
+        "openai": openai_breaker.stats() if openai_client else None,
+        "hedging": {"after_seconds": settings.LLM_HEDGE_AFTER_SECONDS, **hedge_stats},
+    }
+
+
+def join_prompt(prompt: str, cached_prefix: str = "") -> str:
+    """Flat prompt text with the stable prefix first (OpenAI caches repeated prefixes automatically)"""
+    return f"{cached_prefix}\n\n{prompt}" if cached_prefix else prompt
+
+
+async def call_claude(
+    prompt: str,
+    system_prompt: str,
+    max_tokens: int,
+    temperature: float,
+    cached_prefix: str = "",
+    first_token: Optional[asyncio.Event] = None,
+) -> str:
+    """
+    Single Claude request; raises on any failure or non-text response.
+    When `first_token` is given the response is streamed and the event is set
+    as soon as the first text arrives.
+    """
+    logger.info("Calling Claude Sonnet 4.5...")
+    request = dict(
+        model=CLAUDE_MODEL,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        system=system_prompt if system_prompt else anthropic.NOT_GIVEN,
+        messages=[{"role": "user", "content": build_user_content(prompt, cached_prefix)}]
+    )
+
+    if first_token is None:
+        response = await claude_client.messages.create(**request)
+    else:
+        async with claude_client.messages.stream(**request) as stream:
+            async for _ in stream.text_stream:
+                first_token.set()
+            response = await stream.get_final_message()
+
+    if cached_prefix:
+        usage = response.usage
+        logger.info(
+            f"Claude prompt cache: {getattr(usage, 'cache_read_input_tokens', 0) or 0} read, "
+            f"{getattr(usage, 'cache_creation_input_tokens', 0) or 0} written, "
+            f"{usage.input_tokens} uncached input tokens"
+        )
+
+    if response.content and response.content[0].type == "text":
+        logger.info(f"Claude succeeded, generated {len(response.content[0].text)} chars")
+        return response.content[0].text
+
+    raise Exception("Claude returned non-text response")
+
+
+async def call_openai(
+    prompt: str,
+    system_prompt: str,
+    max_tokens: int,
+    temperature: float,
+) -> str:
+    """Single OpenAI request; raises on any failure"""
+    logger.info("Calling OpenAI GPT-4o...")
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+
+    response = await openai_client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        max_tokens=min(max_tokens, OPENAI_MAX_TOKENS),
+        temperature=temperature,
+    )
+
+    content = response.choices[0].message.content
+    logger.info(f"OpenAI succeeded, generated {len(content)} chars")
+    return content
+
+
+async def hedged_call(
+    prompt: str,
+    system_prompt: str,
+    max_tokens: int,
+    temperature: float,
+    cached_prefix: str,
+) -> Tuple[str, str]:
+    """
+    Claude request hedged with OpenAI: if Claude has not streamed any text
+    within LLM_HEDGE_AFTER_SECONDS, an OpenAI request is started as well and
+    the first successful response wins (the other one is cancelled).
+
+    Returns:
+        (text, provider) where provider is "claude" or "openai"
+
+    Raises:
+        The Claude error if Claude failed before a hedge was sent,
+        AllProvidersFailedError if both requests failed
+    """
+    first_token = asyncio.Event()
+    claude_task = asyncio.create_task(claude_breaker.call(call_claude(
+        prompt, system_prompt, max_tokens, temperature, cached_prefix, first_token=first_token
+    )))
+    token_wait = asyncio.create_task(first_token.wait())
+    tasks = {claude_task: "claude"}
+
+    try:
+        await asyncio.wait(
+            [claude_task, token_wait],
+            timeout=settings.LLM_HEDGE_AFTER_SECONDS,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if not claude_task.done() and not first_token.is_set() and openai_breaker.allow():
+            logger.warning(
+                f"Claude sent nothing within {settings.LLM_HEDGE_AFTER_SECONDS:g}s, "
+                f"hedging with OpenAI GPT-4o"
+            )
+            hedge_stats["sent"] += 1
+            openai_task = asyncio.create_task(openai_breaker.call(call_openai(
+                join_prompt(prompt, cached_prefix), system_prompt, max_tokens, temperature
+            )))
+            tasks[openai_task] = "openai"
+
+        errors = {}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if len(tasks) > 1:
+                        hedge_stats[f"won_by_{tasks[task]}"] += 1
+                    return task.result(), tasks[task]
+                errors[tasks[task]] = task.exception()
+
+        if "openai" not in errors:
+            raise errors["claude"]
+        raise AllProvidersFailedError(
+            f"Both AI providers failed. Claude: {errors['claude']}, OpenAI: {errors['openai']}"
+        )
+
+    finally:
+        token_wait.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(token_wait, *tasks, return_exceptions=True)
+
+
 async def generate_text(
     prompt: str,
     system_prompt: str = "",
     max_tokens: int = 16384,
     temperature: float = 0.3,
+    use_cache: bool = True,
+    cached_prefix: str = "",
 ) -> str:
     """
     Generate text using Claude with OpenAI fallback.
@@ -33,59 +286,73 @@ async def generate_text(
         system_prompt: Optional system instructions
         max_tokens: Maximum tokens to generate
         temperature: Randomness (0.0 - 1.0)
+        use_cache: Set False to skip the response cache lookup (the fresh
+            response still replaces the cached one)
+        cached_prefix: Optional content sent before `prompt` and marked for
+            provider prompt caching. Pass the identical string on every call
+            that shares it (e.g. the evidence + knowledge base context).
 
     Returns:
         Generated text content
     """
     claude_error = None
+    full_prompt = join_prompt(prompt, cached_prefix)
 
-    # Try Claude first
-    try:
-        logger.info("Calling Claude Sonnet 4.5...")
-        response = await claude_client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=max_tokens,
-            temperature=temperature,
-            system=system_prompt if system_prompt else anthropic.NOT_GIVEN,
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        if response.content and response.content[0].type == "text":
-            logger.info(f"Claude succeeded, generated {len(response.content[0].text)} chars")
-            return response.content[0].text
+    claude_key = cache_key(CLAUDE_MODEL, system_prompt, full_prompt, temperature, max_tokens)
+    openai_key = cache_key(OPENAI_MODEL, system_prompt, full_prompt, temperature, min(max_tokens, OPENAI_MAX_TOKENS))
 
-        raise Exception("Claude returned non-text response")
+    if llm_cache and use_cache:
+        cached = await cache_get(claude_key, openai_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit, {len(cached)} chars")
+            return cached
 
-    except Exception as e:
-        claude_error = e
-        logger.warning(f"Claude failed: {e}")
+    # Every provider attempt (including the fallback) holds one scheduler slot
+    async with llm_scheduler.slot(estimate_tokens(system_prompt, full_prompt)):
+        # Try Claude first, unless its circuit is open and there is somewhere else to go
+        if not openai_client or claude_breaker.allow():
+            try:
+                if openai_client and settings.LLM_HEDGE_AFTER_SECONDS > 0:
+                    text, provider = await hedged_call(prompt, system_prompt, max_tokens, temperature, cached_prefix)
+                else:
+                    text = await claude_breaker.call(
+                        call_claude(prompt, system_prompt, max_tokens, temperature, cached_prefix)
+                    )
+                    provider = "claude"
+                if llm_cache:
+                    await cache_set(claude_key if provider == "claude" else openai_key, text)
+                return text
+            except AllProvidersFailedError as e:
+                logger.error(str(e))
+                raise
+            except Exception as e:
+                claude_error = e
+                logger.warning(f"Claude failed: {e}")
+        else:
+            claude_error = CircuitOpenError("Claude circuit open")
+            logger.warning("Claude circuit open, going straight to OpenAI")
 
-    # Fallback to OpenAI if available
-    if not openai_client:
-        logger.error("OpenAI not configured, cannot fallback")
-        raise claude_error
-
-    try:
-        logger.info("Falling back to OpenAI GPT-4o...")
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
-
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=min(max_tokens, 16384),  # GPT-4o limit
-            temperature=temperature,
-        )
+        # Fallback to OpenAI if available
+        if not openai_client:
+            logger.error("OpenAI not configured, cannot fallback")
+            raise claude_error
 
-        content = response.choices[0].message.content
-        logger.info(f"OpenAI succeeded, generated {len(content)} chars")
-        return content
+        if not openai_breaker.allow():
+            raise AllProvidersFailedError(
+                f"Both AI providers failed. Claude: {claude_error}, OpenAI: circuit open"
+            )
 
-    except Exception as openai_error:
-        logger.error(f"OpenAI also failed: {openai_error}")
-        raise Exception(f"Both AI providers failed. Claude: {claude_error}, OpenAI: {openai_error}")
+        try:
+            logger.info("Falling back to OpenAI GPT-4o...")
+            text = await openai_breaker.call(call_openai(full_prompt, system_prompt, max_tokens, temperature))
+            if llm_cache:
+                await cache_set(openai_key, text)
+            return text
+        except Exception as openai_error:
+            logger.error(f"OpenAI also failed: {openai_error}")
+            raise AllProvidersFailedError(
+                f"Both AI providers failed. Claude: {claude_error}, OpenAI: {openai_error}"
+            )
 
 
 async def generate_text_streaming(
@@ -100,7 +367,7 @@ async def generate_text_streaming(
     """
     try:
         async with claude_client.messages.stream(
-            model="claude-sonnet-4-5-20250929",
+            model=CLAUDE_MODEL,
             max_tokens=max_tokens,
             temperature=temperature,
             system=system_prompt if system_prompt else anthropic.NOT_GIVEN,
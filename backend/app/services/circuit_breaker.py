@@ -0,0 +1,134 @@
+"""
+Circuit Breaker - Stops calling a failing provider for a cool-down window
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+
+    closed    -> calls pass through; `failure_threshold` failures in a row open it
+    open      -> calls are refused until `cooldown_seconds` have passed
+    half_open -> a single trial call is let through; success closes the
+                 circuit, failure re-opens it for another cool-down
+
+    Args:
+        name: Provider label used in logs and stats
+        failure_threshold: Consecutive failures (including timeouts) that open the circuit
+        cooldown_seconds: How long the circuit stays open before a trial call
+        is_failure: Decides which exceptions count against the provider (default:
+            all). Others, such as a rejected request, are re-raised unrecorded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        cooldown_seconds: float,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self.errors_not_counted = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now (claims the trial slot when half-open)"""
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            self.state = HALF_OPEN
+
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            logger.info(f"[{self.name}] circuit half-open, sending trial request")
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"[{self.name}] circuit closed")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self, error: BaseException):
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self._trial_in_flight = False
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+                logger.warning(
+                    f"[{self.name}] circuit opened after {self.consecutive_failures} consecutive "
+                    f"failures, cooling down {self.cooldown_seconds:.0f}s: {self.last_error}"
+                )
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        # An abandoned call (e.g. a hedge that lost the race) says nothing about
+        # provider health; just free the trial slot if it held it
+        self._trial_in_flight = False
+
+    async def call(self, awaitable: Awaitable[T]) -> T:
+        """Await a provider call, recording its outcome. The caller must have checked allow()."""
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            self.record_cancelled()
+            raise
+        except Exception as e:
+            if self.is_failure is None or self.is_failure(e):
+                self.record_failure(e)
+            else:
+                # The provider answered; the request itself was at fault
+                self.errors_not_counted += 1
+                self.record_cancelled()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.cooldown_seconds - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_in_seconds": retry_in,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "errors_not_counted": self.errors_not_counted,
+            "last_error": self.last_error,
+        }
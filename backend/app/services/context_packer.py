@@ -0,0 +1,217 @@
+"""
+Context Packer - Fits prompt inputs into a per-document token budget
+
+Inputs are packed in priority order: upstream documents, knowledge base,
+tier-1 URLs, uploaded files, then the remaining URLs. In the first pass each
+item gets at most its own cap; whatever budget is left is then handed back to
+truncated items in the same order. Items that do not fit at all are dropped
+and reported.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Packing priorities (lower is packed first)
+PRIORITY_UPSTREAM = 0
+PRIORITY_KB = 1
+PRIORITY_TIER1_URL = 2
+PRIORITY_FILE = 3
+PRIORITY_TIER2_URL = 4
+PRIORITY_OTHER_URL = 5
+
+# Token estimate used for budgeting. Provider tokenizers are not available
+# locally, and ~4 characters per token holds for English prose on both Claude and GPT-4o
+CHARS_PER_TOKEN = 4
+
+# A remnant smaller than this is dropped rather than included as a stub
+MIN_ITEM_TOKENS = 50
+
+TRUNCATION_MARK = "..."
+
+
+def count_tokens(text: str) -> int:
+    """Estimated token count of `text`"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens`, at a word boundary, marking the cut"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return text[:cut].rstrip() + TRUNCATION_MARK
+
+
+def url_priority(tier: Optional[int]) -> int:
+    """Packing priority of an evidence URL by its publication tier"""
+    if tier == 1:
+        return PRIORITY_TIER1_URL
+    if tier == 2:
+        return PRIORITY_TIER2_URL
+    return PRIORITY_OTHER_URL
+
+
+@dataclass
+class PackItem:
+    group: str
+    name: str
+    text: str
+    priority: int
+    cap: Optional[int]
+    order: int
+    tokens: int
+    kept_tokens: int = 0
+
+
+class PackedContext:
+    """Result of ContextPacker.pack(); items keep the order they were added in"""
+
+    def __init__(self, label: str, budget: int, items: List[PackItem]):
+        self.label = label
+        self.budget = budget
+        self.items = items
+
+    @property
+    def used_tokens(self) -> int:
+        return sum(i.kept_tokens for i in self.items)
+
+    @property
+    def dropped(self) -> List[PackItem]:
+        return [i for i in self.items if i.kept_tokens == 0 and i.tokens > 0]
+
+    @property
+    def truncated(self) -> List[PackItem]:
+        return [i for i in self.items if 0 < i.kept_tokens < i.tokens]
+
+    def texts(self, group: str) -> List[str]:
+        """Packed texts of one group (truncated where needed, dropped items omitted)"""
+        return [
+            truncate_tokens(i.text, i.kept_tokens)
+            for i in self.items
+            if i.group == group and i.kept_tokens > 0
+        ]
+
+    def join(self, group: str, separator: str = "\n\n") -> str:
+        return separator.join(self.texts(group))
+
+    def included(self, group: str) -> List[int]:
+        """Positions (in the order added to the group) of the items that were kept"""
+        items = [i for i in self.items if i.group == group]
+        return [n for n, item in enumerate(items) if item.kept_tokens > 0]
+
+    def report(self) -> Dict:
+        """Token usage plus what was truncated or dropped, per group"""
+        groups: Dict[str, Dict] = {}
+        for item in self.items:
+            g = groups.setdefault(item.group, {"items": 0, "kept": 0, "tokens": 0, "kept_tokens": 0})
+            g["items"] += 1
+            g["tokens"] += item.tokens
+            g["kept_tokens"] += item.kept_tokens
+            if item.kept_tokens:
+                g["kept"] += 1
+        return {
+            "label": self.label,
+            "budget": self.budget,
+            "used_tokens": self.used_tokens,
+            "groups": groups,
+            "truncated": [
+                {"group": i.group, "name": i.name, "kept_tokens": i.kept_tokens, "tokens": i.tokens}
+                for i in self.truncated
+            ],
+            "dropped": [
+                {"group": i.group, "name": i.name, "tokens": i.tokens}
+                for i in self.dropped
+            ],
+        }
+
+    def log_summary(self):
+        dropped = self.dropped
+        truncated = self.truncated
+        message = (
+            f"{self.label} context: {self.used_tokens:,}/{self.budget:,} tokens, "
+            f"{len(truncated)} truncated, {len(dropped)} dropped"
+        )
+        if dropped:
+            dropped_tokens = sum(i.tokens for i in dropped)
+            names = ", ".join(f"{i.group}:{i.name}" for i in dropped[:10])
+            more = f" (+{len(dropped) - 10} more)" if len(dropped) > 10 else ""
+            message += f" ({dropped_tokens:,} tokens): {names}{more}"
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+
+class ContextPacker:
+    """
+    Collects prompt inputs for one document and fits them into `budget` tokens.
+
+    Args:
+        label: Document name used in the log report
+        budget: Total tokens available to all packed inputs
+    """
+
+    def __init__(self, label: str, budget: int):
+        self.label = label
+        self.budget = budget
+        self._items: List[PackItem] = []
+
+    def add(
+        self,
+        group: str,
+        name: str,
+        text: str,
+        priority: int,
+        cap: Optional[int] = None,
+    ):
+        """
+        Add one input.
+
+        Args:
+            group: Section the text belongs to (e.g. "kb", "urls", "files", "doc1")
+            name: Identifier used when reporting truncation or drops
+            text: Full text; it is cut to fit, never padded
+            priority: One of the PRIORITY_* constants (lower is packed first)
+            cap: Tokens this item may take before leftovers are shared out (None = no cap)
+        """
+        self._items.append(PackItem(
+            group=group,
+            name=name,
+            text=text or "",
+            priority=priority,
+            cap=cap,
+            order=len(self._items),
+            tokens=count_tokens(text or ""),
+        ))
+
+    def pack(self) -> PackedContext:
+        """Allocate the budget, log what was dropped, and return the packed context"""
+        ranked = sorted(self._items, key=lambda i: (i.priority, i.order))
+        remaining = self.budget
+
+        # Pass 1: everyone up to their own cap, in priority order
+        for item in ranked:
+            want = item.tokens if item.cap is None else min(item.tokens, item.cap)
+            take = min(want, remaining)
+            if take < min(MIN_ITEM_TOKENS, item.tokens):
+                continue
+            item.kept_tokens = take
+            remaining -= take
+
+        # Pass 2: leftover budget extends truncated items, still in priority order
+        for item in ranked:
+            if remaining < MIN_ITEM_TOKENS:
+                break
+            if item.kept_tokens == 0:
+                continue
+            extra = min(item.tokens - item.kept_tokens, remaining)
+            item.kept_tokens += extra
+            remaining -= extra
+
+        packed = PackedContext(self.label, self.budget, self._items)
+        packed.log_summary()
+        return packed
@@ -0,0 +1,88 @@
+"""
+Near-Duplicate Detection - Word shingles + bottom-k MinHash for KB paragraphs
+
+Hashes are crc32 (not Python's per-process hash()), so every worker makes the
+same keep/drop decisions and produces byte-identical knowledge base text.
+"""
+import heapq
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+SHINGLE_WORDS = 5
+SKETCH_SIZE = 32       # minimum hashes kept per paragraph
+DUPLICATE_JACCARD = 0.8
+MIN_DEDUP_WORDS = 12   # headings, separators and short lines are never dropped
+
+WORD_RE = re.compile(r"\w+")
+
+K = TypeVar("K")
+
+
+def shingle_hashes(text: str) -> Set[int]:
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def sketch(text: str) -> Tuple[int, ...]:
+    """Bottom-k MinHash sketch: the SKETCH_SIZE smallest shingle hashes, sorted"""
+    return tuple(sorted(heapq.nsmallest(SKETCH_SIZE, shingle_hashes(text))))
+
+
+def estimate_jaccard(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Jaccard similarity estimated from two bottom-k sketches"""
+    union_bottom = heapq.nsmallest(SKETCH_SIZE, set(a) | set(b))
+    both = set(a) & set(b)
+    return sum(1 for h in union_bottom if h in both) / len(union_bottom)
+
+
+def is_dedupable(text: str) -> bool:
+    return len(WORD_RE.findall(text)) >= MIN_DEDUP_WORDS
+
+
+class NearDuplicateIndex(Generic[K]):
+    """
+    Remembers paragraphs seen so far and finds near-duplicates of new ones.
+    Candidates are paragraphs sharing at least one sketch hash; they are then
+    confirmed by estimated Jaccard similarity.
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_JACCARD):
+        self.threshold = threshold
+        self._sketches: Dict[K, Tuple[int, ...]] = {}
+        self._buckets: Dict[int, List[K]] = defaultdict(list)
+
+    def find(self, text: str) -> Optional[K]:
+        """Key of an earlier near-duplicate of `text`, or None"""
+        return self._find(sketch(text))
+
+    def add(self, key: K, text: str) -> Optional[K]:
+        """
+        Add `text` under `key` unless it is a near-duplicate of something
+        already added, in which case return that earlier key instead.
+        """
+        s = sketch(text)
+        duplicate = self._find(s)
+        if duplicate is not None:
+            return duplicate
+        self._sketches[key] = s
+        for h in s:
+            self._buckets[h].append(key)
+        return None
+
+    def _find(self, s: Tuple[int, ...]) -> Optional[K]:
+        seen = set()
+        for h in s:
+            for key in self._buckets.get(h, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if estimate_jaccard(s, self._sketches[key]) >= self.threshold:
+                    return key
+        return None
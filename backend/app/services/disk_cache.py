@@ -0,0 +1,176 @@
+"""
+Disk Cache - Small SQLite-backed key/value cache with TTL and LRU size eviction
+
+Safe to share between uvicorn workers (WAL mode); hit/miss counters are per process.
+Entry count and size are kept as running totals, re-read from the database
+whenever eviction runs, so another worker's writes show up at that point.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    Bytes-valued cache stored in a single SQLite file.
+
+    Args:
+        path: SQLite file path (parent directories are created)
+        max_bytes: Total value size above which least-recently-used entries are evicted
+        ttl_seconds: Entries older than this are treated as missing (None = no expiry)
+        name: Label used in logs and stats
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int,
+        ttl_seconds: Optional[float] = None,
+        name: str = "cache",
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._entries = 0
+        self._bytes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._recount()
+        return self._conn
+
+    def _recount(self):
+        self._entries, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+
+    def _deleted(self, cursor: sqlite3.Cursor, size: int):
+        if cursor.rowcount > 0:
+            self._entries -= 1
+            self._bytes -= size
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached value, or None on miss or expiry"""
+        return self.get_first([key])
+
+    def get_first(self, keys: List[str]) -> Optional[bytes]:
+        """Return the value of the first key present, counted as a single lookup"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for key in keys:
+                row = conn.execute(
+                    "SELECT value, size, created_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+
+                value, size, created_at = row
+                if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                    self._deleted(conn.execute("DELETE FROM entries WHERE key = ?", (key,)), size)
+                    conn.commit()
+                    continue
+
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: bytes):
+        """Store a value, evicting least-recently-used entries if over max_bytes"""
+        if len(value) > self.max_bytes:
+            logger.warning(f"[{self.name}] value of {len(value)} bytes exceeds cache size, not cached")
+            return
+
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            if old is None:
+                self._entries += 1
+                self._bytes += len(value)
+            else:
+                self._bytes += len(value) - old[0]
+
+            if self._bytes > self.max_bytes:
+                # Other workers may have written or evicted too: start from the real total
+                self._recount()
+                for old_key, size in conn.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed_at"
+                ).fetchall():
+                    if self._bytes <= self.max_bytes:
+                        break
+                    self._deleted(conn.execute("DELETE FROM entries WHERE key = ?", (old_key,)), size)
+                    self.evictions += 1
+
+            conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._deleted(conn.execute("DELETE FROM entries WHERE key = ?", (key,)), old[0])
+            conn.commit()
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aget_first(self, keys: List[str]) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get_first, keys)
+
+    async def aset(self, key: str, value: bytes):
+        await asyncio.to_thread(self.set, key, value)
+
+    def stats(self) -> dict:
+        """Entry count, size and this process's hit/miss counters"""
+        with self._lock:
+            self._connect()
+            count, total = self._entries, self._bytes
+
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+    async def astats(self) -> dict:
+        """stats() off the event loop (the first call opens the database)"""
+        return await asyncio.to_thread(self.stats)
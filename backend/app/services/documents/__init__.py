@@ -8,6 +8,31 @@ from app.services.documents.doc6_cover_letter import generate as generate_doc6
 from app.services.documents.doc7_checklist import generate as generate_doc7
 from app.services.documents.doc8_exhibit_guide import generate as generate_doc8
 from app.services.documents.doc9_officer_rating import generate_doc9, get_rating_criteria
+from app.services.documents import (
+    doc1_comprehensive,
+    doc2_publication,
+    doc3_url_reference,
+    doc4_legal_brief,
+    doc5_gap_analysis,
+    doc6_cover_letter,
+    doc7_checklist,
+    doc8_exhibit_guide,
+)
+
+# Generators run by the pipeline. Each module declares NUMBER, NAME, INPUTS
+# (upstream node keys passed positionally to generate()) and EST_SECONDS
+# (expected duration, used to weight progress). A module may also declare
+# PROVIDES - intermediate outputs it publishes before finishing (Doc 1's parts).
+PIPELINE_DOCUMENTS = [
+    doc1_comprehensive,
+    doc2_publication,
+    doc3_url_reference,
+    doc4_legal_brief,
+    doc5_gap_analysis,
+    doc6_cover_letter,
+    doc7_checklist,
+    doc8_exhibit_guide,
+]
 
 __all__ = [
     "generate_doc1",
@@ -20,4 +45,5 @@ __all__ = [
     "generate_doc8",
     "generate_doc9",
     "get_rating_criteria",
+    "PIPELINE_DOCUMENTS",
 ]
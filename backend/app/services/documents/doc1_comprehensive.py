@@ -5,18 +5,62 @@ Time: 5-8 minutes (multi-part generation)
 """
 from app.services.ai_client import generate_text
 from app.prompts.system import COMPREHENSIVE_ANALYSIS_SYSTEM
+from app.services.scheduler import Node, run_graph
+from app.services.kb_index import retrieve_knowledge, criterion_queries
+from app.services.context_packer import (
+    ContextPacker, truncate_tokens, url_priority, PRIORITY_KB, PRIORITY_FILE,
+)
+from typing import Callable, List, Optional
 import logging
-import asyncio
 
 logger = logging.getLogger(__name__)
 
+NUMBER = 1
+NAME = "Comprehensive Analysis"
+INPUTS = ()
+EST_SECONDS = 240
+PART_COUNT = 5
+CONTEXT_BUDGET = 40_000  # tokens of evidence + KB in the shared prefix
 
-async def generate(context: dict) -> str:
+
+def part_key(number: int) -> str:
+    """Graph key under which a finished part is published (e.g. "doc1.part1")"""
+    return f"doc1.part{number}"
+
+
+PROVIDES = tuple(part_key(n) for n in range(1, PART_COUNT + 1))
+
+# Lines worth carrying forward when later parts only get a digest of earlier ones
+SUMMARY_KEYWORDS = ("POINTS AWARDED", "SCORE", "EVIDENCE GAP", "RATIONALE", "CLASSIFICATION")
+
+
+def summarize_parts(parts: List[str], limit: int) -> str:
+    """
+    Build a compact digest of criterion-analysis parts: headings plus scoring
+    and evidence-gap lines, capped at `limit` tokens.
+    """
+    lines = []
+    for part in parts:
+        for line in part.splitlines():
+            stripped = line.strip()
+            if stripped.startswith("#") or any(k in stripped.upper() for k in SUMMARY_KEYWORDS):
+                lines.append(stripped)
+
+    digest = "\n".join(lines) if lines else "\n\n".join(parts)
+    return truncate_tokens(digest, limit)
+
+
+async def generate(
+    context: dict,
+    publish: Optional[Callable[[str, str], None]] = None,
+) -> str:
     """
     Generate Document 1: Comprehensive Analysis using multi-part generation.
 
     Args:
         context: Generation context with beneficiary info, KB, URLs, files
+        publish: Optional callback (key, text) invoked as each part completes,
+            so documents that only need Part 1 can start before the rest
 
     Returns:
         Generated document content (100+ pages)
@@ -24,23 +68,43 @@ async def generate(context: dict) -> str:
     logger.info("Generating Document 1: Comprehensive Analysis (Multi-Part)")
 
     beneficiary = context["beneficiary"]
-    knowledge_base = context.get("knowledge_base", "")[:50000]
     urls = context.get("urls", [])
     files = context.get("files", [])
 
-    # Build URL context
-    url_context = "\n\n".join([
-        f"URL {i+1}: {url.get('url', '')}\nTitle: {url.get('title', '')}\nContent: {url.get('content', '')[:2000]}..."
-        for i, url in enumerate(urls[:50])
-    ]) or "No URLs provided"
-
-    # Build file context
-    file_context = "\n\n".join([
-        f"File: {f.get('filename', '')}\n{f.get('extracted_text', '')[:3000]}..."
-        for f in files
-    ]) or "No files uploaded"
-
-    # Base context for all parts
+    # KB passages for the eligibility framework and every criterion of this visa type
+    knowledge = await retrieve_knowledge(
+        beneficiary.visa_type,
+        ["eligibility requirements evaluation framework", "scoring approval probability"]
+        + criterion_queries(beneficiary.visa_type),
+        token_budget=12_500,
+        index=context.get("kb_index"),
+    ) or context.get("knowledge_base", "")
+
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    packer.add("kb", "knowledge base", knowledge, PRIORITY_KB, cap=12_500)
+    for i, url in enumerate(urls):
+        packer.add(
+            "urls",
+            url.get("url", ""),
+            f"URL {i+1}: {url.get('url', '')}\nTitle: {url.get('title', '')}\nContent: {url.get('content', '')}",
+            url_priority(url.get("tier")),
+            cap=500,
+        )
+    for f in files:
+        packer.add(
+            "files",
+            f.get("filename", ""),
+            f"File: {f.get('filename', '')}\n{f.get('extracted_text', '')}",
+            PRIORITY_FILE,
+            cap=1_000,
+        )
+    packed = packer.pack()
+
+    knowledge_base = packed.join("kb")
+    url_context = packed.join("urls") or "No URLs provided"
+    file_context = packed.join("files") or "No files uploaded"
+
+    # Base context for all parts - sent as an identical cached prefix on every part
     base_context = f"""BENEFICIARY INFORMATION:
 - Name: {beneficiary.full_name}
 - Visa Type: {beneficiary.visa_type}
@@ -57,33 +121,77 @@ EVIDENCE URLS ANALYZED:
 KNOWLEDGE BASE:
 {knowledge_base}"""
 
-    # Generate document in multiple parts
-    parts = []
-
-    # Part 1: Executive Summary, Visa Determination, Regulatory Framework
-    logger.info("Generating Part 1: Executive Summary & Framework")
-    part1 = await generate_part1(beneficiary, base_context)
-    parts.append(part1)
-
-    # Part 2: Criteria 1-4 detailed analysis
-    logger.info("Generating Part 2: Criteria 1-4 Analysis")
-    part2 = await generate_part2(beneficiary, base_context, part1)
-    parts.append(part2)
-
-    # Part 3: Criteria 5-8 detailed analysis
-    logger.info("Generating Part 3: Criteria 5-8 Analysis")
-    part3 = await generate_part3(beneficiary, base_context, part1)
-    parts.append(part3)
-
-    # Part 4: Evidence Mapping, Scoring, Strengths
-    logger.info("Generating Part 4: Evidence Mapping & Scoring")
-    part4 = await generate_part4(beneficiary, base_context, parts)
-    parts.append(part4)
+    # Parts run as a small graph: 2 and 3 only need Part 1, and 4 and 5 work
+    # from a compact digest of the criteria analysis rather than full text
+    nodes = [
+        Node(
+            key="part1",
+            run=lambda ctx: generate_part1(beneficiary, base_context),
+            label="Executive Summary & Framework",
+        ),
+        Node(
+            key="part2",
+            run=lambda ctx, part1: generate_part2(beneficiary, base_context, part1),
+            inputs=("part1",),
+            label="Criteria 1-4 Analysis",
+        ),
+        Node(
+            key="part3",
+            run=lambda ctx, part1: generate_part3(beneficiary, base_context, part1),
+            inputs=("part1",),
+            label="Criteria 5-8 Analysis",
+        ),
+        Node(
+            key="part4",
+            run=lambda ctx, part2, part3: generate_part4(
+                beneficiary, base_context, summarize_parts([part2, part3], 750)
+            ),
+            inputs=("part2", "part3"),
+            label="Evidence Mapping & Scoring",
+        ),
+        Node(
+            key="part5",
+            run=lambda ctx, part2, part3: generate_part5(
+                beneficiary, base_context, summarize_parts([part2, part3], 500)
+            ),
+            inputs=("part2", "part3"),
+            label="Recommendations & Conclusion",
+        ),
+    ]
+    durations = {}
+
+    def on_part_start(node: Node):
+        logger.info(f"Generating Doc 1 {node.key}: {node.label}")
+
+    def on_part_done(node: Node, text: str, duration: float):
+        durations[node.key] = duration
+        if publish:
+            publish(part_key(int(node.key[len("part"):])), text)
+
+    # Parts checkpointed by an earlier, interrupted run are not generated again
+    checkpoints = context.get("checkpoints", {})
+    restored = {
+        f"part{n}": checkpoints[part_key(n)]
+        for n in range(1, PART_COUNT + 1)
+        if part_key(n) in checkpoints
+    }
+    if restored:
+        logger.info(f"Doc 1: restored {', '.join(sorted(restored))} from checkpoint")
+
+    results = await run_graph(
+        nodes,
+        {},
+        on_start=on_part_start,
+        on_done=on_part_done,
+        completed=restored,
+        fail_fast=False,
+    )
+    parts = [results[f"part{n}"] for n in range(1, PART_COUNT + 1)]
 
-    # Part 5: Weaknesses, Recommendations, Conclusion
-    logger.info("Generating Part 5: Recommendations & Conclusion")
-    part5 = await generate_part5(beneficiary, base_context, parts)
-    parts.append(part5)
+    logger.info(
+        "Document 1 part timings: "
+        + ", ".join(f"{key} {seconds:.1f}s" for key, seconds in sorted(durations.items()))
+    )
 
     # Combine all parts
     result = "\n\n".join(parts)
@@ -99,8 +207,6 @@ async def generate_part1(beneficiary, base_context: str) -> str:
     """Generate Executive Summary, Visa Determination, and Regulatory Framework."""
     prompt = f"""You are an expert immigration law analyst generating PART 1 of a comprehensive {beneficiary.visa_type} visa petition analysis.
 
-{base_context}
-
 CRITICAL RULES:
 1. ONLY reference evidence actually provided - never fabricate
 2. If evidence is missing, clearly state it
@@ -169,6 +275,7 @@ TARGET LENGTH: This section should be approximately 15-20 pages (~8,000-10,000 w
         system_prompt=COMPREHENSIVE_ANALYSIS_SYSTEM,
         max_tokens=32000,
         temperature=0.3,
+        cached_prefix=base_context,
     )
 
 
@@ -201,10 +308,8 @@ CRITERIA TO ANALYZE IN THIS SECTION:
 
     prompt = f"""You are continuing the comprehensive {beneficiary.visa_type} visa petition analysis.
 
-{base_context}
-
 PREVIOUS SECTIONS GENERATED (for context continuity):
-{part1[:5000]}...
+{truncate_tokens(part1, 1_250)}
 
 CRITICAL RULES:
 1. ONLY reference evidence actually provided - never fabricate
@@ -262,6 +367,7 @@ TARGET LENGTH: This section should be approximately 20-25 pages (~10,000-12,000
         system_prompt=COMPREHENSIVE_ANALYSIS_SYSTEM,
         max_tokens=32000,
         temperature=0.3,
+        cached_prefix=base_context,
     )
 
 
@@ -293,10 +399,8 @@ CRITERIA TO ANALYZE IN THIS SECTION:
 
     prompt = f"""You are continuing the comprehensive {beneficiary.visa_type} visa petition analysis.
 
-{base_context}
-
 CONTEXT FROM EARLIER SECTIONS:
-{part1[:3000]}...
+{truncate_tokens(part1, 750)}
 
 CRITICAL RULES:
 1. ONLY reference evidence actually provided - never fabricate achievements
@@ -350,20 +454,17 @@ TARGET LENGTH: Approximately 20-25 pages (~10,000-12,000 words). Do NOT abbrevia
         system_prompt=COMPREHENSIVE_ANALYSIS_SYSTEM,
         max_tokens=32000,
         temperature=0.3,
+        cached_prefix=base_context,
     )
 
 
-async def generate_part4(beneficiary, base_context: str, previous_parts: list) -> str:
+async def generate_part4(beneficiary, base_context: str, criteria_summary: str) -> str:
     """Generate Evidence Mapping, Scoring Summary, and Strengths Analysis."""
 
-    criteria_summary = previous_parts[1][:3000] if len(previous_parts) > 1 else ""
-
     prompt = f"""You are continuing the comprehensive {beneficiary.visa_type} visa petition analysis.
 
-{base_context}
-
 CRITERIA ANALYSIS SUMMARY (for reference):
-{criteria_summary}...
+{criteria_summary}
 
 CRITICAL RULES:
 1. Be consistent with previous analysis
@@ -454,21 +555,17 @@ TARGET LENGTH: Approximately 20-25 pages (~10,000-12,000 words). Provide maximum
         system_prompt=COMPREHENSIVE_ANALYSIS_SYSTEM,
         max_tokens=32000,
         temperature=0.3,
+        cached_prefix=base_context,
     )
 
 
-async def generate_part5(beneficiary, base_context: str, previous_parts: list) -> str:
+async def generate_part5(beneficiary, base_context: str, scoring_summary: str) -> str:
     """Generate Weaknesses, Recommendations, and Conclusion."""
 
-    # Get summary of previous analysis
-    scoring_summary = previous_parts[-1][:2000] if previous_parts else ""
-
     prompt = f"""You are completing the comprehensive {beneficiary.visa_type} visa petition analysis.
 
-{base_context}
-
 PREVIOUS ANALYSIS SUMMARY:
-{scoring_summary}...
+{scoring_summary}
 
 CRITICAL RULES:
 1. Be consistent with previous sections
@@ -592,4 +689,5 @@ TARGET LENGTH: Approximately 30-35 pages (~15,000-17,000 words). This is the fin
         system_prompt=COMPREHENSIVE_ANALYSIS_SYSTEM,
         max_tokens=32000,
         temperature=0.3,
+        cached_prefix=base_context,
     )
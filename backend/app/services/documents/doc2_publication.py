@@ -5,25 +5,18 @@ Time: 2-3 minutes
 """
 from app.services.ai_client import generate_text
 from app.prompts.system import PUBLICATION_ANALYSIS_SYSTEM
+from app.services.kb_index import retrieve_knowledge
+from app.services.domain_tiers import domain_tiers
+from app.services.context_packer import ContextPacker, url_priority, PRIORITY_KB, PRIORITY_UPSTREAM
 import logging
 
 logger = logging.getLogger(__name__)
 
-
-def get_domain_tier(domain: str) -> int:
-    """Get tier number for a domain"""
-    domain_lower = domain.lower()
-
-    tier_1 = ["espn.com", "bbc.com", "cnn.com", "nytimes.com", "wsj.com", "reuters.com", "foxsports.com"]
-    tier_2 = ["ufc.com", "sherdog.com", "tapology.com", "mmajunkie.com", "linkedin.com", "wikipedia.org"]
-
-    for d in tier_1:
-        if d in domain_lower:
-            return 1
-    for d in tier_2:
-        if d in domain_lower:
-            return 2
-    return 3
+NUMBER = 2
+NAME = "Publication Analysis"
+INPUTS = ("doc1.part1",)
+EST_SECONDS = 150
+CONTEXT_BUDGET = 27_000
 
 
 async def generate(context: dict, doc1: str) -> str:
@@ -32,7 +25,7 @@ async def generate(context: dict, doc1: str) -> str:
 
     Args:
         context: Generation context
-        doc1: Comprehensive analysis (for reference)
+        doc1: Comprehensive analysis Part 1 (for reference)
 
     Returns:
         Generated document content
@@ -42,24 +35,47 @@ async def generate(context: dict, doc1: str) -> str:
     beneficiary = context["beneficiary"]
     urls = context.get("urls", [])
 
-    # Sort and limit URLs
-    relevant_urls = urls[:60]
+    # Fit URLs into the budget, tier 1 first
+    # Tiers were assigned when the URLs were fetched
+    tiers = [url.get("tier") or domain_tiers.tier(url.get("domain", "")) for url in urls]
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    packer.add("doc1", "doc1.part1", doc1, PRIORITY_UPSTREAM, cap=1_250)
+    packer.add(
+        "kb",
+        "knowledge base",
+        await retrieve_knowledge(
+            beneficiary.visa_type,
+            ["published material professional major media", "publication tier circulation significance"],
+            token_budget=2_000,
+            index=context.get("kb_index"),
+        ),
+        PRIORITY_KB,
+        cap=2_000,
+    )
+    for i, (url, tier) in enumerate(zip(urls, tiers)):
+        packer.add(
+            "urls",
+            url.get("url", ""),
+            f"""URL {i+1}:
+- Link: {url.get('url', '')}
+- Domain: {url.get('domain', '')}
+- Title: {url.get('title', '')}
+- Tier: {tier}
+- Content Preview: {url.get('content', '')}""",
+            url_priority(tier),
+            cap=375,
+        )
+    packed = packer.pack()
+    kept = packed.included("urls")
+    relevant_urls = [urls[i] for i in kept]
 
     # Categorize by tier
-    tier_1 = [u for u in relevant_urls if get_domain_tier(u.get("domain", "")) == 1]
-    tier_2 = [u for u in relevant_urls if get_domain_tier(u.get("domain", "")) == 2]
-    tier_3 = [u for u in relevant_urls if get_domain_tier(u.get("domain", "")) == 3]
+    tier_1 = [i for i in kept if tiers[i] == 1]
+    tier_2 = [i for i in kept if tiers[i] == 2]
+    tier_3 = [i for i in kept if tiers[i] == 3]
 
     # Build URL details
-    url_details = "\n\n".join([
-        f"""URL {i+1}:
-- Link: {url.get('url', '')}
-- Domain: {url.get('domain', '')}
-- Title: {url.get('title', '')}
-- Tier: {get_domain_tier(url.get('domain', ''))}
-- Content Preview: {url.get('content', '')[:1500]}..."""
-        for i, url in enumerate(relevant_urls)
-    ])
+    url_details = packed.join("urls")
 
     prompt = f"""You are an expert at evaluating publication significance for {beneficiary.visa_type} visa petitions.
 
@@ -97,7 +113,10 @@ PUBLICATIONS/MEDIA TO ANALYZE:
 {url_details}
 
 CONTEXT FROM COMPREHENSIVE ANALYSIS:
-{doc1[:5000]}
+{packed.join("doc1")}
+
+PUBLICATION STANDARDS (from knowledge base):
+{packed.join("kb") or "None available"}
 
 YOUR TASK:
 Generate a 40+ page PUBLICATION SIGNIFICANCE ANALYSIS following this EXACT structure:
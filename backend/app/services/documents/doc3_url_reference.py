@@ -4,11 +4,18 @@ Target: 10+ pages, 5,000+ words
 Time: 1-2 minutes
 """
 from app.services.ai_client import generate_text
+from app.services.context_packer import ContextPacker, url_priority
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+NUMBER = 3
+NAME = "URL Reference"
+INPUTS = ()
+EST_SECONDS = 90
+CONTEXT_BUDGET = 10_000
+
 
 async def generate(context: dict) -> str:
     """
@@ -26,10 +33,15 @@ async def generate(context: dict) -> str:
     urls = context.get("urls", [])
 
     # Build URL list
-    url_list = "\n".join([
-        f"{i+1}. {url.get('url', '')} - {url.get('title', 'Untitled')}"
-        for i, url in enumerate(urls)
-    ])
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    for i, url in enumerate(urls):
+        packer.add(
+            "urls",
+            url.get("url", ""),
+            f"{i+1}. {url.get('url', '')} - {url.get('title', 'Untitled')}",
+            url_priority(url.get("tier")),
+        )
+    url_list = packer.pack().join("urls", "\n")
 
     prompt = f"""Create a URL REFERENCE DOCUMENT organizing all evidence URLs by criterion for {beneficiary.full_name}'s {beneficiary.visa_type} petition.
 
@@ -6,11 +6,19 @@ Time: 4-6 minutes (multi-part for comprehensive)
 from app.services.ai_client import generate_text
 from app.prompts.system import TEMPLATE_ENFORCEMENT_PROMPT, LEGAL_BRIEF_SYSTEM
 from app.services.knowledge_base import get_criteria_for_visa_type
+from app.services.kb_index import retrieve_knowledge, criterion_queries
+from app.services.context_packer import ContextPacker, PRIORITY_KB, PRIORITY_UPSTREAM
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+NUMBER = 4
+NAME = "Legal Brief"
+INPUTS = ("doc1.part1", "doc2")
+EST_SECONDS = 300
+CONTEXT_BUDGET = 10_000
+
 
 async def generate(context: dict, doc1: str, doc2: str) -> str:
     """
@@ -18,7 +26,7 @@ async def generate(context: dict, doc1: str, doc2: str) -> str:
 
     Args:
         context: Generation context
-        doc1: Comprehensive analysis
+        doc1: Comprehensive analysis Part 1 (executive summary and framework)
         doc2: Publication analysis
 
     Returns:
@@ -27,9 +35,21 @@ async def generate(context: dict, doc1: str, doc2: str) -> str:
     logger.info("Generating Document 4: Legal Brief")
 
     beneficiary = context["beneficiary"]
-    knowledge_base = context.get("knowledge_base", "")[:20000]
     is_standard = beneficiary.brief_type == "standard"
 
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    packer.add("doc1", "doc1.part1", doc1, PRIORITY_UPSTREAM, cap=2_000)
+    packer.add("doc2", "doc2", doc2, PRIORITY_UPSTREAM, cap=1_250)
+    # Regulatory language for each criterion plus the overall legal standard
+    knowledge = await retrieve_knowledge(
+        beneficiary.visa_type,
+        criterion_queries(beneficiary.visa_type) + ["legal brief regulatory standard final merits"],
+        token_budget=5_000,
+        index=context.get("kb_index"),
+    ) or context.get("knowledge_base", "")
+    packer.add("kb", "knowledge base", knowledge, PRIORITY_KB, cap=5_000)
+    packed = packer.pack()
+
     # Get criteria for this visa type
     criteria = get_criteria_for_visa_type(beneficiary.visa_type)
 
@@ -100,13 +120,13 @@ Evidence for this criterion has been included in this petition. All relevant evi
 - **Comparable Evidence Available**: {'YES' if has_comparable else 'NO'}
 
 ## KNOWLEDGE BASE (Regulations):
-{knowledge_base}
+{packed.join("kb")}
 
 ## ANALYSIS SUMMARY (from Document 1):
-{doc1[:8000]}
+{packed.join("doc1")}
 
 ## PUBLICATION DATA (from Document 2):
-{doc2[:5000]}
+{packed.join("doc2")}
 
 ## STRICT STRUCTURE REQUIREMENTS
 
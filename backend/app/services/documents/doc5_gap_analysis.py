@@ -4,10 +4,18 @@ Target: 25-35 pages, 15,000+ words
 Time: 3-4 minutes
 """
 from app.services.ai_client import generate_text
+from app.services.kb_index import retrieve_knowledge
+from app.services.context_packer import ContextPacker, PRIORITY_KB, PRIORITY_UPSTREAM
 import logging
 
 logger = logging.getLogger(__name__)
 
+NUMBER = 5
+NAME = "Evidence Gap Analysis"
+INPUTS = ("doc1.part1",)
+EST_SECONDS = 210
+CONTEXT_BUDGET = 3_500
+
 
 async def generate(context: dict, doc1: str) -> str:
     """
@@ -15,7 +23,7 @@ async def generate(context: dict, doc1: str) -> str:
 
     Args:
         context: Generation context
-        doc1: Comprehensive analysis
+        doc1: Comprehensive analysis Part 1 (executive summary and framework)
 
     Returns:
         Generated document content
@@ -23,6 +31,22 @@ async def generate(context: dict, doc1: str) -> str:
     logger.info("Generating Document 5: Evidence Gap Analysis")
 
     beneficiary = context["beneficiary"]
+
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    packer.add("doc1", "doc1.part1", doc1, PRIORITY_UPSTREAM, cap=2_000)
+    packer.add(
+        "kb",
+        "knowledge base",
+        await retrieve_knowledge(
+            beneficiary.visa_type,
+            ["evidence gap weakness request for evidence RFE", "documentation strategy strengthen case"],
+            token_budget=1_500,
+            index=context.get("kb_index"),
+        ),
+        PRIORITY_KB,
+        cap=1_500,
+    )
+    packed = packer.pack()
     urls = context.get("urls", [])
     files = context.get("files", [])
 
@@ -47,7 +71,10 @@ Evidence provided:
 - Files: {len(files)}
 
 # PREVIOUS ANALYSIS
-{doc1[:8000]}
+{packed.join("doc1")}
+
+# RFE AND EVIDENCE GUIDANCE (from knowledge base)
+{packed.join("kb") or "None available"}
 
 # DOCUMENT STRUCTURE
 
@@ -4,11 +4,18 @@ Target: 2-3 pages
 Time: 1 minute
 """
 from app.services.ai_client import generate_text
+from app.services.context_packer import ContextPacker, PRIORITY_UPSTREAM
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+NUMBER = 6
+NAME = "Cover Letter"
+INPUTS = ("doc1.part1",)
+EST_SECONDS = 60
+CONTEXT_BUDGET = 750
+
 
 async def generate(context: dict, doc1: str) -> str:
     """
@@ -16,7 +23,7 @@ async def generate(context: dict, doc1: str) -> str:
 
     Args:
         context: Generation context
-        doc1: Comprehensive analysis (for summary)
+        doc1: Comprehensive analysis Part 1 (for summary)
 
     Returns:
         Generated document content
@@ -25,6 +32,10 @@ async def generate(context: dict, doc1: str) -> str:
 
     beneficiary = context["beneficiary"]
 
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    packer.add("doc1", "doc1.part1", doc1, PRIORITY_UPSTREAM)
+    packed = packer.pack()
+
     # Determine form type based on visa
     form_type = "I-140" if "EB" in beneficiary.visa_type else "I-129"
     service_center = "I-140 Unit" if "EB" in beneficiary.visa_type else "I-129 Nonimmigrant Classifications"
@@ -44,7 +55,7 @@ Petitioner Address: {beneficiary.petitioner_address or '[Petitioner Address]'}
 Petitioner Phone: {beneficiary.petitioner_phone or '[Petitioner Phone]'}
 
 # CASE SUMMARY
-{doc1[:3000]}
+{packed.join("doc1")}
 
 # FORMAT
 
@@ -4,18 +4,26 @@ Target: 1-2 pages
 Time: 1 minute
 """
 from app.services.ai_client import generate_text
+from app.services.kb_index import retrieve_knowledge
+from app.services.context_packer import ContextPacker, PRIORITY_KB, PRIORITY_UPSTREAM
 import logging
 
 logger = logging.getLogger(__name__)
 
+NUMBER = 7
+NAME = "Visa Checklist"
+INPUTS = ("doc1.part1",)
+EST_SECONDS = 60
+CONTEXT_BUDGET = 3_000
 
-async def generate(context: dict, doc5: str) -> str:
+
+async def generate(context: dict, doc1: str) -> str:
     """
     Generate Document 7: Visa Checklist
 
     Args:
         context: Generation context
-        doc5: Gap analysis (for action items)
+        doc1: Comprehensive analysis Part 1 (for action items)
 
     Returns:
         Generated document content
@@ -23,6 +31,22 @@ async def generate(context: dict, doc5: str) -> str:
     logger.info("Generating Document 7: Visa Checklist")
 
     beneficiary = context["beneficiary"]
+
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    packer.add("doc1", "doc1.part1", doc1, PRIORITY_UPSTREAM, cap=2_000)
+    packer.add(
+        "kb",
+        "knowledge base",
+        await retrieve_knowledge(
+            beneficiary.visa_type,
+            ["filing checklist required documents forms", "minimum criteria required approval"],
+            token_budget=1_000,
+            index=context.get("kb_index"),
+        ),
+        PRIORITY_KB,
+        cap=1_000,
+    )
+    packed = packer.pack()
     urls = context.get("urls", [])
     files = context.get("files", [])
 
@@ -43,7 +67,10 @@ Field: {beneficiary.profession}
 Evidence: {len(urls)} URLs, {len(files)} files
 
 # GAP ANALYSIS CONTEXT
-{doc5[:8000]}
+{packed.join("doc1")}
+
+# FILING REQUIREMENTS (from knowledge base)
+{packed.join("kb") or "None available"}
 
 # CHECKLIST FORMAT
 
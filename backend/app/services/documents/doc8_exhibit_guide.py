@@ -4,19 +4,27 @@ Target: 10+ pages
 Time: 1-2 minutes
 """
 from app.services.ai_client import generate_text
+from app.services.context_packer import (
+    ContextPacker, url_priority, PRIORITY_FILE, PRIORITY_UPSTREAM,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+NUMBER = 8
+NAME = "Exhibit Assembly Guide"
+INPUTS = ("doc4",)
+EST_SECONDS = 90
+CONTEXT_BUDGET = 12_000
 
-async def generate(context: dict, doc4: str, urls: list) -> str:
+
+async def generate(context: dict, doc4: str) -> str:
     """
     Generate Document 8: Exhibit Assembly Guide
 
     Args:
         context: Generation context
         doc4: Legal brief
-        urls: Fetched URLs
 
     Returns:
         Generated document content
@@ -24,19 +32,25 @@ async def generate(context: dict, doc4: str, urls: list) -> str:
     logger.info("Generating Document 8: Exhibit Assembly Guide")
 
     beneficiary = context["beneficiary"]
+    urls = context.get("urls", [])
     files = context.get("files", [])
 
-    # Build URL list
-    url_list = "\n".join([
-        f"{i+1}. {url.get('url', '')} - {url.get('title', 'Untitled')}"
-        for i, url in enumerate(urls)
-    ])
-
-    # Build file list
-    file_list = "\n".join([
-        f"{i+1}. {f.get('filename', '')}"
-        for i, f in enumerate(files)
-    ])
+    packer = ContextPacker(NAME, CONTEXT_BUDGET)
+    packer.add("doc4", "doc4", doc4, PRIORITY_UPSTREAM, cap=2_000)
+    for i, url in enumerate(urls):
+        packer.add(
+            "urls",
+            url.get("url", ""),
+            f"{i+1}. {url.get('url', '')} - {url.get('title', 'Untitled')}",
+            url_priority(url.get("tier")),
+        )
+    for i, f in enumerate(files):
+        packer.add("files", f.get("filename", ""), f"{i+1}. {f.get('filename', '')}", PRIORITY_FILE)
+    packed = packer.pack()
+
+    # Build URL and file lists
+    url_list = packed.join("urls", "\n")
+    file_list = packed.join("files", "\n")
 
     prompt = f"""Create an exhibit assembly guide for a {beneficiary.visa_type} petition.
 
@@ -53,7 +67,7 @@ Visa Type: {beneficiary.visa_type}
 {file_list or 'No files uploaded'}
 
 # LEGAL BRIEF CONTEXT
-{doc4[:8000]}
+{packed.join("doc4")}
 
 # EXHIBIT GUIDE FORMAT
 
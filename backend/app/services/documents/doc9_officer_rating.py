@@ -5,6 +5,10 @@ Predicts approval likelihood and provides strategic recommendations
 
 from typing import Dict, Any, List
 
+from app.services.context_packer import ContextPacker, PRIORITY_KB, PRIORITY_UPSTREAM
+
+CONTEXT_BUDGET = 17_500
+
 
 def get_doc9_prompt(case_data: Dict[str, Any], doc1_content: str, knowledge_base: str) -> str:
     """Generate the prompt for Document 9 - USCIS Officer Rating Report"""
@@ -13,6 +17,11 @@ def get_doc9_prompt(case_data: Dict[str, Any], doc1_content: str, knowledge_base
     visa_type = case_data.get('visa_type', 'O-1A')
     field = case_data.get('field', 'their field')
 
+    packer = ContextPacker("USCIS Officer Rating Report", CONTEXT_BUDGET)
+    packer.add("doc1", "doc1", doc1_content, PRIORITY_UPSTREAM, cap=12_500)
+    packer.add("kb", "knowledge base", knowledge_base, PRIORITY_KB, cap=5_000)
+    packed = packer.pack()
+
     return f"""You are an experienced USCIS adjudication officer with 15+ years of experience evaluating extraordinary ability visa petitions. Based on the comprehensive case analysis provided, generate a detailed USCIS Officer Rating Report.
 
 ## CASE INFORMATION
@@ -21,10 +30,10 @@ def get_doc9_prompt(case_data: Dict[str, Any], doc1_content: str, knowledge_base
 - Field: {field}
 
 ## COMPREHENSIVE ANALYSIS (Document 1)
-{doc1_content[:50000]}
+{packed.join("doc1")}
 
 ## VISA KNOWLEDGE BASE
-{knowledge_base[:20000]}
+{packed.join("kb")}
 
 ---
 
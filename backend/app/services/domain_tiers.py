@@ -0,0 +1,78 @@
+"""
+Domain Tiers - Publication tier of a URL's domain from a curated data file
+
+Every listed domain goes into one dict, and a host is classified by looking
+up the host itself and then each parent domain (a.news.bbc.co.uk,
+news.bbc.co.uk, bbc.co.uk) - a handful of hash lookups however many domains
+are curated. Entries also match their subdomains but never unrelated hosts
+that merely contain them (notespn.com is not espn.com).
+"""
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIERS_FILE = Path(__file__).resolve().parent.parent / "data" / "domain_tiers.json"
+
+DEFAULT_TIER = 3
+
+
+def host_of(url_or_domain: str) -> str:
+    """Lower-cased host without port, "www." or trailing dot, from a URL or bare domain"""
+    value = (url_or_domain or "").strip().lower()
+    if "//" in value:
+        value = urlsplit(value).netloc
+    value = value.rsplit("@", 1)[-1].split("/", 1)[0].split(":", 1)[0].rstrip(".")
+    return value[4:] if value.startswith("www.") else value
+
+
+class DomainTiers:
+    """
+    Args:
+        tiers: Tier number -> {"name", "confidence", "reach", "domains"} as in
+            the data file
+    """
+
+    def __init__(self, tiers: Dict[int, dict]):
+        self.info = {tier: {k: v for k, v in spec.items() if k != "domains"} for tier, spec in tiers.items()}
+        self.domains: Dict[str, int] = {}
+        # Listed in more than one tier: the better (lower) tier wins
+        for tier in sorted(tiers, reverse=True):
+            for domain in tiers[tier].get("domains", []):
+                self.domains[host_of(domain)] = tier
+        self._lookup = lru_cache(maxsize=4096)(self._tier_of_host)
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "DomainTiers":
+        path = Path(path or settings.DOMAIN_TIERS_FILE or DEFAULT_TIERS_FILE)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        tiers = {int(tier): spec for tier, spec in data["tiers"].items()}
+        engine = cls(tiers)
+        logger.info(f"Loaded {len(engine.domains)} curated domains from {path}")
+        return engine
+
+    def _tier_of_host(self, host: str) -> int:
+        labels = host.split(".")
+        # The host, then each parent down to the last two labels (a bare TLD never matches)
+        for i in range(max(len(labels) - 1, 1)):
+            tier = self.domains.get(".".join(labels[i:]))
+            if tier is not None:
+                return tier
+        return DEFAULT_TIER
+
+    def tier(self, url_or_domain: str) -> int:
+        """Tier (1 best) of a URL or domain; unlisted domains are DEFAULT_TIER"""
+        return self._lookup(host_of(url_or_domain))
+
+    def describe(self, tier: int) -> dict:
+        """Tier metadata from the data file: name, confidence, reach"""
+        return self.info.get(tier, {})
+
+
+domain_tiers = DomainTiers.load()
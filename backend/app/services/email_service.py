@@ -4,6 +4,7 @@ Email Service - Send documents via SendGrid
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType, Disposition
 from app.config import settings
+from app.services.pdf_converter import convert_documents_to_pdf, pdf_available
 import base64
 import logging
 
@@ -45,6 +46,28 @@ async def send_documents_email(
     logger.info(f"SendGrid configured - From: {settings.SENDGRID_FROM_EMAIL}, API Key: SG.***")
 
     try:
+        # PDFs come from the shared render cache, so downloads afterwards don't render again
+        if pdf_available():
+            attachments = await convert_documents_to_pdf(documents)
+        else:
+            attachments = []
+            for idx, doc in enumerate(documents):
+                name = doc.get("name", f"Document {idx + 1}")
+                # Create safe filename
+                safe_name = "".join(c if c.isalnum() or c in " -_" else "_" for c in name)
+                attachments.append({
+                    "filename": f"{safe_name}.txt",
+                    "content": doc.get("content", "").encode(),
+                    "format": "txt",
+                })
+        if all(a["format"] == "pdf" for a in attachments):
+            attachment_note = "All documents are attached to this email as PDF files."
+        else:
+            attachment_note = (
+                "All documents are attached to this email as text files.\n"
+                "                    You can copy the content into your preferred document editor for formatting."
+            )
+
         # Create email content
         html_content = f"""
         <html>
@@ -76,13 +99,12 @@ async def send_documents_email(
                         </li>
             """
 
-        html_content += """
+        html_content += f"""
                     </ul>
                 </div>
 
                 <p style="color: #4b5563; line-height: 1.6;">
-                    All documents are attached to this email as text files.
-                    You can copy the content into your preferred document editor for formatting.
+                    {attachment_note}
                 </p>
 
                 <div style="background: #fef3c7; border-left: 4px solid #f59e0b; padding: 15px; margin: 20px 0;">
@@ -115,24 +137,17 @@ async def send_documents_email(
         )
 
         # Add documents as attachments
-        for idx, doc in enumerate(documents):
-            content = doc.get("content", "")
-            name = doc.get("name", f"Document {idx + 1}")
-
-            # Create safe filename
-            safe_name = "".join(c if c.isalnum() or c in " -_" else "_" for c in name)
-            filename = f"{safe_name}.txt"
-
+        for file in attachments:
             attachment = Attachment(
-                FileContent(base64.b64encode(content.encode()).decode()),
-                FileName(filename),
-                FileType("text/plain"),
+                FileContent(base64.b64encode(file["content"]).decode()),
+                FileName(file["filename"]),
+                FileType("application/pdf" if file["format"] == "pdf" else "text/plain"),
                 Disposition("attachment"),
             )
             message.add_attachment(attachment)
 
         # Send email
-        logger.info(f"Sending email with {len(documents)} attachments...")
+        logger.info(f"Sending email with {len(attachments)} attachments...")
         sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
         response = sg.send(message)
 
@@ -0,0 +1,131 @@
+"""
+Extraction Pool - Bounded process pool for CPU-heavy file parsing
+
+PyMuPDF and python-docx run in worker processes so a large upload cannot
+stall the event loop (and every other user's status polling). Each task has
+a timeout and each worker a memory cap; a worker that times out or dies is
+replaced by restarting the pool. The PDF converter runs its local renderer
+in a second pool of this class, named so its errors say what failed.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+import logging
+
+from app.config import settings
+from app.services.extraction_workers import limit_memory
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """A task (parsing a file, rendering a PDF) did not finish within the pool's time or memory limits"""
+
+
+class ExtractionPool:
+    """
+    Args:
+        workers: Worker processes (and tasks running at once)
+        timeout_seconds: Limit per task, counted from when it starts running
+        memory_limit_mb: Address-space cap per worker (0 = none)
+        name: What the pool does, used in logs and error messages
+    """
+
+    def __init__(self, workers: int, timeout_seconds: float, memory_limit_mb: int, name: str = "extraction"):
+        self.name = name
+        self.workers = workers
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.completed = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.restarts = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: workers must not inherit the server's threads and sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=limit_memory,
+                initargs=(self.memory_limit_mb * 1024 * 1024,),
+            )
+        return self._executor
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Kill a pool whose worker is stuck or dead; the next task starts a fresh one"""
+        if self._executor is not broken:
+            return
+        self._executor = None
+        self.restarts += 1
+        for process in list(getattr(broken, "_processes", {}).values()):
+            process.terminate()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn: Callable[..., Any], *args, label: str = "") -> Any:
+        """
+        Run `fn(*args)` in a worker process.
+
+        Raises:
+            ExtractionError: The task timed out or its worker died (e.g. hit the memory cap)
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._loop = loop
+
+        async with self._slots:
+            for attempt in range(2):
+                executor = self._pool()
+                try:
+                    future = loop.run_in_executor(executor, fn, *args)
+                    result = await asyncio.wait_for(future, self.timeout_seconds)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self._restart(executor)
+                    logger.error(f"[{self.name}] {label or fn.__name__} timed out after {self.timeout_seconds:.0f}s")
+                    raise ExtractionError(f"{self.name} timed out after {self.timeout_seconds:.0f}s")
+                except MemoryError:
+                    self.crashes += 1
+                    raise ExtractionError(f"{self.name} exceeded the {self.memory_limit_mb} MB memory limit")
+                except BrokenProcessPool:
+                    if executor is not self._executor and attempt == 0:
+                        # Another task's timeout restarted the pool under us; run again
+                        continue
+                    self.crashes += 1
+                    self._restart(executor)
+                    logger.error(f"[{self.name}] worker died on {label or fn.__name__}")
+                    raise ExtractionError(
+                        f"{self.name} worker died (memory limit {self.memory_limit_mb} MB?)"
+                    )
+                self.completed += 1
+                return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "timeout_seconds": self.timeout_seconds,
+            "memory_limit_mb": self.memory_limit_mb,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+            "restarts": self.restarts,
+        }
+
+
+extraction_pool = ExtractionPool(
+    workers=settings.EXTRACT_WORKERS,
+    timeout_seconds=settings.EXTRACT_TIMEOUT_SECONDS,
+    memory_limit_mb=settings.EXTRACT_MEMORY_LIMIT_MB,
+)
@@ -0,0 +1,159 @@
+"""
+Extraction Workers - CPU-bound parsing functions run inside the extraction pool
+
+Everything here executes in a separate worker process, so this module must
+stay importable without app settings or other services. PDFs are passed by
+file path to avoid copying large documents through the pool for every page.
+"""
+import io
+from typing import List, Tuple
+
+# OCR rendering: resolution by ink density of a low-res preview. Dense small
+# print needs more pixels; certificates with large lettering need far fewer.
+# At preview size small print blurs to mid-gray, hence the light ink threshold.
+PREVIEW_DPI = 36
+INK_LEVEL = 192
+DENSE_INK = 0.12
+SPARSE_INK = 0.03
+DPI_DENSE = 200
+DPI_NORMAL = 150
+DPI_SPARSE = 110
+JPEG_QUALITIES = (80, 65, 50)
+DOWNSCALE_STEP = 0.8
+
+# bytes.translate table: inked grayscale samples -> 1, paper -> 0
+_INK = bytes(1 if v < INK_LEVEL else 0 for v in range(256))
+
+
+def limit_memory(max_bytes: int):
+    """Pool initializer: cap the worker's address space (Unix only; 0 = no cap)"""
+    if not max_bytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+
+def pdf_text_layer(path: str) -> Tuple[int, List[str]]:
+    """(page count, stripped text layer of every page)"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as pdf:
+        return len(pdf), [page.get_text().strip() for page in pdf]
+
+
+def ink_density(pix) -> float:
+    """Fraction of inked pixels in a grayscale pixmap"""
+    samples = pix.samples
+    return samples.translate(_INK).count(1) / max(len(samples), 1)
+
+
+def choose_dpi(width_pt: float, height_pt: float, density: float, max_side_px: int) -> float:
+    """DPI for a page of this size and ink density, capped so the longest side fits max_side_px"""
+    if density >= DENSE_INK:
+        dpi = DPI_DENSE
+    elif density <= SPARSE_INK:
+        dpi = DPI_SPARSE
+    else:
+        dpi = DPI_NORMAL
+    longest_in = max(width_pt, height_pt, 1) / 72
+    return min(dpi, max_side_px / longest_in)
+
+
+def encode_under_budget(render, scale: float, max_bytes: int) -> Tuple[bytes, dict]:
+    """
+    JPEG-encode render(scale) at falling quality, then smaller scales, until
+    it fits max_bytes (the smallest attempt is returned if nothing fits).
+    `render(scale)` returns a grayscale PyMuPDF pixmap.
+    """
+    data = b""
+    info = {}
+    for _ in range(6):
+        pix = render(scale)
+        for quality in JPEG_QUALITIES:
+            data = pix.tobytes("jpeg", jpg_quality=quality)
+            info = {"width": pix.width, "height": pix.height, "quality": quality}
+            if len(data) <= max_bytes:
+                return data, info
+        scale *= DOWNSCALE_STEP
+    return data, info
+
+
+def pdf_render_page(path: str, page_num: int, max_bytes: int, max_side_px: int) -> Tuple[bytes, dict]:
+    """
+    One page rendered for OCR as a grayscale JPEG under max_bytes, at a DPI
+    chosen from the page size and its ink density.
+
+    Returns:
+        (JPEG bytes, {"dpi", "width", "height", "quality", "density"})
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as pdf:
+        page = pdf[page_num]
+        preview = page.get_pixmap(dpi=PREVIEW_DPI, colorspace=fitz.csGRAY)
+        density = ink_density(preview)
+        dpi = choose_dpi(page.rect.width, page.rect.height, density, max_side_px)
+
+        def render(scale: float):
+            zoom = dpi * scale / 72
+            return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+
+        data, info = encode_under_budget(render, 1.0, max_bytes)
+        info.update(dpi=round(dpi), density=round(density, 3))
+        return data, info
+
+
+def shrink_image(content: bytes, max_bytes: int, max_side_px: int) -> Tuple[bytes, str]:
+    """
+    An uploaded image made fit for OCR: returned unchanged when already under
+    max_bytes and max_side_px, otherwise EXIF-rotated, grayscale, downscaled
+    and JPEG-encoded under the budget.
+
+    Returns:
+        (image bytes, file extension for the MIME type, e.g. ".jpg")
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(content)) as img:
+        if len(content) <= max_bytes and max(img.size) <= max_side_px:
+            return content, ""
+        img = ImageOps.exif_transpose(img).convert("L")
+        img.thumbnail((max_side_px, max_side_px))
+
+        data = b""
+        for _ in range(6):
+            for quality in JPEG_QUALITIES:
+                buffer = io.BytesIO()
+                img.save(buffer, "JPEG", quality=quality, optimize=True)
+                data = buffer.getvalue()
+                if len(data) <= max_bytes:
+                    return data, ".jpg"
+            img = img.resize((max(1, int(img.width * DOWNSCALE_STEP)), max(1, int(img.height * DOWNSCALE_STEP))))
+        return data, ".jpg"
+
+
+def docx_text(content: bytes) -> str:
+    """Paragraph text, then table rows as "cell | cell", blank-line separated"""
+    from docx import Document
+
+    doc = Document(io.BytesIO(content))
+    text_parts = []
+
+    for para in doc.paragraphs:
+        if para.text.strip():
+            text_parts.append(para.text)
+
+    # Also extract from tables
+    for table in doc.tables:
+        for row in table.rows:
+            row_text = []
+            for cell in row.cells:
+                if cell.text.strip():
+                    row_text.append(cell.text.strip())
+            if row_text:
+                text_parts.append(" | ".join(row_text))
+
+    return "\n\n".join(text_parts)
@@ -1,17 +1,72 @@
 """
 File Processor - Extract text from uploaded files using Mistral Vision
 """
-import io
+import os
+import json
+import asyncio
 import base64
-from typing import Tuple
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
 import logging
 
 from app.config import settings
+from app.services.disk_cache import DiskCache
+from app.services.extraction_pool import ExtractionError, extraction_pool
+from app.services import extraction_workers
+from app.services.http_client import http_clients
 
 logger = logging.getLogger(__name__)
 
+OCR_MODEL = "pixtral-12b-2409"
 
-async def extract_with_mistral_vision(image_data: bytes, filename: str) -> str:
+# Placeholder texts for images that could not be OCR'd
+OCR_UNAVAILABLE_TEXT = "[Image content - Mistral API key required for OCR]"
+OCR_FAILED_TEXT = "[Image content - extraction failed]"
+
+# Page sources that mean OCR should be retried later; such results are not cached
+INCOMPLETE_SOURCES = ("ocr_failed", "ocr_unavailable")
+
+# Bump when extraction output changes, so older cached results are not served
+EXTRACTION_VERSION = 3
+
+# Results keyed by content hash: re-uploaded scans skip PyMuPDF and paid OCR
+extraction_cache: Optional[DiskCache] = None
+if settings.EXTRACT_CACHE_ENABLED:
+    extraction_cache = DiskCache(
+        Path(settings.CACHE_DIR) / "extractions.sqlite3",
+        max_bytes=settings.EXTRACT_CACHE_MAX_MB * 1024 * 1024,
+        name="extractions",
+    )
+
+# File types worth caching (plain text is decoded faster than it is hashed)
+CACHED_FILE_TYPES = ("pdf", "docx", "image")
+
+extraction_cache_counts = {"ocr_pages_saved": 0, "bytes_saved": 0}
+
+# Mistral SDK client, rebuilt if the shared HTTP client it sits on changes
+_mistral = None
+_mistral_http = None
+
+
+def get_mistral_client():
+    """Mistral client using the shared "api" connection pool"""
+    global _mistral, _mistral_http
+    from mistralai import Mistral
+
+    http = http_clients.get("api")
+    if _mistral is None or _mistral_http is not http:
+        _mistral = Mistral(
+            api_key=settings.MISTRAL_API_KEY,
+            async_client=http,
+            timeout_ms=int(settings.OCR_TIMEOUT_SECONDS * 1000),
+        )
+        _mistral_http = http
+    return _mistral
+
+
+async def extract_with_mistral_vision(image_data: bytes, filename: str) -> Optional[str]:
     """
     Use Mistral's Pixtral vision model to extract text from images/documents.
 
@@ -20,12 +75,10 @@ async def extract_with_mistral_vision(image_data: bytes, filename: str) -> str:
         filename: Original filename for context
 
     Returns:
-        Extracted text content
+        Extracted text content ("" for a blank image), or None if the request failed
     """
     try:
-        from mistralai import Mistral
-
-        client = Mistral(api_key=settings.MISTRAL_API_KEY)
+        client = get_mistral_client()
 
         # Encode image to base64
         base64_image = base64.b64encode(image_data).decode("utf-8")
@@ -41,11 +94,11 @@ async def extract_with_mistral_vision(image_data: bytes, filename: str) -> str:
         elif filename_lower.endswith(".webp"):
             mime_type = "image/webp"
         else:
-            mime_type = "image/png"  # Default for PDF pages
+            mime_type = "image/png"
 
         # Call Mistral Pixtral for OCR/text extraction
-        response = client.chat.complete(
-            model="pixtral-12b-2409",
+        response = await client.chat.complete_async(
+            model=OCR_MODEL,
             messages=[
                 {
                     "role": "user",
@@ -74,13 +127,25 @@ Return ONLY the extracted text, no commentary."""
             max_tokens=8192,
         )
 
-        extracted_text = response.choices[0].message.content
+        extracted_text = (response.choices[0].message.content or "").strip()
         logger.info(f"Mistral extracted {len(extracted_text)} chars from {filename}")
         return extracted_text
 
     except Exception as e:
         logger.error(f"Mistral vision extraction failed: {e}")
-        return ""
+        return None
+
+
+# Text layers shorter than this are treated as scanned pages and OCR'd
+SCANNED_PAGE_CHARS = 100
+
+
+def write_temp_file(content: bytes, suffix: str) -> str:
+    """Spill upload bytes to a temp file so pool workers can open it by path"""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return path
 
 
 async def extract_text_from_pdf(content: bytes, filename: str) -> Tuple[str, int]:
@@ -91,41 +156,97 @@ async def extract_text_from_pdf(content: bytes, filename: str) -> Tuple[str, int
     Returns:
         Tuple of (extracted_text, page_count)
     """
-    try:
-        import fitz  # PyMuPDF
-
-        pdf = fitz.open(stream=content, filetype="pdf")
-        text_parts = []
-        page_count = len(pdf)
+    text, page_count, _ = await extract_pdf(content, filename)
+    return text, page_count
 
-        for page_num, page in enumerate(pdf):
-            # First try regular text extraction
-            page_text = page.get_text().strip()
 
-            # If page has very little text, it might be scanned - use Mistral
-            if len(page_text) < 100 and settings.MISTRAL_API_KEY:
-                logger.info(f"Page {page_num + 1} appears scanned, using Mistral Vision")
+async def extract_pdf(content: bytes, filename: str, path: Optional[str] = None) -> Tuple[str, int, List[dict]]:
+    """
+    Extract text from PDF, recording where each page's text came from.
 
-                # Render page to image
-                mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better OCR
-                pix = page.get_pixmap(matrix=mat)
-                img_bytes = pix.tobytes("png")
+    Parsing and rendering run in the extraction process pool. Scanned pages
+    are OCR'd concurrently, at most OCR_PAGE_CONCURRENCY at a time per
+    document; each page is rendered just before its OCR call, so only
+    in-flight pages are held in memory. Pages keep their order.
 
-                # Extract with Mistral
-                page_text = await extract_with_mistral_vision(img_bytes, f"{filename}_page_{page_num}.png")
+    Args:
+        content: PDF bytes (ignored when `path` is given)
+        filename: Name for logs and OCR requests
+        path: PDF already on disk (e.g. a spooled upload); read in place, not deleted
 
-            if page_text:
-                text_parts.append(f"--- Page {page_num + 1} ---\n{page_text}")
+    Returns:
+        Tuple of (extracted_text, page_count, pages), where pages holds one
+        {"page", "source"} entry per page; source is "text" (text layer),
+        "ocr", "ocr_failed" (the OCR request failed; text layer kept) or
+        "ocr_unavailable" (scanned, but MISTRAL_API_KEY is not set)
 
-        pdf.close()
+    Raises:
+        ExtractionError: Parsing exceeded the pool's time or memory limits
+    """
+    temp_path = None
+    try:
+        if path is None:
+            path = temp_path = await asyncio.to_thread(write_temp_file, content, ".pdf")
+        page_count, page_texts = await extraction_pool.run(
+            extraction_workers.pdf_text_layer, path, label=filename
+        )
 
-        text = "\n\n".join(text_parts)
+        pages = [{"page": n + 1, "source": "text"} for n in range(page_count)]
+        scanned = [
+            n for n, page_text in enumerate(page_texts)
+            if len(page_text) < SCANNED_PAGE_CHARS
+        ]
+
+        if scanned and not settings.MISTRAL_API_KEY:
+            logger.warning(
+                f"{len(scanned)} of {page_count} pages of {filename} appear scanned, "
+                f"but MISTRAL_API_KEY is not set - keeping their text layer"
+            )
+            for page_num in scanned:
+                pages[page_num]["source"] = "ocr_unavailable"
+        elif scanned:
+            logger.info(
+                f"{len(scanned)} of {page_count} pages of {filename} appear scanned, "
+                f"using Mistral Vision ({settings.OCR_PAGE_CONCURRENCY} at a time)"
+            )
+            slots = asyncio.Semaphore(settings.OCR_PAGE_CONCURRENCY)
+
+            async def ocr_page(page_num: int) -> Optional[str]:
+                async with slots:
+                    img_bytes, render_info = await extraction_pool.run(
+                        extraction_workers.pdf_render_page, path, page_num,
+                        settings.OCR_IMAGE_MAX_BYTES, settings.OCR_IMAGE_MAX_SIDE_PX,
+                        label=f"{filename} page {page_num + 1}",
+                    )
+                    logger.info(f"Rendered {filename} page {page_num + 1} for OCR: {len(img_bytes):,} bytes {render_info}")
+                    return await extract_with_mistral_vision(img_bytes, f"{filename}_page_{page_num}.jpg")
+
+            ocr_texts = await asyncio.gather(*(ocr_page(n) for n in scanned))
+            for page_num, ocr_text in zip(scanned, ocr_texts):
+                if ocr_text is None:
+                    pages[page_num]["source"] = "ocr_failed"
+                    continue
+                # A blank page (OCR found no text) is a complete result too
+                if ocr_text:
+                    page_texts[page_num] = ocr_text
+                pages[page_num] = {"page": page_num + 1, "source": "ocr", "model": OCR_MODEL}
+
+        text = "\n\n".join(
+            f"--- Page {page_num + 1} ---\n{page_text}"
+            for page_num, page_text in enumerate(page_texts)
+            if page_text
+        )
         logger.info(f"Extracted {len(text)} chars from {page_count} page PDF")
-        return text, page_count
+        return text, page_count, pages
 
+    except ExtractionError:
+        raise
     except Exception as e:
         logger.error(f"PDF extraction failed: {e}")
-        return "", 0
+        return "", 0, []
+    finally:
+        if temp_path:
+            os.unlink(temp_path)
 
 
 async def extract_text_from_docx(content: bytes) -> Tuple[str, int]:
@@ -134,28 +255,12 @@ async def extract_text_from_docx(content: bytes) -> Tuple[str, int]:
 
     Returns:
         Tuple of (extracted_text, estimated_page_count)
+
+    Raises:
+        ExtractionError: Parsing exceeded the pool's time or memory limits
     """
     try:
-        from docx import Document
-
-        doc = Document(io.BytesIO(content))
-        text_parts = []
-
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_parts.append(para.text)
-
-        # Also extract from tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = []
-                for cell in row.cells:
-                    if cell.text.strip():
-                        row_text.append(cell.text.strip())
-                if row_text:
-                    text_parts.append(" | ".join(row_text))
-
-        text = "\n\n".join(text_parts)
+        text = await extraction_pool.run(extraction_workers.docx_text, content, label="DOCX")
 
         # Estimate pages (roughly 500 words per page)
         word_count = len(text.split())
@@ -164,6 +269,8 @@ async def extract_text_from_docx(content: bytes) -> Tuple[str, int]:
         logger.info(f"Extracted {len(text)} chars from DOCX (~{page_count} pages)")
         return text, page_count
 
+    except ExtractionError:
+        raise
     except Exception as e:
         logger.error(f"DOCX extraction failed: {e}")
         return "", 0
@@ -178,12 +285,25 @@ async def extract_text_from_image(content: bytes, filename: str) -> Tuple[str, i
     """
     if not settings.MISTRAL_API_KEY:
         logger.warning("MISTRAL_API_KEY not set - cannot process images")
-        return "[Image content - Mistral API key required for OCR]", 1
+        return OCR_UNAVAILABLE_TEXT, 1
 
-    text = await extract_with_mistral_vision(content, filename)
+    # Oversized phone photos are shrunk to the OCR budget first
+    try:
+        image, extension = await extraction_pool.run(
+            extraction_workers.shrink_image, content,
+            settings.OCR_IMAGE_MAX_BYTES, settings.OCR_IMAGE_MAX_SIDE_PX,
+            label=filename,
+        )
+    except Exception as e:
+        logger.warning(f"Could not resize {filename} for OCR, sending original: {e}")
+        image, extension = content, ""
+    if extension:
+        logger.info(f"Shrunk {filename} for OCR: {len(content):,} -> {len(image):,} bytes")
+
+    text = await extract_with_mistral_vision(image, filename + extension)
 
-    if not text:
-        return "[Image content - extraction failed]", 1
+    if text is None:
+        return OCR_FAILED_TEXT, 1
 
     return text, 1
 
@@ -213,37 +333,134 @@ async def extract_text_from_txt(content: bytes) -> Tuple[str, int]:
         return "", 0
 
 
-async def process_file(filename: str, content: bytes) -> dict:
+def file_type_of(filename: str) -> str:
+    filename_lower = filename.lower()
+    if filename_lower.endswith(".pdf"):
+        return "pdf"
+    if filename_lower.endswith((".docx", ".doc")):
+        return "docx"
+    if filename_lower.endswith((".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")):
+        return "image"
+    if filename_lower.endswith(".txt"):
+        return "txt"
+    return "unknown"
+
+
+def extraction_cache_key(file_type: str, sha256: str) -> str:
+    return f"v{EXTRACTION_VERSION}:{file_type}:{sha256}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def extraction_cache_get(key: str) -> Optional[dict]:
+    try:
+        value = await extraction_cache.aget(key)
+    except Exception as e:
+        logger.warning(f"Extraction cache read failed: {e}")
+        return None
+    return json.loads(value) if value is not None else None
+
+
+async def extraction_cache_set(key: str, entry: dict):
+    try:
+        await extraction_cache.aset(key, json.dumps(entry).encode("utf-8"))
+    except Exception as e:
+        logger.warning(f"Extraction cache write failed: {e}")
+
+
+async def extract_file(
+    file_type: str, filename: str, content: bytes, path: Optional[str] = None
+) -> Tuple[str, int, List[dict]]:
+    """(text, page_count, per-page provenance) for one file, without the cache"""
+    if file_type == "pdf":
+        return await extract_pdf(content, filename, path=path)
+    if file_type == "docx":
+        text, page_count = await extract_text_from_docx(content)
+        return text, page_count, []
+    if file_type == "image":
+        text, page_count = await extract_text_from_image(content, filename)
+        if text == OCR_UNAVAILABLE_TEXT:
+            return text, page_count, [{"page": 1, "source": "ocr_unavailable"}]
+        if text == OCR_FAILED_TEXT:
+            return text, page_count, [{"page": 1, "source": "ocr_failed"}]
+        return text, page_count, [{"page": 1, "source": "ocr", "model": OCR_MODEL}]
+    if file_type == "txt":
+        text, page_count = await extract_text_from_txt(content)
+        return text, page_count, []
+
+    logger.warning(f"Unknown file type: {filename}")
+    return "", 0, []
+
+
+async def process_file(
+    filename: str,
+    content: Optional[bytes] = None,
+    path: Optional[str] = None,
+    sha256: Optional[str] = None,
+) -> dict:
     """
     Process an uploaded file and extract text.
 
+    PDF, DOCX and image results are cached by SHA-256 of the content, so a
+    document uploaded again (for another petition or an RFE response) skips
+    parsing and OCR. Extractions with pages whose OCR failed or could not
+    run (no MISTRAL_API_KEY) are not cached, so they are redone once OCR works.
+
     Args:
         filename: Name of the file
-        content: File content as bytes
+        content: File content as bytes (None when it is on disk at `path`)
+        path: File holding the content; PDFs are parsed in place, other
+            types are only read into memory on a cache miss
+        sha256: Hex digest of the content, if already known
 
     Returns:
-        Dict with filename, file_type, extracted_text, word_count, page_count
+        Dict with filename, file_type, extracted_text, word_count, page_count,
+        file_size, pages (per-page provenance) and cache_hit
     """
-    filename_lower = filename.lower()
-
-    # Determine file type and extract
-    if filename_lower.endswith(".pdf"):
-        text, page_count = await extract_text_from_pdf(content, filename)
-        file_type = "pdf"
-    elif filename_lower.endswith((".docx", ".doc")):
-        text, page_count = await extract_text_from_docx(content)
-        file_type = "docx"
-    elif filename_lower.endswith((".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")):
-        text, page_count = await extract_text_from_image(content, filename)
-        file_type = "image"
-    elif filename_lower.endswith(".txt"):
-        text, page_count = await extract_text_from_txt(content)
-        file_type = "txt"
-    else:
-        logger.warning(f"Unknown file type: {filename}")
-        text = ""
-        page_count = 0
-        file_type = "unknown"
+    file_type = file_type_of(filename)
+    file_size = len(content) if content is not None else os.path.getsize(path)
+
+    key = None
+    if extraction_cache is not None and file_type in CACHED_FILE_TYPES and file_size:
+        if sha256 is None and content is not None:
+            sha256 = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        elif sha256 is None:
+            sha256 = await asyncio.to_thread(file_sha256, path)
+        key = extraction_cache_key(file_type, sha256)
+        cached = await extraction_cache_get(key)
+        if cached is not None:
+            ocr_pages = sum(1 for p in cached["pages"] if p["source"] == "ocr")
+            extraction_cache_counts["ocr_pages_saved"] += ocr_pages
+            extraction_cache_counts["bytes_saved"] += file_size
+            logger.info(f"Extraction cache hit for {filename} ({cached['page_count']} pages, {ocr_pages} OCR'd)")
+            return {
+                "filename": filename,
+                "file_type": file_type,
+                "extracted_text": cached["text"],
+                "word_count": len(cached["text"].split()),
+                "page_count": cached["page_count"],
+                "file_size": file_size,
+                "pages": cached["pages"],
+                "cache_hit": True,
+            }
+
+    if content is None and file_type != "pdf":
+        content = await asyncio.to_thread(Path(path).read_bytes)
+    text, page_count, pages = await extract_file(file_type, filename, content, path=path)
+
+    complete = page_count > 0 and not any(p["source"] in INCOMPLETE_SOURCES for p in pages)
+    if key is not None and complete:
+        await extraction_cache_set(key, {
+            "text": text,
+            "page_count": page_count,
+            "pages": pages,
+        })
 
     word_count = len(text.split()) if text else 0
 
@@ -253,10 +470,18 @@ async def process_file(filename: str, content: bytes) -> dict:
         "extracted_text": text,
         "word_count": word_count,
         "page_count": page_count,
-        "file_size": len(content),
+        "file_size": file_size,
+        "pages": pages,
+        "cache_hit": False,
     }
 
 
+async def extraction_cache_stats() -> Optional[dict]:
+    if extraction_cache is None:
+        return None
+    return {**await extraction_cache.astats(), **extraction_cache_counts}
+
+
 async def process_files(files: list) -> list:
     """
     Process multiple uploaded files.
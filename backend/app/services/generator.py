@@ -1,33 +1,51 @@
 """
 Document Generation Orchestrator
-Handles parallel generation of all 8 documents
+Runs all 8 documents as a dependency graph - each starts once its inputs exist
 Target: 6-7 minutes total
 """
 import asyncio
-from typing import Callable, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 import logging
 
 from app.models import GenerateRequest, BeneficiaryInfo
 from app.services.knowledge_base import load_knowledge_base
+from app.services.kb_index import KnowledgeBaseIndex, aget_index
 from app.services.url_fetcher import fetch_urls
 from app.services.file_processor import process_files
 from app.services.perplexity import lookup_beneficiary, conduct_deep_research
 from app.services.email_service import send_documents_email
-from app.services.documents import (
-    generate_doc1,
-    generate_doc2,
-    generate_doc3,
-    generate_doc4,
-    generate_doc5,
-    generate_doc6,
-    generate_doc7,
-    generate_doc8,
-)
+from app.services.documents import PIPELINE_DOCUMENTS
+from app.services.scheduler import Node, run_graph
 
 logger = logging.getLogger(__name__)
 
 ProgressCallback = Callable[[str, int, str], None]
+CheckpointCallback = Callable[[str, str], None]
+
+# Progress band covered by the document graph; preparation and finalization sit outside it
+GRAPH_START_PCT = 10
+GRAPH_END_PCT = 95
+
+
+def node_key(module) -> str:
+    """Graph key for a document generator module (e.g. "doc4")"""
+    return f"doc{module.NUMBER}"
+
+
+def build_document_graph() -> List[Node]:
+    """Build graph nodes from the INPUTS each document generator declares"""
+    return [
+        Node(
+            key=node_key(module),
+            run=module.generate,
+            inputs=tuple(module.INPUTS),
+            weight=module.EST_SECONDS,
+            label=module.NAME,
+            provides=tuple(getattr(module, "PROVIDES", ())),
+        )
+        for module in PIPELINE_DOCUMENTS
+    ]
 
 
 class GenerationContext:
@@ -39,11 +57,16 @@ class GenerationContext:
         knowledge_base: str,
         urls: list,
         files: list,
+        checkpoints: Optional[Dict[str, str]] = None,
+        kb_index: Optional[KnowledgeBaseIndex] = None,
     ):
         self.beneficiary = beneficiary
         self.knowledge_base = knowledge_base
         self.urls = urls
         self.files = files
+        self.checkpoints = checkpoints or {}
+        # Resolved once per case, so retrieval does not re-check KB files per document
+        self.kb_index = kb_index
 
     def to_dict(self) -> dict:
         return {
@@ -51,21 +74,30 @@ class GenerationContext:
             "knowledge_base": self.knowledge_base,
             "urls": self.urls,
             "files": self.files,
+            "checkpoints": self.checkpoints,
+            "kb_index": self.kb_index,
         }
 
 
 async def generate_all_documents(
     request: GenerateRequest,
     on_progress: Optional[ProgressCallback] = None,
+    checkpoints: Optional[Dict[str, str]] = None,
+    on_checkpoint: Optional[CheckpointCallback] = None,
 ) -> dict:
     """
-    Main orchestration function - generates all 8 documents with parallel execution.
+    Main orchestration function - generates all 8 documents as a dependency graph.
 
     Target time: 6-7 minutes total
 
     Args:
         request: The generation request with beneficiary info, URLs, files
         on_progress: Optional callback for progress updates
+        checkpoints: Documents and Doc 1 parts (by graph key, e.g. "doc4",
+            "doc1.part2") finished by an earlier run of this case; only the
+            missing pieces are generated
+        on_checkpoint: Optional callback (key, text) called as each document
+            and Doc 1 part finishes
 
     Returns:
         Dict with documents list and metadata
@@ -93,7 +125,7 @@ async def generate_all_documents(
     # Convert URL sources to list of URL strings
     url_strings = [u.url for u in request.urls if u.url]
 
-    urls_task = fetch_urls(url_strings) if url_strings else asyncio.coroutine(lambda: [])()
+    urls_task = fetch_urls(url_strings) if url_strings else asyncio.sleep(0, result=[])
 
     # Process uploaded files (already have extracted text)
     files_data = [
@@ -106,7 +138,7 @@ async def generate_all_documents(
         for f in request.uploaded_files
     ]
 
-    knowledge_base, fetched_urls = await asyncio.gather(kb_task, urls_task)
+    knowledge_base, kb_index, fetched_urls = await asyncio.gather(kb_task, aget_index(), urls_task)
 
     # Convert fetched URLs to dict format
     urls_dict = [
@@ -120,7 +152,7 @@ async def generate_all_documents(
         for u in fetched_urls
     ] if fetched_urls else []
 
-    progress("Preparation", 10, f"Loaded KB, fetched {len(urls_dict)} URLs")
+    progress("Preparation", GRAPH_START_PCT, f"Loaded KB, fetched {len(urls_dict)} URLs")
 
     # Build context
     context = GenerationContext(
@@ -128,52 +160,55 @@ async def generate_all_documents(
         knowledge_base=knowledge_base,
         urls=urls_dict,
         files=files_data,
+        checkpoints=checkpoints,
+        kb_index=kb_index,
     ).to_dict()
 
     # ============================================
-    # PHASE 2: DOCUMENT 1 - FOUNDATION (3-4 minutes)
-    # ============================================
-    progress("Document 1", 15, "Generating Comprehensive Analysis (this takes ~3-4 min)...")
-
-    doc1 = await generate_doc1(context)
-
-    progress("Document 1", 35, f"Comprehensive Analysis complete ({len(doc1)} chars)")
-
+    # PHASE 2: DOCUMENT GRAPH
+    # Every document starts as soon as the documents it reads are ready
     # ============================================
-    # PHASE 3: PARALLEL GENERATION (2-3 minutes)
-    # Documents 2, 3, 5, 6, 7 can run simultaneously
-    # ============================================
-    progress("Parallel", 40, "Generating 5 documents in parallel...")
-
-    doc2_task = generate_doc2(context, doc1)
-    doc3_task = generate_doc3(context)
-    doc5_task = generate_doc5(context, doc1)
-    doc6_task = generate_doc6(context, doc1)
-    doc7_task = generate_doc7(context, doc1)
-
-    doc2, doc3, doc5, doc6, doc7 = await asyncio.gather(
-        doc2_task, doc3_task, doc5_task, doc6_task, doc7_task
+    nodes = build_document_graph()
+    checkpoints = checkpoints or {}
+    total_weight = sum(n.weight for n in nodes)
+    # Documents restored from checkpoints count as already done
+    done_weight = sum(n.weight for n in nodes if n.key in checkpoints)
+
+    def graph_pct() -> int:
+        return GRAPH_START_PCT + int((GRAPH_END_PCT - GRAPH_START_PCT) * done_weight / total_weight)
+
+    if checkpoints:
+        progress("Resuming", graph_pct(), f"Reusing {len(checkpoints)} checkpointed documents and parts")
+
+    def on_node_start(node: Node):
+        progress(node.label, graph_pct(), f"Generating {node.label}...")
+
+    def on_node_done(node: Node, result: str, duration: float):
+        nonlocal done_weight
+        done_weight += node.weight
+        progress(node.label, graph_pct(), f"{node.label} complete ({len(result)} chars, {duration:.0f}s)")
+        if on_checkpoint:
+            on_checkpoint(node.key, result)
+
+    def on_node_publish(node: Node, key: str, value: str):
+        progress(node.label, graph_pct(), f"{node.label}: {key} ready")
+        if on_checkpoint:
+            on_checkpoint(key, value)
+
+    results = await run_graph(
+        nodes,
+        context,
+        on_start=on_node_start,
+        on_done=on_node_done,
+        on_publish=on_node_publish,
+        completed=checkpoints,
+        fail_fast=False,  # let independent documents finish (and checkpoint) after a failure
     )
 
-    progress("Parallel", 75, "5 documents complete")
-
     # ============================================
-    # PHASE 4: DEPENDENT DOCUMENTS (2 minutes)
-    # Document 4 needs Doc1 + Doc2
-    # Document 8 needs Doc4
+    # PHASE 3: FINALIZATION
     # ============================================
-    progress("Document 4", 80, "Generating Legal Brief...")
-
-    doc4 = await generate_doc4(context, doc1, doc2)
-
-    progress("Document 8", 90, "Generating Exhibit Guide...")
-
-    doc8 = await generate_doc8(context, doc4, urls_dict)
-
-    # ============================================
-    # PHASE 5: FINALIZATION
-    # ============================================
-    progress("Finalizing", 95, "Preparing documents...")
+    progress("Finalizing", GRAPH_END_PCT, "Preparing documents...")
 
     def get_stats(content: str) -> dict:
         words = len(content.split()) if content else 0
@@ -181,14 +216,13 @@ async def generate_all_documents(
         return {"word_count": words, "page_count": pages}
 
     documents = [
-        {"number": 1, "name": "Comprehensive Analysis", "content": doc1, **get_stats(doc1)},
-        {"number": 2, "name": "Publication Analysis", "content": doc2, **get_stats(doc2)},
-        {"number": 3, "name": "URL Reference", "content": doc3, **get_stats(doc3)},
-        {"number": 4, "name": "Legal Brief", "content": doc4, **get_stats(doc4)},
-        {"number": 5, "name": "Evidence Gap Analysis", "content": doc5, **get_stats(doc5)},
-        {"number": 6, "name": "Cover Letter", "content": doc6, **get_stats(doc6)},
-        {"number": 7, "name": "Visa Checklist", "content": doc7, **get_stats(doc7)},
-        {"number": 8, "name": "Exhibit Assembly Guide", "content": doc8, **get_stats(doc8)},
+        {
+            "number": module.NUMBER,
+            "name": module.NAME,
+            "content": results[node_key(module)],
+            **get_stats(results[node_key(module)]),
+        }
+        for module in sorted(PIPELINE_DOCUMENTS, key=lambda m: m.NUMBER)
     ]
 
     # Send email if provided
@@ -0,0 +1,131 @@
+"""
+HTML Extractor - Single-pass readable text and title extraction
+
+Built on the standard library's incremental HTMLParser: the document is fed
+in slices and parsing stops as soon as enough text has been collected, so
+cost is bounded by the content cap rather than the page size.
+"""
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+# Subtrees whose text is never content
+SKIP_TAGS = frozenset({"script", "style", "nav", "footer", "noscript", "template", "svg"})
+
+# Tags that do not break a word ("<b>Gold</b>medal" stays "Goldmedal")
+INLINE_TAGS = frozenset({
+    "a", "abbr", "b", "bdi", "bdo", "cite", "code", "data", "dfn", "em", "i", "kbd",
+    "mark", "q", "s", "samp", "small", "span", "strong", "sub", "sup", "time", "u", "var",
+})
+
+FEED_CHARS = 64 * 1024
+
+
+class TextExtractor(HTMLParser):
+    """
+    Collects whitespace-collapsed visible text up to `max_chars`, plus the
+    page's <title> and og:title. `done` turns true once the cap is reached.
+    """
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.size = 0
+        self.done = False
+        self.title: Optional[str] = None
+        self.og_title: Optional[str] = None
+        self._skip_depth = 0
+        self._in_title = False
+        self._title_parts: List[str] = []
+        self._break = False  # a word break is pending before the next text
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title" and not self._skip_depth:
+            # An inline SVG's <title> labels the icon, not the page
+            self._in_title = True
+        elif tag == "meta" and self.og_title is None:
+            values = dict(attrs)
+            if (values.get("property") or values.get("name") or "").lower() == "og:title":
+                self.og_title = (values.get("content") or "").strip() or None
+        if tag not in INLINE_TAGS:
+            self._break = True
+
+    def handle_startendtag(self, tag, attrs):
+        # <svg/> or <br/>: no subtree to skip
+        if tag not in SKIP_TAGS:
+            self.handle_starttag(tag, attrs)
+        elif tag not in INLINE_TAGS:
+            self._break = True
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+        elif tag == "title" and self._in_title:
+            self._in_title = False
+            if self.title is None:
+                self.title = " ".join("".join(self._title_parts).split()) or None
+        if tag not in INLINE_TAGS:
+            self._break = True
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+            return
+        if self._skip_depth or self.done:
+            return
+
+        words = data.split()
+        if not words:
+            if data:
+                self._break = True
+            return
+
+        text = " ".join(words)
+        if self.parts and (self._break or data[0].isspace()):
+            text = " " + text
+        self._break = data[-1].isspace()
+
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.max_chars:
+            self.done = True
+
+    def text(self) -> str:
+        return "".join(self.parts)[:self.max_chars].strip()
+
+    def page_title(self) -> str:
+        title = self.title
+        if title is None and self._in_title:
+            # Document ended inside <title>
+            title = " ".join("".join(self._title_parts).split()) or None
+        return title or self.og_title or "Untitled"
+
+
+def extract_page(html: str, max_chars: int) -> Tuple[str, str]:
+    """
+    Extract (title, text) from an HTML document in one pass.
+
+    Args:
+        html: Document source (may be cut off mid-tag)
+        max_chars: Text cap; parsing stops once it is reached
+
+    Returns:
+        (title or og:title or "Untitled", whitespace-collapsed visible text)
+    """
+    parser = TextExtractor(max_chars)
+    for start in range(0, len(html), FEED_CHARS):
+        parser.feed(html[start:start + FEED_CHARS])
+        if parser.done:
+            break
+    else:
+        parser.close()
+
+    return parser.page_title(), parser.text()
+
+
+def extract_page_bytes(body: bytes, encoding: str, max_chars: int) -> Tuple[str, str]:
+    """extract_page() on a raw response body; decoding happens off the event loop too"""
+    return extract_page(body.decode(encoding, errors="replace"), max_chars)
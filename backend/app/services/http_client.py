@@ -0,0 +1,211 @@
+"""
+HTTP Clients - Application-scoped pooled httpx clients for outbound requests
+
+Clients are opened in the FastAPI lifespan and reused by every service, so
+connections (and TLS sessions) are kept alive between requests. Each client
+has a global connection limit and a per-host cap on concurrent requests, so a
+batch of URLs from one domain is fetched a few at a time.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+import logging
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; VisaPetitionBot/1.0)"
+
+# Client profiles: "web" fetches evidence URLs, "api" talks to third-party
+# APIs (Perplexity, Api2Pdf). Separate pools keep slow evidence sites from
+# holding connections the API calls need.
+CLIENT_PROFILES: Dict[str, dict] = {
+    "web": {
+        "headers": {"User-Agent": USER_AGENT},
+        "follow_redirects": True,
+        "timeout": 15.0,
+    },
+    "api": {
+        "timeout": 30.0,
+    },
+}
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the host slot back once the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps a transport so at most `per_host` requests to the same host are in
+    flight at once. A slot is held from sending the request until its body is
+    closed; redirects to another host take a slot there. A host's semaphore is
+    dropped once no request holds or awaits it, so a worker that has fetched
+    from many distinct hosts does not keep one per host forever.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int):
+        self._transport = transport
+        self.per_host = per_host
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        # Requests holding or waiting for each host's slot
+        self._users: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.requests_total = 0
+
+    def _leave(self, host: str):
+        self._users[host] -= 1
+        if not self._users[host]:
+            del self._users[host]
+            del self._slots[host]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        slot = self._slots.get(host)
+        if slot is None:
+            slot = self._slots[host] = asyncio.Semaphore(self.per_host)
+        self._users[host] = self._users.get(host, 0) + 1
+        try:
+            await slot.acquire()
+        except BaseException:
+            self._leave(host)
+            raise
+        self.in_flight[host] += 1
+        self.requests_total += 1
+
+        def release():
+            self.in_flight[host] -= 1
+            if not self.in_flight[host]:
+                del self.in_flight[host]
+            slot.release()
+            self._leave(host)
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class HTTPClientRegistry:
+    """
+    Named, lazily created httpx clients shared across the process.
+
+    `get()` always returns a client bound to the running event loop: a client
+    left over from another loop (e.g. a script calling asyncio.run twice) is
+    replaced rather than reused.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, HostLimitedTransport] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.http2 = settings.HTTP2_ENABLED and http2_available()
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        profile = CLIENT_PROFILES[name]
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        transport = HostLimitedTransport(
+            httpx.AsyncHTTPTransport(http2=self.http2, limits=limits),
+            per_host=settings.HTTP_PER_HOST_LIMIT,
+        )
+        self._transports[name] = transport
+        return httpx.AsyncClient(
+            transport=transport,
+            headers=profile.get("headers"),
+            follow_redirects=profile.get("follow_redirects", False),
+            timeout=profile["timeout"],
+        )
+
+    def get(self, name: str = "web") -> httpx.AsyncClient:
+        """The shared client for a profile in CLIENT_PROFILES"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections belong to the loop that opened them
+            self._clients.clear()
+            self._transports.clear()
+            self._loop = loop
+
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create(name)
+        return client
+
+    async def open(self):
+        """Create every profile's client up front (called from the app lifespan)"""
+        for name in CLIENT_PROFILES:
+            self.get(name)
+        logger.info(
+            f"HTTP clients ready: {', '.join(CLIENT_PROFILES)} "
+            f"(http2={self.http2}, max_connections={settings.HTTP_MAX_CONNECTIONS}, "
+            f"per_host={settings.HTTP_PER_HOST_LIMIT})"
+        )
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._transports.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing HTTP client: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "http2": self.http2,
+            "max_connections": settings.HTTP_MAX_CONNECTIONS,
+            "per_host_limit": settings.HTTP_PER_HOST_LIMIT,
+            "clients": {
+                name: {
+                    "requests_total": transport.requests_total,
+                    "in_flight_by_host": dict(transport.in_flight),
+                }
+                for name, transport in self._transports.items()
+            },
+        }
+
+
+http_clients = HTTPClientRegistry()
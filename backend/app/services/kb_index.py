@@ -0,0 +1,380 @@
+"""
+Knowledge Base Index - BM25 retrieval over chunked knowledge_base/*.md files
+
+Each generator asks for the KB passages matching its own intent (e.g.
+"judging criterion O-1A") instead of receiving the same marker-window blob.
+The index is built once, saved under CACHE_DIR, and rebuilt when any KB file
+changes.
+"""
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+
+from app.config import settings
+from app.services.context_packer import count_tokens
+from app.services.dedup import NearDuplicateIndex, is_dedupable
+from app.services.knowledge_base import KB_DIR, VISA_TYPE_FILES, get_criteria_for_visa_type
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 3
+INDEX_PATH = Path(settings.CACHE_DIR) / "kb_index.json"
+
+CHUNK_TOKENS = 300
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)")
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was "
+    "were will with which who whom their there these those be been being not no can may must "
+    "should would could shall into than then also such any all each other".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms; hyphenated terms (o-1a) also index their joined form (o1a)"""
+    terms = []
+    for term in TOKEN_RE.findall(text.lower()):
+        if term in STOPWORDS:
+            continue
+        terms.append(term)
+        if "-" in term:
+            terms.append(term.replace("-", ""))
+    return terms
+
+
+def chunk_markdown(filename: str, paragraphs: List[Tuple[str, Set[str]]]) -> List[dict]:
+    """
+    Group a markdown file's paragraphs into ~CHUNK_TOKENS passages, starting
+    a new passage at every level 1-2 heading. Each passage remembers the
+    nearest heading above it, plus the other files ("also_in") whose
+    near-duplicate paragraphs were folded into it.
+
+    A passage is also cut wherever that set of other files changes, so every
+    paragraph in it belongs to exactly the files the passage is listed under
+    and retrieval for one visa type never returns another type's text.
+
+    Args:
+        filename: Source file
+        paragraphs: (text, other files containing a near-duplicate) in file order
+    """
+    chunks: List[dict] = []
+    heading = ""
+    block_heading = ""
+    buffer: List[str] = []
+    also_in: Set[str] = set()
+    size = 0
+
+    def flush():
+        nonlocal buffer, size
+        body = "\n\n".join(buffer).strip()
+        if body:
+            chunks.append({
+                "file": filename,
+                "heading": block_heading,
+                "text": body,
+                "also_in": sorted(also_in),
+            })
+        buffer, size = [], 0
+
+    for paragraph, duplicated_in in paragraphs:
+        duplicated_in = set(duplicated_in) - {filename}
+        match = HEADING_RE.match(paragraph)
+        if match:
+            heading = match.group(2).strip()
+            if len(match.group(1)) <= 2:
+                flush()
+        if buffer and duplicated_in != also_in:
+            flush()
+        also_in = duplicated_in
+
+        # Oversized paragraphs (tables, long lists) are cut into chunk-sized pieces
+        limit = CHUNK_TOKENS * 4
+        pieces = [paragraph[i:i + limit] for i in range(0, len(paragraph), limit)]
+        for piece in pieces:
+            tokens = count_tokens(piece)
+            if buffer and size + tokens > CHUNK_TOKENS:
+                flush()
+            if not buffer:
+                block_heading = heading
+            buffer.append(piece)
+            size += tokens
+
+    flush()
+    return chunks
+
+
+def index_file_order(file_names: List[str]) -> List[str]:
+    """Files in VISA_TYPE_FILES priority order (first listing wins), then the rest by name"""
+    ordered = []
+    for names in VISA_TYPE_FILES.values():
+        for name in names:
+            if name in file_names and name not in ordered:
+                ordered.append(name)
+    return ordered + [name for name in file_names if name not in ordered]
+
+
+def kb_signature() -> List[List]:
+    """(filename, mtime_ns, size) for every indexed KB file"""
+    signature = []
+    for path in sorted(KB_DIR.glob("*.md")):
+        stat = path.stat()
+        signature.append([path.name, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+class KnowledgeBaseIndex:
+    """BM25 index over KB chunks, filtered per query to the visa type's files"""
+
+    def __init__(
+        self,
+        chunks: List[dict],
+        signature: List[List],
+        postings: Optional[Dict[str, List[List[int]]]] = None,
+        lengths: Optional[List[int]] = None,
+        dedup: Optional[dict] = None,
+    ):
+        self.chunks = chunks
+        self.signature = signature
+        self.dedup = dedup or {"paragraphs_removed": 0, "tokens_saved": 0}
+        self.chunk_files = [frozenset([c["file"], *c.get("also_in", ())]) for c in chunks]
+
+        if postings is None or lengths is None:
+            postings, lengths = defaultdict(list), []
+            for chunk_id, chunk in enumerate(chunks):
+                counts = Counter(tokenize(chunk["heading"] + "\n" + chunk["text"]))
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    postings[term].append([chunk_id, tf])
+
+        self.postings: Dict[str, List[List[int]]] = dict(postings)
+        self.lengths = lengths
+
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.idf = {
+            term: math.log(1 + (len(chunks) - len(posts) + 0.5) / (len(posts) + 0.5))
+            for term, posts in self.postings.items()
+        }
+
+    @classmethod
+    def build(cls) -> "KnowledgeBaseIndex":
+        started = time.perf_counter()
+        signature = kb_signature()
+
+        # Paragraphs that nearly duplicate one from a higher-priority file are
+        # dropped; the kept paragraph records where else it appeared
+        seen: NearDuplicateIndex = NearDuplicateIndex()
+        also_in: Dict[Tuple[str, int], Set[str]] = defaultdict(set)
+        kept: Dict[str, List[Tuple[str, Tuple[str, int]]]] = {}
+        removed = 0
+        tokens_saved = 0
+
+        for filename in index_file_order([name for name, _, _ in signature]):
+            try:
+                text = (KB_DIR / filename).read_text(encoding="utf-8")
+            except Exception as e:
+                logger.error(f"Error reading {filename}: {e}")
+                continue
+
+            kept[filename] = []
+            for n, paragraph in enumerate(PARAGRAPH_RE.split(text)):
+                paragraph = paragraph.strip()
+                if not paragraph:
+                    continue
+                if is_dedupable(paragraph):
+                    original = seen.add((filename, n), paragraph)
+                    if original is not None:
+                        also_in[original].add(filename)
+                        removed += 1
+                        tokens_saved += count_tokens(paragraph)
+                        continue
+                kept[filename].append((paragraph, (filename, n)))
+
+        chunks: List[dict] = []
+        for filename, paragraphs in kept.items():
+            chunks.extend(chunk_markdown(filename, [(text, also_in.get(key, set())) for text, key in paragraphs]))
+
+        dedup = {"paragraphs_removed": removed, "tokens_saved": tokens_saved}
+        index = cls(chunks, signature, dedup=dedup)
+        logger.info(
+            f"Built KB index: {len(chunks)} chunks, {len(index.postings)} terms "
+            f"from {len(signature)} files in {time.perf_counter() - started:.2f}s; "
+            f"dedup dropped {removed} paragraphs (~{tokens_saved:,} tokens)"
+        )
+        return index
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "version": INDEX_VERSION,
+            "signature": self.signature,
+            "chunks": self.chunks,
+            "postings": self.postings,
+            "lengths": self.lengths,
+            "dedup": self.dedup,
+        }), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["KnowledgeBaseIndex"]:
+        """Load a saved index, or None if it is missing, stale or unreadable"""
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable KB index {path}: {e}")
+            return None
+
+        if data.get("version") != INDEX_VERSION or data.get("signature") != kb_signature():
+            return None
+        return cls(data["chunks"], data["signature"], data["postings"], data["lengths"], data["dedup"])
+
+    def search(self, query: str, files: Optional[List[str]] = None, k: int = 10) -> List[Tuple[int, float]]:
+        """Top-k (chunk_id, score) for `query`, optionally restricted to `files`"""
+        allowed = set(files) if files is not None else None
+        scores: Dict[int, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for chunk_id, tf in self.postings[term]:
+                if allowed is not None and allowed.isdisjoint(self.chunk_files[chunk_id]):
+                    continue
+                norm = 1 - BM25_B + BM25_B * self.lengths[chunk_id] / self.avg_length
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+_index: Optional[KnowledgeBaseIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> KnowledgeBaseIndex:
+    """
+    The current index: loaded from disk, or rebuilt (and saved) when KB files changed.
+    Stats every KB file and may build the index: call from a worker thread.
+    """
+    global _index
+    with _index_lock:
+        if _index is not None and _index.signature == kb_signature():
+            return _index
+
+        index = KnowledgeBaseIndex.load(INDEX_PATH)
+        if index is None:
+            index = KnowledgeBaseIndex.build()
+            try:
+                index.save(INDEX_PATH)
+            except Exception as e:
+                logger.warning(f"Could not save KB index to {INDEX_PATH}: {e}")
+        else:
+            logger.info(f"Loaded KB index from {INDEX_PATH}: {len(index.chunks)} chunks")
+
+        _index = index
+        return _index
+
+
+async def aget_index() -> KnowledgeBaseIndex:
+    return await asyncio.to_thread(get_index)
+
+
+async def retrieve_knowledge(
+    visa_type: str,
+    queries: List[str],
+    token_budget: int,
+    index: Optional[KnowledgeBaseIndex] = None,
+) -> str:
+    """
+    select_passages() run in a worker thread.
+
+    Args:
+        visa_type, queries, token_budget: See select_passages()
+        index: The index resolved once for the current case (context["kb_index"]);
+            when omitted, KB files are checked for changes first
+
+    Returns:
+        Passages formatted with their source file and heading ("" if none match)
+    """
+    if index is None:
+        index = await aget_index()
+    return await asyncio.to_thread(select_passages, index, visa_type, queries, token_budget)
+
+
+def select_passages(index: KnowledgeBaseIndex, visa_type: str, queries: List[str], token_budget: int) -> str:
+    """
+    KB passages for a visa type that best match `queries`, within `token_budget`.
+
+    Results are taken round-robin across queries (best remaining hit of each
+    query in turn), so every intent - e.g. one query per criterion - gets
+    represented before any one of them gets a second passage.
+
+    Args:
+        visa_type: Restricts results to this visa type's KB files and is
+            appended to every query
+        queries: Intent strings, most important first
+        token_budget: Maximum estimated tokens of returned text
+
+    Returns:
+        Passages formatted with their source file and heading ("" if none match)
+    """
+    visa_type = getattr(visa_type, "value", visa_type)
+    files = VISA_TYPE_FILES.get(visa_type, [])
+    ranked = [[chunk_id for chunk_id, _ in index.search(f"{q} {visa_type}", files, k=20)] for q in queries]
+
+    selected: List[str] = []
+    seen = set()
+    used = 0
+    while any(ranked):
+        for hits in ranked:
+            while hits and hits[0] in seen:
+                hits.pop(0)
+            if not hits:
+                continue
+            chunk_id = hits.pop(0)
+            seen.add(chunk_id)
+            chunk = index.chunks[chunk_id]
+            source = chunk["file"]
+            if chunk["also_in"]:
+                source += f" (also in: {', '.join(chunk['also_in'])})"
+            passage = f"### {source} - {chunk['heading'] or 'General'}\n\n{chunk['text']}"
+            tokens = count_tokens(passage)
+            if used + tokens > token_budget:
+                continue
+            selected.append(passage)
+            used += tokens
+
+    logger.info(f"KB retrieval ({visa_type}): {len(selected)} passages, ~{used} tokens for {len(queries)} queries")
+    return "\n\n---\n\n".join(selected)
+
+
+def criterion_queries(visa_type: str) -> List[str]:
+    """One retrieval intent per regulatory criterion of the visa type"""
+    visa_type = getattr(visa_type, "value", visa_type)
+    return [f"{c['name']} criterion {c['cfr']}" for c in get_criteria_for_visa_type(visa_type)]
+
+
+def index_stats() -> dict:
+    index = _index
+    if index is None:
+        return {"chunks": 0, "terms": 0, "path": str(INDEX_PATH)}
+    return {
+        "chunks": len(index.chunks),
+        "terms": len(index.postings),
+        "files": len(index.signature),
+        "duplicate_paragraphs_removed": index.dedup["paragraphs_removed"],
+        "dedup_tokens_saved": index.dedup["tokens_saved"],
+        "path": str(INDEX_PATH),
+    }
@@ -1,11 +1,19 @@
 """
 Knowledge Base Loader - Loads visa-specific markdown files
 """
-import os
+import asyncio
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import logging
 
+from app.services.context_packer import count_tokens
+from app.services.dedup import NearDuplicateIndex, is_dedupable
+
 logger = logging.getLogger(__name__)
 
 # Knowledge base directory
@@ -64,15 +72,23 @@ SECTION_MARKERS: Dict[str, List[str]] = {
 }
 
 
+# Case-insensitive marker patterns, compiled once. Searching the original text
+# avoids an upper-cased copy of every file per marker (and keeps offsets exact)
+MARKER_PATTERNS: Dict[str, List[re.Pattern]] = {
+    visa_type: [re.compile(re.escape(marker), re.IGNORECASE) for marker in markers]
+    for visa_type, markers in SECTION_MARKERS.items()
+}
+
+
 def extract_relevant_sections(content: str, visa_type: str) -> str:
     """Extract sections relevant to the visa type"""
-    markers = SECTION_MARKERS.get(visa_type, [])
     sections = []
 
-    for marker in markers:
-        marker_idx = content.upper().find(marker.upper())
-        if marker_idx != -1:
+    for pattern in MARKER_PATTERNS.get(visa_type, []):
+        match = pattern.search(content)
+        if match:
             # Extract chunk around marker
+            marker_idx = match.start()
             start = max(0, marker_idx - 500)
             end = min(len(content), marker_idx + 5000)
             sections.append(content[start:end])
@@ -80,51 +96,197 @@ def extract_relevant_sections(content: str, visa_type: str) -> str:
     return "\n\n---\n\n".join(sections) if sections else content
 
 
-async def load_knowledge_base(visa_type: str) -> str:
+@dataclass(frozen=True)
+class CompiledKB:
     """
-    Load and combine knowledge base files for a visa type.
+    A visa type's combined knowledge base, built once and shared read-only.
 
-    Args:
-        visa_type: The visa type (O-1A, O-1B, P-1A, EB-1A, EB-2 NIW)
-
-    Returns:
-        Combined knowledge base content
+    `sections` holds (filename, start, end) offsets of each file's extract in `text`.
     """
-    file_names = VISA_TYPE_FILES.get(visa_type, [])
-    if not file_names:
-        logger.warning(f"No knowledge base files defined for visa type: {visa_type}")
+    visa_type: str
+    text: str
+    sections: Tuple[Tuple[str, int, int], ...]
+    signature: Tuple[Tuple[str, int, int], ...]  # (filename, mtime_ns, size) of each source file
+    build_seconds: float
+    built_at: float
+    duplicates_removed: int = 0
+    tokens_saved: int = 0
+
+    def section(self, filename: str) -> str:
+        for name, start, end in self.sections:
+            if name == filename:
+                return self.text[start:end]
         return ""
 
-    context = f"# VISA PETITION KNOWLEDGE BASE - {visa_type}\n\n"
-    context += f"This knowledge base contains comprehensive information for generating {visa_type} visa petition documents.\n\n"
-    context += "Files loaded (in priority order):\n"
 
-    loaded_files = []
-    for idx, filename in enumerate(file_names):
-        file_path = KB_DIR / filename
-        if file_path.exists():
-            loaded_files.append(filename)
-            context += f"{idx + 1}. {filename}\n"
+def source_signature(file_names: List[str]) -> Tuple[Tuple[str, int, int], ...]:
+    """mtime and size of each existing KB file; any change means a rebuild"""
+    signature = []
+    for filename in file_names:
+        try:
+            stat = (KB_DIR / filename).stat()
+        except OSError:
+            continue
+        signature.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
 
-    context += "\n---\n\n"
 
-    for idx, filename in enumerate(loaded_files):
-        file_path = KB_DIR / filename
-        try:
-            content = file_path.read_text(encoding="utf-8")
-            relevant = extract_relevant_sections(content, visa_type)
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
 
-            context += f"## FILE {idx + 1}: {filename}\n\n"
-            context += relevant
-            context += "\n\n---\n\n"
+def compile_knowledge_base(visa_type: str) -> CompiledKB:
+    """
+    Read and combine the knowledge base files for a visa type.
+
+    Files are processed in priority order and any paragraph that nearly
+    duplicates one already included (from an earlier file or earlier in the
+    same file) is dropped. Each file section ends with a note saying how many
+    paragraphs were omitted and which FILE holds them.
+    """
+    started = time.perf_counter()
+    file_names = VISA_TYPE_FILES.get(visa_type, [])
+    signature = source_signature(file_names)
+    loaded_files = [filename for filename, _, _ in signature]
 
-            logger.info(f"Loaded KB file: {filename} ({len(content)} chars)")
+    parts = [
+        f"# VISA PETITION KNOWLEDGE BASE - {visa_type}\n\n",
+        f"This knowledge base contains comprehensive information for generating {visa_type} visa petition documents.\n\n",
+        "Files loaded (in priority order):\n",
+    ]
+    for idx, filename in enumerate(file_names):
+        if filename in loaded_files:
+            parts.append(f"{idx + 1}. {filename}\n")
+    parts.append("\n---\n\n")
 
+    sections = []
+    seen: NearDuplicateIndex = NearDuplicateIndex()
+    duplicates_removed = 0
+    tokens_saved = 0
+    offset = sum(len(p) for p in parts)
+    for idx, filename in enumerate(loaded_files):
+        try:
+            content = (KB_DIR / filename).read_text(encoding="utf-8")
         except Exception as e:
             logger.error(f"Error reading {filename}: {e}")
+            continue
+
+        kept = []
+        omitted: Dict[int, int] = {}
+        for n, paragraph in enumerate(PARAGRAPH_RE.split(extract_relevant_sections(content, visa_type))):
+            if is_dedupable(paragraph):
+                original = seen.add((idx, n), paragraph)
+                if original is not None:
+                    omitted[original[0]] = omitted.get(original[0], 0) + 1
+                    tokens_saved += count_tokens(paragraph)
+                    continue
+            kept.append(paragraph)
+
+        relevant = "\n\n".join(kept)
+        if omitted:
+            duplicates_removed += sum(omitted.values())
+            relevant += "\n\n_[" + "; ".join(
+                f"{count} duplicate paragraphs omitted, see {'above' if source == idx else f'FILE {source + 1}'}"
+                for source, count in sorted(omitted.items())
+            ) + "]_"
+
+        header = f"## FILE {idx + 1}: {filename}\n\n"
+        parts.extend([header, relevant, "\n\n---\n\n"])
+        sections.append((filename, offset + len(header), offset + len(header) + len(relevant)))
+        offset += len(header) + len(relevant) + len("\n\n---\n\n")
+
+        logger.info(f"Loaded KB file: {filename} ({len(content)} chars)")
+
+    text = "".join(parts)
+    build_seconds = time.perf_counter() - started
+    logger.info(
+        f"Compiled KB for {visa_type}: {len(text)} chars from {len(sections)} files in {build_seconds * 1000:.0f}ms; "
+        f"dedup dropped {duplicates_removed} paragraphs (~{tokens_saved:,} tokens)"
+    )
+
+    return CompiledKB(
+        visa_type=visa_type,
+        text=text,
+        sections=tuple(sections),
+        signature=signature,
+        build_seconds=build_seconds,
+        built_at=time.time(),
+        duplicates_removed=duplicates_removed,
+        tokens_saved=tokens_saved,
+    )
+
+
+class KnowledgeBaseCache:
+    """
+    Compiled knowledge bases by visa type. Each lookup compares the source
+    files' mtime/size with the compiled copy and rebuilds only when they differ,
+    so edits to knowledge_base/*.md are picked up without a restart.
+
+    Lookups stat and read files: call get() from a worker thread, not the event loop.
+    """
+
+    def __init__(self):
+        self._compiled: Dict[str, CompiledKB] = {}
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+
+    def get(self, visa_type: str) -> CompiledKB:
+        with self._lock:
+            compiled = self._compiled.get(visa_type)
+            if compiled is None or compiled.signature != source_signature(VISA_TYPE_FILES.get(visa_type, [])):
+                if compiled is not None:
+                    logger.info(f"KB files changed for {visa_type}, rebuilding")
+                    self.rebuilds += 1
+                compiled = compile_knowledge_base(visa_type)
+                self._compiled[visa_type] = compiled
+            return compiled
+
+    def warm(self):
+        """Compile every visa type up front (called at startup)"""
+        for visa_type in VISA_TYPE_FILES:
+            self.get(visa_type)
+
+    def stats(self) -> dict:
+        compiled = dict(self._compiled)  # snapshot: builds run in worker threads
+        return {
+            "visa_types": {
+                visa_type: {
+                    "chars": len(kb.text),
+                    "files": len(kb.sections),
+                    "build_ms": round(kb.build_seconds * 1000, 1),
+                    "duplicate_paragraphs_removed": kb.duplicates_removed,
+                    "dedup_tokens_saved": kb.tokens_saved,
+                    "built_at": datetime.utcfromtimestamp(kb.built_at).isoformat() + "Z",
+                }
+                for visa_type, kb in compiled.items()
+            },
+            "total_chars": sum(len(kb.text) for kb in compiled.values()),
+            "total_build_ms": round(sum(kb.build_seconds for kb in compiled.values()) * 1000, 1),
+            "total_dedup_tokens_saved": sum(kb.tokens_saved for kb in compiled.values()),
+            "rebuilds": self.rebuilds,
+        }
+
+
+kb_cache = KnowledgeBaseCache()
+
+
+async def load_knowledge_base(visa_type: str) -> str:
+    """
+    Load and combine knowledge base files for a visa type.
+
+    Args:
+        visa_type: The visa type (O-1A, O-1B, P-1A, EB-1A, EB-2 NIW)
+
+    Returns:
+        Combined knowledge base content
+    """
+    visa_type = getattr(visa_type, "value", visa_type)
+    if not VISA_TYPE_FILES.get(visa_type):
+        logger.warning(f"No knowledge base files defined for visa type: {visa_type}")
+        return ""
 
-    logger.info(f"Total KB size for {visa_type}: {len(context)} chars")
-    return context
+    kb = await asyncio.to_thread(kb_cache.get, visa_type)
+    logger.info(f"Total KB size for {visa_type}: {len(kb.text)} chars")
+    return kb.text
 
 
 def get_criteria_for_visa_type(visa_type: str) -> List[dict]:
@@ -0,0 +1,155 @@
+"""
+LLM Scheduler - Process-wide admission control in front of the AI providers
+
+Bounds in-flight requests and estimated input tokens per minute, and hands out
+free slots round-robin across cases so one large case cannot starve the rest.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Optional
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Case the current task is generating for; inherited by every task it spawns
+current_case: ContextVar[str] = ContextVar("current_case", default="default")
+
+TOKEN_WINDOW_SECONDS = 60.0
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough input token estimate (~4 characters per token)"""
+    return sum(len(t) for t in texts) // 4 + 1
+
+
+@dataclass
+class Waiter:
+    future: asyncio.Future
+    tokens: int
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class LLMScheduler:
+    """
+    Args:
+        max_in_flight: Maximum concurrent provider requests (0 = unlimited)
+        tokens_per_minute: Estimated input tokens admitted per rolling minute (0 = unlimited)
+    """
+
+    def __init__(self, max_in_flight: int, tokens_per_minute: int):
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self.in_flight = 0
+        self._queues: "OrderedDict[str, Deque[Waiter]]" = OrderedDict()
+        self._admitted: Deque[tuple] = deque()  # (timestamp, tokens) within the token window
+        self._retry: Optional[asyncio.TimerHandle] = None
+
+        self.admitted_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        """Wait for this case's turn, then hold one in-flight slot for the block"""
+        case_id = current_case.get()
+        waiter = Waiter(asyncio.get_running_loop().create_future(), tokens)
+        self._queues.setdefault(case_id, deque()).append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            else:
+                self._discard(case_id, waiter)
+            raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _discard(self, case_id: str, waiter: Waiter):
+        queue = self._queues.get(case_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[case_id]
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _tokens_in_window(self, now: float) -> int:
+        while self._admitted and now - self._admitted[0][0] > TOKEN_WINDOW_SECONDS:
+            self._admitted.popleft()
+        return sum(t for _, t in self._admitted)
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self._queues and (not self.max_in_flight or self.in_flight < self.max_in_flight):
+            # Queues are served in rotation: take the head of the first case, then move it to the back
+            case_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+
+            if self.tokens_per_minute:
+                used = self._tokens_in_window(now)
+                # A request larger than the whole budget is admitted only into an empty window
+                if used and used + waiter.tokens > self.tokens_per_minute:
+                    self._schedule_retry(self._admitted[0][0] + TOKEN_WINDOW_SECONDS - now)
+                    return
+
+            queue.popleft()
+            self._queues.move_to_end(case_id)
+            if not queue:
+                del self._queues[case_id]
+
+            if waiter.future.cancelled():
+                continue
+
+            wait = now - waiter.enqueued
+            self.in_flight += 1
+            self.admitted_total += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            self._admitted.append((now, waiter.tokens))
+            if wait > 1:
+                logger.info(f"LLM request for case {case_id} admitted after {wait:.1f}s in queue")
+            waiter.future.set_result(None)
+
+    def _schedule_retry(self, delay: float):
+        if self._retry is not None and not self._retry.cancelled():
+            return
+
+        def retry():
+            self._retry = None
+            self._dispatch()
+
+        self._retry = asyncio.get_running_loop().call_later(max(delay, 0.05), retry)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "max_in_flight": self.max_in_flight,
+            "tokens_per_minute": self.tokens_per_minute,
+            "in_flight": self.in_flight,
+            "queue_depth": sum(len(q) for q in self._queues.values()),
+            "queue_depth_by_case": {case_id: len(q) for case_id, q in self._queues.items()},
+            "tokens_in_window": self._tokens_in_window(now),
+            "admitted_total": self.admitted_total,
+            "wait_seconds_avg": round(self.wait_seconds_total / self.admitted_total, 3) if self.admitted_total else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 3),
+        }
+
+
+llm_scheduler = LLMScheduler(
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+)
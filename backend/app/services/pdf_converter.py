@@ -1,113 +1,65 @@
 """
-PDF Converter - Convert generated documents to PDF using Api2Pdf
+PDF Converter - Convert generated documents to PDF using Api2Pdf or locally
+
+PDF_ENGINE selects the backend: "api2pdf" posts the styled HTML to Api2Pdf,
+"local" lays the same HTML out with PyMuPDF in a process pool. Rendered
+PDFs are cached on disk by document content hash plus PDF_STYLE_VERSION, so
+downloads, re-downloads and the delivery email share one render per
+document version.
 """
+import asyncio
+import hashlib
 import logging
-from typing import Optional
-import httpx
-import markdown
+from pathlib import Path
+from typing import Dict, List, Optional
 
 from app.config import settings
+from app.services.disk_cache import DiskCache
+from app.services.extraction_pool import ExtractionPool
+from app.services.http_client import http_clients
+from app.services import pdf_workers
 
 logger = logging.getLogger(__name__)
 
+# Bump when the HTML template or CSS (pdf_workers) changes, so stale renders are not served
+PDF_STYLE_VERSION = 2
+
+pdf_cache: Optional[DiskCache] = None
+if settings.PDF_CACHE_ENABLED:
+    pdf_cache = DiskCache(
+        Path(settings.CACHE_DIR) / "rendered_pdfs.sqlite3",
+        max_bytes=settings.PDF_CACHE_MAX_MB * 1024 * 1024,
+        name="rendered_pdfs",
+    )
+
+pdf_cache_counts = {"rendered": 0, "failed": 0, "joined": 0}
+
+# Worker processes for PDF_ENGINE=local (started on first use)
+pdf_pool = ExtractionPool(
+    workers=settings.PDF_LOCAL_WORKERS,
+    timeout_seconds=settings.PDF_LOCAL_TIMEOUT_SECONDS,
+    memory_limit_mb=settings.PDF_LOCAL_MEMORY_LIMIT_MB,
+    name="PDF rendering",
+)
+
+# Renders in progress by cache key: concurrent requests for one document share one render
+_rendering: Dict[str, asyncio.Task] = {}
+_render_slots: Optional[asyncio.Semaphore] = None
+_render_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def pdf_available() -> bool:
+    """Whether the configured PDF_ENGINE can render (Api2Pdf needs an API key)"""
+    if settings.PDF_ENGINE == "local":
+        return True
+    return bool(settings.API2PDF_API_KEY)
+
 
 async def convert_markdown_to_html(md_content: str) -> str:
     """
     Convert markdown content to styled HTML for PDF generation.
     """
-    # Convert markdown to HTML
-    html_body = markdown.markdown(
-        md_content,
-        extensions=['tables', 'fenced_code', 'toc', 'nl2br']
-    )
-
-    # Wrap in styled HTML document
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            @page {{
-                size: letter;
-                margin: 1in;
-            }}
-            body {{
-                font-family: 'Times New Roman', Times, serif;
-                font-size: 12pt;
-                line-height: 1.6;
-                color: #000;
-                max-width: 100%;
-            }}
-            h1 {{
-                font-size: 18pt;
-                font-weight: bold;
-                margin-top: 24pt;
-                margin-bottom: 12pt;
-                text-align: center;
-            }}
-            h2 {{
-                font-size: 14pt;
-                font-weight: bold;
-                margin-top: 18pt;
-                margin-bottom: 8pt;
-                border-bottom: 1px solid #333;
-                padding-bottom: 4pt;
-            }}
-            h3 {{
-                font-size: 12pt;
-                font-weight: bold;
-                margin-top: 14pt;
-                margin-bottom: 6pt;
-            }}
-            p {{
-                margin-bottom: 10pt;
-                text-align: justify;
-            }}
-            ul, ol {{
-                margin-left: 20pt;
-                margin-bottom: 10pt;
-            }}
-            li {{
-                margin-bottom: 4pt;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 12pt 0;
-            }}
-            th, td {{
-                border: 1px solid #333;
-                padding: 6pt 8pt;
-                text-align: left;
-            }}
-            th {{
-                background-color: #f0f0f0;
-                font-weight: bold;
-            }}
-            blockquote {{
-                margin: 12pt 20pt;
-                padding-left: 12pt;
-                border-left: 3px solid #666;
-                font-style: italic;
-            }}
-            .page-break {{
-                page-break-after: always;
-            }}
-            hr {{
-                border: none;
-                border-top: 1px solid #999;
-                margin: 18pt 0;
-            }}
-        </style>
-    </head>
-    <body>
-        {html_body}
-    </body>
-    </html>
-    """
-
-    return html
+    return await asyncio.to_thread(pdf_workers.document_html, md_content)
 
 
 async def convert_to_pdf(
@@ -116,7 +68,7 @@ async def convert_to_pdf(
     is_markdown: bool = True
 ) -> Optional[bytes]:
     """
-    Convert text/markdown content to PDF using Api2Pdf.
+    Convert text/markdown content to PDF with the PDF_ENGINE backend.
 
     Args:
         content: Text or markdown content
@@ -126,6 +78,25 @@ async def convert_to_pdf(
     Returns:
         PDF bytes or None if conversion failed
     """
+    if settings.PDF_ENGINE == "local":
+        return await convert_locally(content, filename, is_markdown)
+    return await convert_with_api2pdf(content, filename, is_markdown)
+
+
+async def convert_locally(content: str, filename: str, is_markdown: bool) -> Optional[bytes]:
+    """Render in the local PDF pool (PyMuPDF), with the same HTML and CSS as Api2Pdf"""
+    try:
+        pdf_bytes = await pdf_pool.run(pdf_workers.render_pdf, content, is_markdown, label=filename)
+    except Exception as e:
+        logger.error(f"Local PDF rendering failed for {filename}: {e}")
+        return None
+
+    logger.info(f"Rendered {filename} to PDF locally ({len(pdf_bytes)} bytes)")
+    return pdf_bytes
+
+
+async def convert_with_api2pdf(content: str, filename: str, is_markdown: bool) -> Optional[bytes]:
+    """Render with the Api2Pdf service (headless Chrome)"""
     if not settings.API2PDF_API_KEY:
         logger.warning("API2PDF_API_KEY not set - returning None")
         return None
@@ -136,98 +107,157 @@ async def convert_to_pdf(
             html = await convert_markdown_to_html(content)
         else:
             # Plain text - wrap in basic HTML
-            escaped = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{
-                        font-family: 'Courier New', monospace;
-                        font-size: 11pt;
-                        line-height: 1.4;
-                        white-space: pre-wrap;
-                        margin: 1in;
-                    }}
-                </style>
-            </head>
-            <body>{escaped}</body>
-            </html>
-            """
+            html = pdf_workers.text_html(content)
 
         # Call Api2Pdf
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                "https://v2.api2pdf.com/chrome/pdf/html",
-                headers={
-                    "Authorization": settings.API2PDF_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "html": html,
-                    "inline": False,
-                    "filename": filename,
-                    "options": {
-                        "printBackground": True,
-                        "marginTop": "1in",
-                        "marginBottom": "1in",
-                        "marginLeft": "1in",
-                        "marginRight": "1in"
-                    }
+        client = http_clients.get("api")
+        response = await client.post(
+            "https://v2.api2pdf.com/chrome/pdf/html",
+            headers={
+                "Authorization": settings.API2PDF_API_KEY,
+                "Content-Type": "application/json"
+            },
+            json={
+                "html": html,
+                "inline": False,
+                "filename": filename,
+                "options": {
+                    "printBackground": True,
+                    "marginTop": "1in",
+                    "marginBottom": "1in",
+                    "marginLeft": "1in",
+                    "marginRight": "1in"
                 }
-            )
+            },
+            timeout=120.0,
+        )
 
-            if response.status_code != 200:
-                logger.error(f"Api2Pdf error: {response.status_code} - {response.text}")
-                return None
+        if response.status_code != 200:
+            logger.error(f"Api2Pdf error: {response.status_code} - {response.text}")
+            return None
 
-            result = response.json()
+        result = response.json()
 
-            if not result.get("success"):
-                logger.error(f"Api2Pdf failed: {result}")
-                return None
+        if not result.get("success"):
+            logger.error(f"Api2Pdf failed: {result}")
+            return None
 
-            # Download the PDF
-            pdf_url = result.get("pdf") or result.get("FileUrl")
-            if not pdf_url:
-                logger.error("No PDF URL in response")
-                return None
+        # Download the PDF
+        pdf_url = result.get("pdf") or result.get("FileUrl")
+        if not pdf_url:
+            logger.error("No PDF URL in response")
+            return None
 
-            pdf_response = await client.get(pdf_url)
-            if pdf_response.status_code != 200:
-                logger.error(f"Failed to download PDF: {pdf_response.status_code}")
-                return None
+        pdf_response = await client.get(pdf_url, timeout=120.0)
+        if pdf_response.status_code != 200:
+            logger.error(f"Failed to download PDF: {pdf_response.status_code}")
+            return None
 
-            logger.info(f"Successfully converted {filename} to PDF ({len(pdf_response.content)} bytes)")
-            return pdf_response.content
+        logger.info(f"Successfully converted {filename} to PDF ({len(pdf_response.content)} bytes)")
+        return pdf_response.content
 
     except Exception as e:
         logger.error(f"PDF conversion failed for {filename}: {e}")
         return None
 
 
+def pdf_cache_key(content: str, is_markdown: bool) -> str:
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"v{PDF_STYLE_VERSION}:{settings.PDF_ENGINE}:{'md' if is_markdown else 'txt'}:{digest}"
+
+
+def render_slots() -> asyncio.Semaphore:
+    """Semaphore bounding concurrent renders, recreated if the event loop changes"""
+    global _render_slots, _render_loop
+    loop = asyncio.get_running_loop()
+    if _render_loop is not loop:
+        _render_slots = asyncio.Semaphore(settings.PDF_RENDER_CONCURRENCY)
+        _render_loop = loop
+    return _render_slots
+
+
+async def render_and_cache(key: str, content: str, filename: str, is_markdown: bool) -> Optional[bytes]:
+    async with render_slots():
+        pdf_bytes = await convert_to_pdf(content, filename, is_markdown=is_markdown)
+    if not pdf_bytes:
+        pdf_cache_counts["failed"] += 1
+        return None
+
+    pdf_cache_counts["rendered"] += 1
+    if pdf_cache is not None:
+        try:
+            await pdf_cache.aset(key, pdf_bytes)
+        except Exception as e:
+            logger.warning(f"PDF cache write failed for {filename}: {e}")
+    return pdf_bytes
+
+
+async def cached_pdf(content: str, filename: str, is_markdown: bool = True) -> Optional[bytes]:
+    """
+    PDF for a document, from the render cache or rendered now (at most
+    PDF_RENDER_CONCURRENCY renders at once). Failed renders are not cached.
+
+    Returns:
+        PDF bytes or None if conversion failed
+    """
+    key = pdf_cache_key(content, is_markdown)
+    if pdf_cache is not None:
+        try:
+            pdf_bytes = await pdf_cache.aget(key)
+        except Exception as e:
+            logger.warning(f"PDF cache read failed for {filename}: {e}")
+            pdf_bytes = None
+        if pdf_bytes is not None:
+            return pdf_bytes
+
+    task = _rendering.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = _rendering[key] = asyncio.create_task(
+            render_and_cache(key, content, filename, is_markdown)
+        )
+        task.add_done_callback(lambda done: _rendering.pop(key) if _rendering.get(key) is done else None)
+    else:
+        pdf_cache_counts["joined"] += 1
+    # shield: a cancelled download must not cancel a render others are waiting on
+    return await asyncio.shield(task)
+
+
+async def pdf_cache_stats() -> Optional[dict]:
+    if pdf_cache is None:
+        return None
+    return {**await pdf_cache.astats(), **pdf_cache_counts, "style_version": PDF_STYLE_VERSION}
+
+
+def document_filename(doc: dict, extension: str) -> str:
+    return f"Document_{doc['number']}_{doc['name'].replace(' ', '_')}.{extension}"
+
+
 async def convert_documents_to_pdf(documents: list) -> list:
     """
-    Convert a list of document dicts to PDFs.
+    Convert a list of document dicts to PDFs, concurrently and through the
+    render cache.
 
     Args:
         documents: List of dicts with 'number', 'name', 'content' keys
 
     Returns:
-        List of dicts with 'number', 'name', 'content' (as PDF bytes), 'format'
+        List of dicts with 'number', 'name', 'content' (as PDF bytes), 'format',
+        'filename', in input order; a document whose conversion failed is
+        returned as UTF-8 text with format 'txt'
     """
-    pdf_documents = []
-
-    for doc in documents:
-        filename = f"Document_{doc['number']}_{doc['name'].replace(' ', '_')}.pdf"
-
-        pdf_bytes = await convert_to_pdf(
+    filenames = [document_filename(doc, "pdf") for doc in documents]
+    rendered: List[Optional[bytes]] = await asyncio.gather(*(
+        cached_pdf(
             content=doc["content"],
             filename=filename,
             is_markdown=True  # Our docs use markdown formatting
         )
+        for doc, filename in zip(documents, filenames)
+    ))
+
+    pdf_documents = []
 
+    for doc, filename, pdf_bytes in zip(documents, filenames, rendered):
         if pdf_bytes:
             pdf_documents.append({
                 "number": doc["number"],
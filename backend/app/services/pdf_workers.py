@@ -0,0 +1,216 @@
+"""
+PDF Workers - Styled HTML for generated documents, and local PDF rendering
+
+Both PDF engines share the HTML and CSS built here: Api2Pdf receives the
+HTML document, the local engine lays it out with PyMuPDF's Story engine
+inside the PDF render pool. This module must therefore stay importable
+without app settings or other services.
+"""
+import io
+import re
+import threading
+from typing import List
+
+import markdown
+
+MARKDOWN_EXTENSIONS = ['tables', 'fenced_code', 'toc', 'nl2br']
+
+# Letter paper with 1in margins (Story ignores @page, so the local engine applies them)
+PAGE_SIZE = "letter"
+PAGE_MARGIN_PT = 72
+
+# Story layout slows down sharply with document length, so long documents are
+# laid out as consecutive stories of about this much HTML, split at headings
+SECTION_CHARS = 20_000
+SECTION_BREAK = re.compile(r"(?=<h[1-3][ >])")
+
+DOCUMENT_CSS = """
+            @page {
+                size: letter;
+                margin: 1in;
+            }
+            body {
+                font-family: 'Times New Roman', Times, serif;
+                font-size: 12pt;
+                line-height: 1.6;
+                color: #000;
+                max-width: 100%;
+            }
+            h1 {
+                font-size: 18pt;
+                font-weight: bold;
+                margin-top: 24pt;
+                margin-bottom: 12pt;
+                text-align: center;
+            }
+            h2 {
+                font-size: 14pt;
+                font-weight: bold;
+                margin-top: 18pt;
+                margin-bottom: 8pt;
+                border-bottom: 1px solid #333;
+                padding-bottom: 4pt;
+            }
+            h3 {
+                font-size: 12pt;
+                font-weight: bold;
+                margin-top: 14pt;
+                margin-bottom: 6pt;
+            }
+            p {
+                margin-bottom: 10pt;
+                text-align: justify;
+            }
+            ul, ol {
+                margin-left: 20pt;
+                margin-bottom: 10pt;
+            }
+            li {
+                margin-bottom: 4pt;
+            }
+            table {
+                width: 100%;
+                border-collapse: collapse;
+                margin: 12pt 0;
+            }
+            th, td {
+                border: 1px solid #333;
+                padding: 6pt 8pt;
+                text-align: left;
+            }
+            th {
+                background-color: #f0f0f0;
+                font-weight: bold;
+            }
+            blockquote {
+                margin: 12pt 20pt;
+                padding-left: 12pt;
+                border-left: 3px solid #666;
+                font-style: italic;
+            }
+            .page-break {
+                page-break-after: always;
+            }
+            hr {
+                border: none;
+                border-top: 1px solid #999;
+                margin: 18pt 0;
+            }
+"""
+
+TEXT_CSS = """
+                    body {
+                        font-family: 'Courier New', monospace;
+                        font-size: 11pt;
+                        line-height: 1.4;
+                        white-space: pre-wrap;
+                    }
+"""
+
+# Markdown converters are reusable after reset() but not thread-safe: one per thread
+_local = threading.local()
+
+
+def markdown_converter() -> markdown.Markdown:
+    converter = getattr(_local, "converter", None)
+    if converter is None:
+        converter = _local.converter = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return converter.reset()
+
+
+def document_html(md_content: str) -> str:
+    """Markdown rendered into the styled HTML document used for PDFs"""
+    return wrap_document(markdown_converter().convert(md_content))
+
+
+def wrap_document(html_body: str) -> str:
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>{DOCUMENT_CSS}        </style>
+    </head>
+    <body>
+        {html_body}
+    </body>
+    </html>
+    """
+
+
+def text_html(content: str, margin: str = "1in") -> str:
+    """
+    Plain text wrapped in a monospace HTML document. Api2Pdf pages get their
+    margin from the body; the local engine insets its pages and passes "0".
+    """
+    escaped = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return f"""
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <style>{TEXT_CSS}                    body {{ margin: {margin}; }}
+                </style>
+            </head>
+            <body>{escaped}</body>
+            </html>
+            """
+
+
+def html_sections(html_body: str) -> List[str]:
+    """HTML body cut at h1-h3 into pieces of about SECTION_CHARS"""
+    sections = []
+    current = ""
+    for part in SECTION_BREAK.split(html_body):
+        if current and len(current) + len(part) > SECTION_CHARS:
+            sections.append(current)
+            current = ""
+        current += part
+    if current or not sections:
+        sections.append(current)
+    return sections
+
+
+def render_pdf(content: str, is_markdown: bool) -> bytes:
+    """
+    Document content laid out on letter pages with PyMuPDF's Story engine.
+    Each section continues on the page where the previous one ended.
+
+    Returns:
+        PDF bytes
+    """
+    import fitz  # PyMuPDF
+
+    if is_markdown:
+        documents = [wrap_document(section) for section in html_sections(markdown_converter().convert(content))]
+    else:
+        documents = [text_html(content, margin="0")]
+
+    mediabox = fitz.paper_rect(PAGE_SIZE)
+    where = mediabox + (PAGE_MARGIN_PT, PAGE_MARGIN_PT, -PAGE_MARGIN_PT, -PAGE_MARGIN_PT)
+
+    buffer = io.BytesIO()
+    writer = fitz.DocumentWriter(buffer)
+    device = None
+    free = where
+    for html in documents:
+        story = fitz.Story(html=html)
+        more = True
+        while more:
+            if device is None:
+                device = writer.begin_page(mediabox)
+                free = where
+            more, filled = story.place(free)
+            story.draw(device)
+            if more:
+                writer.end_page()
+                device = None
+            else:
+                free = fitz.Rect(free.x0, filled[3], free.x1, free.y1)
+    if device is not None:
+        writer.end_page()
+    writer.close()
+
+    # Every story embeds its own copy of the fonts; merge duplicate objects
+    with fitz.open(stream=buffer.getvalue(), filetype="pdf") as pdf:
+        return pdf.tobytes(garbage=4, deflate=True)
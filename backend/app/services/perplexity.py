@@ -1,10 +1,11 @@
 """
 Perplexity API Service - Beneficiary lookup and research
 """
-import httpx
 from typing import List, Optional
 from app.config import settings
 from app.models import URLSource
+from app.services.domain_tiers import domain_tiers
+from app.services.http_client import http_clients
 import logging
 import json
 import re
@@ -71,41 +72,41 @@ Return ONLY a JSON array of objects with this exact format:
 Be specific with real, verifiable URLs. Include the domain clearly."""
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                PERPLEXITY_API_URL,
-                headers={
-                    "Authorization": f"Bearer {settings.PERPLEXITY_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": "sonar",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a research assistant helping find verifiable evidence for visa petitions. Return ONLY valid JSON arrays with real URLs."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.2,
-                    "max_tokens": 2048,
-                }
-            )
-            response.raise_for_status()
-
-            data = response.json()
-            response_text = data["choices"][0]["message"]["content"]
-
-            logger.info(f"Perplexity response: {response_text[:500]}...")
-
-            # Parse JSON from response
-            sources = parse_perplexity_response(response_text, name)
-
-            logger.info(f"Found {len(sources)} sources for {name}")
-            return sources
+        client = http_clients.get("api")
+        response = await client.post(
+            PERPLEXITY_API_URL,
+            headers={
+                "Authorization": f"Bearer {settings.PERPLEXITY_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": "sonar",
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": "You are a research assistant helping find verifiable evidence for visa petitions. Return ONLY valid JSON arrays with real URLs."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "temperature": 0.2,
+                "max_tokens": 2048,
+            }
+        )
+        response.raise_for_status()
+
+        data = response.json()
+        response_text = data["choices"][0]["message"]["content"]
+
+        logger.info(f"Perplexity response: {response_text[:500]}...")
+
+        # Parse JSON from response
+        sources = parse_perplexity_response(response_text, name)
+
+        logger.info(f"Found {len(sources)} sources for {name}")
+        return sources
 
     except Exception as e:
         logger.error(f"Perplexity lookup failed: {e}")
@@ -126,15 +127,15 @@ def parse_perplexity_response(response_text: str, name: str) -> List[URLSource]:
                 if isinstance(item, dict) and "url" in item:
                     # Classify confidence based on domain
                     url = item.get("url", "")
-                    confidence = classify_source_confidence(url)
+                    tier = domain_tiers.tier(url)
 
                     sources.append(URLSource(
                         url=url,
                         title=item.get("title", ""),
                         description=item.get("description", ""),
                         source_name=item.get("source", ""),
-                        tier=1 if confidence == "high" else 2 if confidence == "medium" else 3,
-                        confidence=confidence,
+                        tier=tier,
+                        confidence=domain_tiers.describe(tier).get("confidence", "low"),
                     ))
 
     except json.JSONDecodeError:
@@ -144,44 +145,19 @@ def parse_perplexity_response(response_text: str, name: str) -> List[URLSource]:
         urls = re.findall(url_pattern, response_text)
 
         for idx, url in enumerate(urls[:15]):  # Limit to 15
-            confidence = classify_source_confidence(url)
+            tier = domain_tiers.tier(url)
             sources.append(URLSource(
                 url=url,
                 title=f"Source {idx + 1}",
                 description="Found via Perplexity search",
                 source_name=extract_domain(url),
-                tier=1 if confidence == "high" else 2 if confidence == "medium" else 3,
-                confidence=confidence,
+                tier=tier,
+                confidence=domain_tiers.describe(tier).get("confidence", "low"),
             ))
 
     return sources
 
 
-def classify_source_confidence(url: str) -> str:
-    """Classify source confidence based on domain"""
-    url_lower = url.lower()
-
-    high_confidence = [
-        "espn.com", "bbc.com", "cnn.com", "nytimes.com", "wsj.com",
-        "wikipedia.org", "linkedin.com", "reuters.com", "forbes.com",
-    ]
-
-    medium_confidence = [
-        "ufc.com", "sherdog.com", "tapology.com", "mmajunkie.com",
-        "imdb.com", "twitter.com", "instagram.com",
-    ]
-
-    for domain in high_confidence:
-        if domain in url_lower:
-            return "high"
-
-    for domain in medium_confidence:
-        if domain in url_lower:
-            return "medium"
-
-    return "low"
-
-
 def extract_domain(url: str) -> str:
     """Extract domain from URL"""
     try:
@@ -218,26 +194,26 @@ Return ONLY a JSON array with format:
 [{{"url": "...", "title": "...", "source": "...", "description": "..."}}]"""
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                PERPLEXITY_API_URL,
-                headers={
-                    "Authorization": f"Bearer {settings.PERPLEXITY_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": "sonar",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.3,
-                    "max_tokens": 1500,
-                }
-            )
-            response.raise_for_status()
-
-            data = response.json()
-            response_text = data["choices"][0]["message"]["content"]
-
-            return parse_perplexity_response(response_text, name)
+        client = http_clients.get("api")
+        response = await client.post(
+            PERPLEXITY_API_URL,
+            headers={
+                "Authorization": f"Bearer {settings.PERPLEXITY_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": "sonar",
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.3,
+                "max_tokens": 1500,
+            }
+        )
+        response.raise_for_status()
+
+        data = response.json()
+        response_text = data["choices"][0]["message"]["content"]
+
+        return parse_perplexity_response(response_text, name)
 
     except Exception as e:
         logger.error(f"Deep research failed: {e}")
@@ -0,0 +1,249 @@
+"""
+Dependency-Graph Scheduler - Runs async nodes as soon as their inputs resolve
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GraphError(Exception):
+    """Raised when a node graph is malformed (unknown input, cycle, duplicate key)"""
+
+
+@dataclass(frozen=True)
+class Node:
+    """
+    A unit of work in the generation graph.
+
+    `run` is called as run(context, *inputs) where inputs are the results of
+    the nodes (or published outputs) named in `inputs`, in the same order.
+
+    A node that lists keys in `provides` is also passed publish=fn(key, value)
+    and can resolve those keys before it finishes, letting dependents start early.
+    """
+    key: str
+    run: Callable[..., Awaitable[str]]
+    inputs: Tuple[str, ...] = ()
+    weight: float = 1.0
+    label: str = ""
+    provides: Tuple[str, ...] = ()
+
+
+@dataclass
+class NodeTiming:
+    key: str
+    started: float
+    finished: float
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+NodeCallback = Callable[[Node], None]
+NodeDoneCallback = Callable[[Node, str, float], None]
+PublishCallback = Callable[[Node, str, str], None]
+
+
+def output_owners(nodes: List[Node]) -> Dict[str, str]:
+    """Map every resolvable key (node keys and published outputs) to the node producing it"""
+    owners: Dict[str, str] = {}
+    for node in nodes:
+        for key in (node.key,) + tuple(node.provides):
+            if key in owners:
+                raise GraphError(f"Duplicate node key: {key}")
+            owners[key] = node.key
+    return owners
+
+
+def validate_graph(nodes: List[Node]) -> List[str]:
+    """
+    Check the graph and return node keys in topological order.
+
+    Raises:
+        GraphError: on duplicate keys, unknown inputs or cycles
+    """
+    by_key = {n.key: n for n in nodes}
+    owners = output_owners(nodes)
+
+    for node in nodes:
+        for dep in node.inputs:
+            if dep not in owners:
+                raise GraphError(f"Node {node.key} depends on unknown input {dep}")
+
+    order: List[str] = []
+    state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+    def visit(key: str, path: Tuple[str, ...]):
+        if state.get(key) == 2:
+            return
+        if state.get(key) == 1:
+            raise GraphError(f"Cycle detected: {' -> '.join(path + (key,))}")
+        state[key] = 1
+        for dep in by_key[key].inputs:
+            visit(owners[dep], path + (key,))
+        state[key] = 2
+        order.append(key)
+
+    for node in nodes:
+        visit(node.key, ())
+
+    return order
+
+
+def critical_path(nodes: List[Node], timings: Dict[str, NodeTiming]) -> List[str]:
+    """
+    Walk back from the last node to finish, following whichever input
+    finished last at each step. This is the chain that bounded wall-clock time.
+    Published outputs appear under their own key and inherit their owner's inputs.
+    """
+    by_key = {n.key: n for n in nodes}
+    owners = output_owners(nodes)
+    finished = [t for t in timings.values() if t.key in by_key]
+    if not finished:
+        return []
+
+    path = [max(finished, key=lambda t: t.finished).key]
+    while True:
+        deps = [d for d in by_key[owners[path[-1]]].inputs if d in timings]
+        if not deps:
+            break
+        path.append(max(deps, key=lambda d: timings[d].finished))
+
+    return list(reversed(path))
+
+
+async def run_graph(
+    nodes: List[Node],
+    context: dict,
+    on_start: Optional[NodeCallback] = None,
+    on_done: Optional[NodeDoneCallback] = None,
+    on_publish: Optional[PublishCallback] = None,
+    completed: Optional[Dict[str, str]] = None,
+    fail_fast: bool = True,
+) -> Dict[str, str]:
+    """
+    Run every node concurrently, each one starting the moment its inputs are ready.
+
+    If any node fails, the error is re-raised once the graph stops: immediately
+    (cancelling everything else) with fail_fast, otherwise after every node
+    that does not depend on the failure has finished.
+
+    Args:
+        nodes: Graph nodes
+        context: Shared generation context passed to every node
+        on_start: Optional callback when a node starts running
+        on_done: Optional callback with (node, result, duration_seconds)
+        on_publish: Optional callback with (node, output_key, value) for published outputs
+        completed: Results from an earlier run, keyed like the return value.
+            Published outputs found here are resolved up front, and a node whose
+            key and outputs are all present is not run again. Callbacks are not
+            invoked for restored results.
+        fail_fast: Cancel the remaining nodes as soon as one fails
+
+    Returns:
+        Dict of node key (and published output key) -> result
+    """
+    order = validate_graph(nodes)
+    by_key = {n.key: n for n in nodes}
+    timings: Dict[str, NodeTiming] = {}
+    graph_start = time.monotonic()
+    loop = asyncio.get_running_loop()
+    tasks: Dict[str, asyncio.Task] = {}
+    published: Dict[str, asyncio.Future] = {
+        key: loop.create_future() for node in nodes for key in node.provides
+    }
+
+    completed = completed or {}
+    for key, future in published.items():
+        if key in completed:
+            future.set_result(completed[key])
+
+    def resolve(key: str) -> Awaitable[str]:
+        return published[key] if key in published else tasks[key]
+
+    async def run_node(node: Node) -> str:
+        if node.key in completed and all(key in completed for key in node.provides):
+            logger.info(f"Node {node.key} restored from checkpoint")
+            return completed[node.key]
+
+        args = [await resolve(dep) for dep in node.inputs]
+
+        if on_start:
+            on_start(node)
+
+        started = time.monotonic()
+        kwargs = {}
+        if node.provides:
+            def publish(key: str, value: str):
+                if key not in node.provides:
+                    raise GraphError(f"Node {node.key} cannot publish undeclared output {key}")
+                if published[key].done():
+                    return
+                published[key].set_result(value)
+                timings[key] = NodeTiming(key, started - graph_start, time.monotonic() - graph_start)
+                logger.info(f"Node {node.key} published {key} at +{time.monotonic() - graph_start:.1f}s")
+                if on_publish:
+                    on_publish(node, key, value)
+            kwargs["publish"] = publish
+
+        try:
+            result = await node.run(context, *args, **kwargs)
+        except asyncio.CancelledError:
+            for key in node.provides:
+                published[key].cancel()
+            raise
+        except Exception as e:
+            for key in node.provides:
+                if not published[key].done():
+                    published[key].set_exception(e)
+                    published[key].exception()  # mark retrieved; dependents re-raise it
+            raise
+        finished = time.monotonic()
+
+        for key in node.provides:
+            if not published[key].done():
+                raise GraphError(f"Node {node.key} finished without publishing {key}")
+
+        timings[node.key] = NodeTiming(node.key, started - graph_start, finished - graph_start)
+        logger.info(
+            f"Node {node.key} finished in {finished - started:.1f}s "
+            f"(started at +{started - graph_start:.1f}s)"
+        )
+
+        if on_done:
+            on_done(node, result, finished - started)
+
+        return result
+
+    # All tasks are registered before any of them runs, so dependency lookups never miss
+    for key in order:
+        tasks[key] = asyncio.create_task(run_node(by_key[key]), name=f"graph:{key}")
+
+    try:
+        if fail_fast:
+            await asyncio.gather(*tasks.values())
+        else:
+            outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+            errors = [o for o in outcomes if isinstance(o, BaseException)]
+            if errors:
+                raise errors[0]
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    path = critical_path(nodes, timings)
+    logger.info(
+        f"Graph complete in {time.monotonic() - graph_start:.1f}s, "
+        f"critical path: {' -> '.join(path)}"
+    )
+
+    results = {key: task.result() for key, task in tasks.items()}
+    results.update({key: future.result() for key, future in published.items()})
+    return results
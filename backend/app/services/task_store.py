@@ -0,0 +1,491 @@
+"""
+Task Store - Case state and generated documents for /api/status and /api/download
+
+Two backends:
+- memory: module-local dict, single worker only, lost on restart
+- database: Case/Document tables via SQLAlchemy (Postgres in production,
+  SQLite via sqlite+aiosqlite for local runs and tests), shared by all workers
+"""
+import asyncio
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+
+from sqlalchemy import case as sql_case, delete, select, update
+
+from app.config import settings
+from app.models import GenerateRequest, Case, Document, CaseURL, CaseFile, CaseCheckpoint
+
+logger = logging.getLogger(__name__)
+
+# Document metadata returned by the status endpoint (no bodies)
+DOCUMENT_FIELDS = ("number", "name", "word_count", "page_count")
+
+# Checkpoint key holding the original GenerateRequest (JSON) so a case can be resumed
+REQUEST_KEY = "request"
+
+RESUME_MESSAGE = "Resuming generation from checkpoints..."
+
+
+class TaskStore(ABC):
+    """Interface shared by task store backends (all methods must be implemented)"""
+
+    @abstractmethod
+    async def create(self, case_id: str, request: GenerateRequest) -> None:
+        ...
+
+    @abstractmethod
+    async def update_progress(self, case_id: str, stage: str, progress: int, message: str) -> None:
+        ...
+
+    @abstractmethod
+    async def complete(self, case_id: str, documents: List[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def fail(self, case_id: str, error: str) -> None:
+        ...
+
+    @abstractmethod
+    async def get_status(self, case_id: str) -> Optional[dict]:
+        """Case status with document metadata only - never document bodies"""
+
+    @abstractmethod
+    async def get_documents(self, case_id: str) -> Optional[List[dict]]:
+        """Full documents (with content) ordered by number, or None if the case is unknown"""
+
+    @abstractmethod
+    async def save_checkpoint(self, case_id: str, key: str, content: str) -> None:
+        """Persist a finished document or Doc 1 part (replacing any earlier one)"""
+
+    @abstractmethod
+    async def get_checkpoints(self, case_id: str) -> Dict[str, str]:
+        """Checkpointed results by graph key (e.g. "doc4", "doc1.part2")"""
+
+    @abstractmethod
+    async def get_request(self, case_id: str) -> Optional[GenerateRequest]:
+        """The request the case was started with, or None if it can no longer be resumed"""
+
+    @abstractmethod
+    async def restart(self, case_id: str) -> bool:
+        """Move a failed case back to processing. Returns False if the case is not failed."""
+
+
+class MemoryTaskStore(TaskStore):
+    """In-process store. Keeps at most `max_tasks` cases, evicting the oldest finished ones."""
+
+    def __init__(self, max_tasks: int = 500):
+        self.max_tasks = max_tasks
+        self.tasks: Dict[str, dict] = {}
+        self.requests: Dict[str, GenerateRequest] = {}
+        self.checkpoints: Dict[str, Dict[str, str]] = {}
+
+    async def create(self, case_id: str, request: GenerateRequest) -> None:
+        self._evict()
+        self.tasks[case_id] = {
+            "case_id": case_id,
+            "status": "processing",
+            "progress": 0,
+            "current_stage": "Initializing",
+            "current_message": "Starting document generation...",
+            "documents": None,
+            "error_message": None,
+            "created_at": datetime.utcnow(),
+            "completed_at": None,
+        }
+        self.requests[case_id] = request
+        self.checkpoints[case_id] = {}
+
+    async def update_progress(self, case_id: str, stage: str, progress: int, message: str) -> None:
+        task = self.tasks.get(case_id)
+        if task is None:
+            return
+        task["progress"] = max(task["progress"], progress)
+        task["current_stage"] = stage
+        task["current_message"] = message
+
+    async def complete(self, case_id: str, documents: List[dict]) -> None:
+        task = self.tasks[case_id]
+        task["status"] = "completed"
+        task["progress"] = 100
+        task["current_stage"] = "Complete"
+        task["current_message"] = f"All {len(documents)} documents generated!"
+        task["documents"] = documents
+        task["completed_at"] = datetime.utcnow()
+        self.requests.pop(case_id, None)
+        self.checkpoints.pop(case_id, None)
+
+    async def fail(self, case_id: str, error: str) -> None:
+        task = self.tasks[case_id]
+        task["status"] = "failed"
+        task["error_message"] = error
+        task["current_stage"] = "Error"
+        task["current_message"] = f"Generation failed: {error}"
+
+    async def get_status(self, case_id: str) -> Optional[dict]:
+        task = self.tasks.get(case_id)
+        if task is None:
+            return None
+        status = dict(task)
+        if task.get("documents"):
+            status["documents"] = [{k: d[k] for k in DOCUMENT_FIELDS} for d in task["documents"]]
+        return status
+
+    async def get_documents(self, case_id: str) -> Optional[List[dict]]:
+        task = self.tasks.get(case_id)
+        if task is None:
+            return None
+        return task.get("documents") or []
+
+    async def save_checkpoint(self, case_id: str, key: str, content: str) -> None:
+        if case_id in self.checkpoints:
+            self.checkpoints[case_id][key] = content
+
+    async def get_checkpoints(self, case_id: str) -> Dict[str, str]:
+        return dict(self.checkpoints.get(case_id, {}))
+
+    async def get_request(self, case_id: str) -> Optional[GenerateRequest]:
+        return self.requests.get(case_id)
+
+    async def restart(self, case_id: str) -> bool:
+        task = self.tasks.get(case_id)
+        if task is None or task["status"] != "failed":
+            return False
+        task["status"] = "processing"
+        task["error_message"] = None
+        task["current_stage"] = "Resuming"
+        task["current_message"] = RESUME_MESSAGE
+        return True
+
+    def _evict(self):
+        if len(self.tasks) < self.max_tasks:
+            return
+        finished = sorted(
+            (t for t in self.tasks.values() if t["status"] in ("completed", "failed")),
+            key=lambda t: t["created_at"],
+        )
+        for task in finished[: len(self.tasks) - self.max_tasks + 1]:
+            del self.tasks[task["case_id"]]
+            self.requests.pop(task["case_id"], None)
+            self.checkpoints.pop(task["case_id"], None)
+
+
+class DatabaseTaskStore(TaskStore):
+    """Store backed by the Case/Document tables, safe to share across workers"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    @staticmethod
+    def _uuid(case_id: str) -> Optional[uuid.UUID]:
+        try:
+            return uuid.UUID(case_id)
+        except ValueError:
+            return None
+
+    async def create(self, case_id: str, request: GenerateRequest) -> None:
+        b = request.beneficiary_info
+        async with self.session_factory() as session:
+            session.add(Case(
+                id=uuid.UUID(case_id),
+                beneficiary_name=b.full_name,
+                profession=b.profession,
+                visa_type=b.visa_type.value,
+                brief_type=b.brief_type.value,
+                email=b.email,
+                nationality=b.nationality,
+                current_status=b.current_status,
+                field_of_expertise=b.field_of_expertise,
+                background_info=b.background_info,
+                additional_info=b.additional_info,
+                petitioner_name=b.petitioner_name,
+                petitioner_organization=b.petitioner_organization,
+                status="processing",
+                progress=0,
+                current_stage="Initializing",
+                current_message="Starting document generation...",
+                urls=[
+                    CaseURL(
+                        url=u.url,
+                        title=u.title,
+                        description=u.description,
+                        source_name=u.source_name,
+                        tier=u.tier,
+                    )
+                    for u in request.urls
+                ],
+                files=[
+                    CaseFile(
+                        filename=f.filename,
+                        file_type=f.file_type,
+                        extracted_text=f.extracted_text,
+                        word_count=f.word_count,
+                    )
+                    for f in request.uploaded_files
+                ],
+                checkpoints=[
+                    CaseCheckpoint(key=REQUEST_KEY, content=request.model_dump_json()),
+                ],
+            ))
+            await session.commit()
+
+    async def update_progress(self, case_id: str, stage: str, progress: int, message: str) -> None:
+        # Single UPDATE so concurrent writers never interleave a read-modify-write;
+        # progress only moves forward
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Case)
+                .where(Case.id == uuid.UUID(case_id))
+                .values(
+                    progress=sql_case((Case.progress < progress, progress), else_=Case.progress),
+                    current_stage=stage,
+                    current_message=message,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            await session.commit()
+
+    async def complete(self, case_id: str, documents: List[dict]) -> None:
+        cid = uuid.UUID(case_id)
+        async with self.session_factory() as session:
+            session.add_all([
+                Document(
+                    case_id=cid,
+                    document_number=d["number"],
+                    document_name=d["name"],
+                    content=d["content"],
+                    word_count=d["word_count"],
+                    page_count=d["page_count"],
+                )
+                for d in documents
+            ])
+            # Documents are stored for good now; partial results are no longer needed
+            await session.execute(delete(CaseCheckpoint).where(CaseCheckpoint.case_id == cid))
+            await session.execute(
+                update(Case)
+                .where(Case.id == cid)
+                .values(
+                    status="completed",
+                    progress=100,
+                    current_stage="Complete",
+                    current_message=f"All {len(documents)} documents generated!",
+                    completed_at=datetime.utcnow(),
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            await session.commit()
+
+    async def fail(self, case_id: str, error: str) -> None:
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Case)
+                .where(Case.id == uuid.UUID(case_id))
+                .values(
+                    status="failed",
+                    error_message=error,
+                    current_stage="Error",
+                    current_message=f"Generation failed: {error}",
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            await session.commit()
+
+    async def get_status(self, case_id: str) -> Optional[dict]:
+        cid = self._uuid(case_id)
+        if cid is None:
+            return None
+
+        async with self.session_factory() as session:
+            row = (await session.execute(
+                select(
+                    Case.status,
+                    Case.progress,
+                    Case.current_stage,
+                    Case.current_message,
+                    Case.error_message,
+                    Case.created_at,
+                    Case.completed_at,
+                ).where(Case.id == cid)
+            )).one_or_none()
+            if row is None:
+                return None
+
+            docs = (await session.execute(
+                select(
+                    Document.document_number,
+                    Document.document_name,
+                    Document.word_count,
+                    Document.page_count,
+                )
+                .where(Document.case_id == cid)
+                .order_by(Document.document_number)
+            )).all()
+
+        return {
+            "case_id": case_id,
+            "status": row.status,
+            "progress": row.progress,
+            "current_stage": row.current_stage,
+            "current_message": row.current_message,
+            "error_message": row.error_message,
+            "documents": [
+                {
+                    "number": d.document_number,
+                    "name": d.document_name,
+                    "word_count": d.word_count,
+                    "page_count": d.page_count,
+                }
+                for d in docs
+            ] or None,
+            "created_at": row.created_at,
+            "completed_at": row.completed_at,
+        }
+
+    async def get_documents(self, case_id: str) -> Optional[List[dict]]:
+        cid = self._uuid(case_id)
+        if cid is None:
+            return None
+
+        async with self.session_factory() as session:
+            if await session.get(Case, cid) is None:
+                return None
+            docs = (await session.execute(
+                select(Document)
+                .where(Document.case_id == cid)
+                .order_by(Document.document_number)
+            )).scalars().all()
+
+        return [
+            {
+                "number": d.document_number,
+                "name": d.document_name,
+                "content": d.content,
+                "word_count": d.word_count,
+                "page_count": d.page_count,
+            }
+            for d in docs
+        ]
+
+    async def save_checkpoint(self, case_id: str, key: str, content: str) -> None:
+        cid = uuid.UUID(case_id)
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(CaseCheckpoint)
+                .where(CaseCheckpoint.case_id == cid, CaseCheckpoint.key == key)
+            )
+            session.add(CaseCheckpoint(case_id=cid, key=key, content=content))
+            await session.commit()
+
+    async def _checkpoint_rows(self, case_id: str, request: bool) -> List:
+        cid = self._uuid(case_id)
+        if cid is None:
+            return []
+        key_filter = CaseCheckpoint.key == REQUEST_KEY if request else CaseCheckpoint.key != REQUEST_KEY
+        async with self.session_factory() as session:
+            return (await session.execute(
+                select(CaseCheckpoint.key, CaseCheckpoint.content)
+                .where(CaseCheckpoint.case_id == cid, key_filter)
+            )).all()
+
+    async def get_checkpoints(self, case_id: str) -> Dict[str, str]:
+        return {row.key: row.content for row in await self._checkpoint_rows(case_id, request=False)}
+
+    async def get_request(self, case_id: str) -> Optional[GenerateRequest]:
+        rows = await self._checkpoint_rows(case_id, request=True)
+        if not rows:
+            return None
+        return GenerateRequest.model_validate_json(rows[0].content)
+
+    async def restart(self, case_id: str) -> bool:
+        cid = self._uuid(case_id)
+        if cid is None:
+            return False
+        # Conditional UPDATE so two concurrent resume calls cannot both win
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(Case)
+                .where(Case.id == cid, Case.status == "failed")
+                .values(
+                    status="processing",
+                    error_message=None,
+                    current_stage="Resuming",
+                    current_message=RESUME_MESSAGE,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+
+class CheckpointWriter:
+    """
+    Synchronous checkpoint callback for generate_all_documents. Each result is
+    written in the background so generation never waits on the store.
+    """
+
+    def __init__(self, store: TaskStore, case_id: str):
+        self.store = store
+        self.case_id = case_id
+        self._tasks: List[asyncio.Task] = []
+
+    def __call__(self, key: str, content: str):
+        self._tasks.append(asyncio.create_task(self._save(key, content)))
+
+    async def _save(self, key: str, content: str):
+        try:
+            await self.store.save_checkpoint(self.case_id, key, content)
+        except Exception as e:
+            logger.warning(f"Checkpoint {key} failed for case {self.case_id}: {e}")
+
+    async def flush(self):
+        """Wait until every checkpoint has been written"""
+        await asyncio.gather(*self._tasks)
+
+
+class ProgressReporter:
+    """
+    Synchronous progress callback for generate_all_documents that writes to the
+    store from a single background task, in order, coalescing bursts so only
+    the latest state is written.
+    """
+
+    def __init__(self, store: TaskStore, case_id: str):
+        self.store = store
+        self.case_id = case_id
+        self._latest = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __call__(self, stage: str, progress: int, message: str):
+        self._latest = (stage, progress, message)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while self._latest is not None:
+            stage, progress, message = self._latest
+            self._latest = None
+            try:
+                await self.store.update_progress(self.case_id, stage, progress, message)
+            except Exception as e:
+                logger.warning(f"Progress update failed for case {self.case_id}: {e}")
+
+    async def flush(self):
+        """Wait until every reported update has been written"""
+        if self._task is not None:
+            await self._task
+
+
+def create_task_store() -> TaskStore:
+    """Build the task store selected by settings.TASK_STORE ("memory" or "database")"""
+    if settings.TASK_STORE == "database":
+        from app.database import async_session
+        logger.info("Using database task store")
+        return DatabaseTaskStore(async_session)
+
+    if settings.TASK_STORE != "memory":
+        raise ValueError(f"Unknown TASK_STORE: {settings.TASK_STORE}")
+
+    logger.info("Using in-memory task store (single worker only)")
+    return MemoryTaskStore()
@@ -0,0 +1,311 @@
+"""
+Upload Stream - Multipart uploads spooled to temp files as they arrive
+
+The request body is parsed incrementally instead of being buffered whole:
+each file part is written to memory up to UPLOAD_SPOOL_MB and to a temp file
+beyond that, size limits are enforced while the bytes arrive, and each file
+is handed to extraction as soon as its part ends. Results are produced per
+file as they complete.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional
+import logging
+
+import multipart
+from multipart.multipart import parse_options_header
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.services.file_processor import process_file
+
+logger = logging.getLogger(__name__)
+
+
+class UploadError(Exception):
+    """The upload request as a whole was rejected (status code for the HTTP response)"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SpooledUpload:
+    """
+    One uploaded file: held in memory up to `spool_bytes`, then moved to a
+    temp file. Hashed while written, so the extraction cache need not read
+    it again. Past `max_bytes` the data is dropped and `too_large` is set.
+    """
+
+    def __init__(self, filename: str, spool_bytes: int, max_bytes: int):
+        self.filename = filename
+        self.spool_bytes = spool_bytes
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.too_large = False
+        self.path: Optional[str] = None
+        self._buffer = bytearray()
+        self._file = None
+        self._digest = hashlib.sha256()
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.too_large:
+            return
+        if self.size > self.max_bytes:
+            self.too_large = True
+            await self.discard()
+            return
+
+        self._digest.update(data)
+        if self._file is None and self.size <= self.spool_bytes:
+            self._buffer += data
+            return
+        if self._file is None:
+            fd, self.path = tempfile.mkstemp(suffix=os.path.splitext(self.filename)[1])
+            self._file = os.fdopen(fd, "wb")
+            data = bytes(self._buffer) + data
+            self._buffer = bytearray()
+        await asyncio.to_thread(self._file.write, data)
+
+    async def finish(self):
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    @property
+    def content(self) -> Optional[bytes]:
+        """The bytes, if the file stayed in memory (None once spilled to disk)"""
+        return None if self.path else bytes(self._buffer)
+
+    async def discard(self):
+        self._buffer = bytearray()
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class NDJSONResponse(StreamingResponse):
+    """
+    Streams results while the request body is still being read.
+
+    StreamingResponse normally watches `receive` for a disconnect, which
+    would swallow the body messages the upload parser is waiting on; here
+    a disconnect surfaces in the parser instead.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await self.stream_response(send)
+
+
+def check_upload_request(request: Request, max_total_bytes: int) -> bytes:
+    """
+    Reject an upload before reading its body.
+
+    Returns:
+        The multipart boundary
+
+    Raises:
+        UploadError: Not multipart/form-data, or Content-Length over the limit
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError(400, "Expected a multipart/form-data upload")
+
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_total_bytes:
+        raise UploadError(413, f"Upload exceeds the {max_total_bytes // (1024 * 1024)} MB limit")
+    return params[b"boundary"]
+
+
+async def stream_uploads(request: Request) -> AsyncIterator[SpooledUpload]:
+    """
+    Parse a multipart request body as it arrives, yielding each file part
+    once it is complete (including parts that went over the per-file limit,
+    flagged `too_large`). Non-file fields are ignored.
+
+    The caller owns yielded uploads and must discard() them.
+
+    Raises:
+        UploadError: Malformed body or more than UPLOAD_MAX_TOTAL_MB in total
+    """
+    max_total = settings.UPLOAD_MAX_TOTAL_MB * 1024 * 1024
+    max_file = settings.UPLOAD_MAX_FILE_MB * 1024 * 1024
+    spool = settings.UPLOAD_SPOOL_MB * 1024 * 1024
+    boundary = check_upload_request(request, max_total)
+
+    # Parser callbacks are synchronous; they queue work that is awaited after each chunk
+    pending = []
+    finished = []
+    state = {"headers": {}, "header": b"", "value": b"", "upload": None}
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["upload"] = None
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header"].lower()] = state["value"]
+        state["header"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if b"filename" in options:
+            filename = options[b"filename"].decode("utf-8", errors="replace")
+            state["upload"] = SpooledUpload(filename, spool, max_file)
+
+    def on_part_data(data, start, end):
+        if state["upload"] is not None:
+            pending.append((state["upload"], data[start:end]))
+
+    def on_part_end():
+        if state["upload"] is not None:
+            finished.append(state["upload"])
+            state["upload"] = None
+
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_total:
+                raise UploadError(413, f"Upload exceeds the {settings.UPLOAD_MAX_TOTAL_MB} MB limit")
+            try:
+                parser.write(chunk)
+            except multipart.exceptions.MultipartParseError as e:
+                raise UploadError(400, f"Malformed multipart body: {e}")
+
+            for upload, data in pending:
+                await upload.write(data)
+            pending.clear()
+            while finished:
+                # Popped only once finished, so a cancelled finish() is still cleaned up below
+                await finished[0].finish()
+                yield finished.pop(0)
+        parser.finalize()
+    finally:
+        # Parts still being received when the request failed or was abandoned
+        current = state["upload"]
+        for upload in finished + ([current] if current is not None else []):
+            await upload.discard()
+
+
+async def process_uploads(request: Request) -> AsyncIterator[dict]:
+    """
+    Stream, extract and report the files of an upload request.
+
+    Files are extracted as soon as they are received, at most
+    UPLOAD_CONCURRENCY at a time, and an event is yielded per file as it
+    completes:
+        {"event": "file", "index", "filename", "file_type", "extracted_text",
+         "word_count", "page_count", "cache_hit"}
+        {"event": "failed", "index", "filename", "error"}
+    followed by {"event": "error", "status_code", "error"} if the request
+    was rejected part-way, and finally {"event": "done", "processed", "failed"}.
+    `index` is the file's position in the upload.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+    uploads: List[SpooledUpload] = []
+    tasks: List[asyncio.Task] = []
+
+    async def handle(index: int, upload: SpooledUpload):
+        event = {"index": index, "filename": upload.filename}
+        try:
+            if upload.too_large:
+                raise UploadError(413, f"file exceeds the {settings.UPLOAD_MAX_FILE_MB} MB limit")
+            async with slots:
+                result = await process_file(
+                    upload.filename, upload.content, path=upload.path, sha256=upload.sha256
+                )
+            logger.info(f"Processed file: {upload.filename} ({result['word_count']} words)")
+            event.update(
+                event="file",
+                filename=result["filename"],
+                file_type=result["file_type"],
+                extracted_text=result["extracted_text"],
+                word_count=result["word_count"],
+                page_count=result["page_count"],
+                cache_hit=result["cache_hit"],
+            )
+        except Exception as e:
+            logger.error(f"Failed to process {upload.filename}: {e}")
+            event.update(event="failed", error=str(e))
+        finally:
+            await upload.discard()
+        await events.put(event)
+
+    async def ingest():
+        try:
+            async for upload in stream_uploads(request):
+                uploads.append(upload)
+                tasks.append(asyncio.create_task(handle(len(tasks), upload)))
+            await asyncio.gather(*tasks)
+        except UploadError as e:
+            await asyncio.gather(*tasks)
+            await events.put({"event": "error", "status_code": e.status_code, "error": str(e)})
+        except Exception as e:
+            logger.error(f"Upload stream failed: {e}")
+            await asyncio.gather(*tasks)
+            await events.put({"event": "error", "status_code": 400, "error": f"Upload interrupted: {e}"})
+        finally:
+            await events.put(None)
+
+    ingest_task = asyncio.create_task(ingest())
+    counts = {"file": 0, "failed": 0}
+    try:
+        while (event := await events.get()) is not None:
+            if event["event"] in counts:
+                counts[event["event"]] += 1
+            yield event
+        yield {"event": "done", "processed": counts["file"], "failed": counts["failed"]}
+    finally:
+        # Client went away: stop reading and extracting
+        if not ingest_task.done():
+            ingest_task.cancel()
+            for task in tasks:
+                task.cancel()
+            # Shielded: the response's own cancellation must not skip the cleanup
+            await asyncio.shield(asyncio.create_task(discard_abandoned(ingest_task, tasks, uploads)))
+
+
+async def discard_abandoned(ingest_task: asyncio.Task, tasks: List[asyncio.Task], uploads: List[SpooledUpload]):
+    """
+    Wait for cancelled upload tasks to settle, then discard the uploads whose
+    task was cancelled: one cancelled before it started never reaches its own
+    discard().
+    """
+    await asyncio.gather(ingest_task, *tasks, return_exceptions=True)
+    for upload, task in zip(uploads, tasks):
+        if task.cancelled():
+            await upload.discard()
@@ -0,0 +1,130 @@
+"""
+URL Cache - Extracted evidence URL content kept on disk between cases
+
+Entries are keyed by normalized URL and hold the extracted title/content plus
+the response's ETag/Last-Modified validators. An entry is served as-is while
+fresh, served and revalidated in the background while stale, and revalidated
+with a conditional request after that.
+"""
+import json
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import logging
+
+from app.config import settings
+from app.services.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref_src"}
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+
+def normalize_url(url: str) -> str:
+    """
+    Cache key form of a URL: lower-cased scheme and host, default port,
+    fragment and tracking parameters dropped, remaining query sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+@dataclass
+class CachedPage:
+    url: str
+    title: str
+    content: str
+    content_type: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    validated_at: float
+
+    def age(self) -> float:
+        return time.time() - self.validated_at
+
+
+class URLCache:
+    """
+    Args:
+        path: SQLite file for the entries
+        max_bytes: LRU size bound of the cache file's values
+        ttl_seconds: Age up to which an entry is served without contacting the origin
+        stale_seconds: Further window in which the entry is still served while
+            a background revalidation runs
+    """
+
+    def __init__(self, path: Path, max_bytes: int, ttl_seconds: float, stale_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        # Entries past the stale window are kept (until evicted) for their validators
+        self.store = DiskCache(path, max_bytes=max_bytes, name="url_pages")
+        self.counts = {"fresh": 0, "stale": 0, "revalidated": 0, "changed": 0, "miss": 0}
+
+    def freshness(self, page: CachedPage) -> str:
+        age = page.age()
+        if age < self.ttl_seconds:
+            return FRESH
+        if age < self.ttl_seconds + self.stale_seconds:
+            return STALE
+        return EXPIRED
+
+    async def get(self, url: str) -> Optional[CachedPage]:
+        try:
+            value = await self.store.aget(normalize_url(url))
+        except Exception as e:
+            logger.warning(f"URL cache read failed for {url}: {e}")
+            return None
+        if value is None:
+            return None
+        try:
+            return CachedPage(**json.loads(value))
+        except Exception:
+            return None
+
+    async def put(self, page: CachedPage):
+        try:
+            await self.store.aset(normalize_url(page.url), json.dumps(asdict(page)).encode("utf-8"))
+        except Exception as e:
+            logger.warning(f"URL cache write failed for {page.url}: {e}")
+
+    def count(self, outcome: str):
+        self.counts[outcome] += 1
+
+    async def stats(self) -> dict:
+        lookups = sum(self.counts.values())
+        served = self.counts["fresh"] + self.counts["stale"] + self.counts["revalidated"]
+        return {
+            **await self.store.astats(),
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "lookups": self.counts,
+            # Hits include 304 revalidations: the body was not downloaded again
+            "hit_rate": round(served / lookups, 3) if lookups else None,
+        }
+
+
+url_cache: Optional[URLCache] = None
+if settings.URL_CACHE_ENABLED:
+    url_cache = URLCache(
+        Path(settings.CACHE_DIR) / "url_pages.sqlite3",
+        max_bytes=settings.URL_CACHE_MAX_MB * 1024 * 1024,
+        ttl_seconds=settings.URL_CACHE_TTL_HOURS * 3600,
+        stale_seconds=settings.URL_CACHE_STALE_HOURS * 3600,
+    )
@@ -3,22 +3,36 @@ Async URL Fetcher - Fetches and extracts content from URLs
 """
 import httpx
 import asyncio
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from urllib.parse import urlparse
 import re
 import logging
 
+from app.services.domain_tiers import domain_tiers
+from app.services.html_extractor import extract_page_bytes
+from app.services.http_client import http_clients
+from app.services.url_cache import FRESH, STALE, CachedPage, normalize_url, url_cache
+
 logger = logging.getLogger(__name__)
 
 # Timeout for URL fetches
 FETCH_TIMEOUT = 15.0
 
+# Overall time allowed per URL, including a slowly trickling body
+MAX_FETCH_SECONDS = 30.0
+
 # Max content length to extract (characters)
 MAX_CONTENT_LENGTH = 15000
 
-# User agent for requests
-USER_AGENT = "Mozilla/5.0 (compatible; VisaPetitionBot/1.0)"
+# Bytes read per response. HTML is cut off at the cap (15k chars of text never
+# needs more); a PDF must be complete to parse, so a larger one is skipped.
+MAX_HTML_BYTES = 2 * 1024 * 1024
+MAX_PDF_BYTES = 10 * 1024 * 1024
+
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+PDF_CONTENT_TYPES = {"application/pdf", "application/x-pdf"}
 
 
 @dataclass
@@ -30,85 +44,204 @@ class FetchedURL:
     tier: int
     success: bool
     error: Optional[str] = None
+    content_type: str = ""
+    bytes_read: int = 0
+    fetch_seconds: float = 0.0
+    truncated: bool = False
+    cache_status: str = ""  # fresh, stale, revalidated, changed or miss ("" = cache off)
 
 
-# Tier 1 domains (major media)
-TIER_1_DOMAINS = {
-    "espn.com", "bbc.com", "cnn.com", "nytimes.com", "wsj.com",
-    "reuters.com", "usatoday.com", "foxsports.com", "nbcsports.com",
-    "cbssports.com", "theguardian.com", "forbes.com", "bloomberg.com",
-}
-
-# Tier 2 domains (industry/official)
-TIER_2_DOMAINS = {
-    "ufc.com", "nba.com", "nfl.com", "mlb.com", "fifa.com",
-    "sherdog.com", "tapology.com", "mmajunkie.com", "linkedin.com",
-    "wikipedia.org", "imdb.com", "scholar.google.com",
+@dataclass
+class Download:
+    status: int
+    kind: str = ""
+    content_type: str = ""
+    body: bytes = b""
+    truncated: bool = False
+    encoding: str = "utf-8"
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    cacheable: bool = True
+
+
+class UnfetchableContent(Exception):
+    """The response is a type or size that is not worth downloading"""
+
+
+# Counters for /api/metrics
+fetch_stats = {
+    "fetched": 0,
+    "failed": 0,
+    "pdfs": 0,
+    "truncated": 0,
+    "skipped": 0,
+    "bytes_total": 0,
+    "seconds_total": 0.0,
 }
 
 
-def get_domain_tier(domain: str) -> int:
-    """Determine the tier of a domain"""
-    domain_lower = domain.lower()
-    for tier1 in TIER_1_DOMAINS:
-        if tier1 in domain_lower:
-            return 1
-    for tier2 in TIER_2_DOMAINS:
-        if tier2 in domain_lower:
-            return 2
-    return 3
-
-
-def extract_text_from_html(html: str) -> str:
-    """Extract readable text from HTML"""
-    # Remove script and style elements
-    html = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    html = re.sub(r'<nav[^>]*>.*?</nav>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    html = re.sub(r'<footer[^>]*>.*?</footer>', '', html, flags=re.DOTALL | re.IGNORECASE)
-
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', ' ', html)
-
-    # Clean up whitespace
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
-
-    return text[:MAX_CONTENT_LENGTH]
-
-
-def extract_title(html: str) -> str:
-    """Extract title from HTML"""
-    match = re.search(r'<title[^>]*>([^<]+)</title>', html, re.IGNORECASE)
-    if match:
-        return match.group(1).strip()
-
-    # Try og:title
-    match = re.search(r'<meta[^>]*property=["\']og:title["\'][^>]*content=["\']([^"\']+)["\']', html, re.IGNORECASE)
-    if match:
-        return match.group(1).strip()
+def extract_text_from_pdf(data: bytes) -> Tuple[str, str]:
+    """
+    Extract (title, text) from a PDF's text layer with PyMuPDF, stopping once
+    MAX_CONTENT_LENGTH characters are collected. Scanned pages yield nothing;
+    evidence URLs are not worth an OCR call.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=data, filetype="pdf") as pdf:
+        title = (pdf.metadata or {}).get("title") or ""
+        parts = []
+        size = 0
+        for page in pdf:
+            page_text = page.get_text().strip()
+            if page_text:
+                parts.append(page_text)
+                size += len(page_text)
+            if size >= MAX_CONTENT_LENGTH:
+                break
+
+    text = re.sub(r'\s+', ' ', " ".join(parts)).strip()
+    return title.strip() or "Untitled", text[:MAX_CONTENT_LENGTH]
+
+
+def content_kind(content_type: str, url: str) -> Optional[str]:
+    """"html", "pdf", or None for a type we do not extract"""
+    if content_type in PDF_CONTENT_TYPES:
+        return "pdf"
+    if content_type in HTML_CONTENT_TYPES:
+        return "html"
+    # Missing or generic types: trust the URL's extension
+    if content_type in ("", "application/octet-stream", "binary/octet-stream"):
+        return "pdf" if urlparse(url).path.lower().endswith(".pdf") else "html"
+    return None
+
+
+async def read_capped(response: httpx.Response, limit: int) -> Tuple[bytes, bool]:
+    """Read at most `limit` bytes of the body; returns (body, truncated)"""
+    chunks = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= limit:
+            return b"".join(chunks)[:limit], True
+    return b"".join(chunks), False
+
+
+async def download(client: httpx.AsyncClient, url: str, cached: Optional[CachedPage] = None) -> Download:
+    """
+    Stream a URL, checking Content-Type and Content-Length before reading the
+    body and stopping at the byte cap for its kind. With a cached page the
+    request is conditional, and a 304 comes back as Download(status=304).
+    """
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    async with client.stream("GET", url, headers=headers, follow_redirects=True, timeout=FETCH_TIMEOUT) as response:
+        if response.status_code == 304 and cached is not None:
+            return Download(status=304)
+        response.raise_for_status()
 
-    return "Untitled"
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        kind = content_kind(content_type, str(response.url))
+        if kind is None:
+            raise UnfetchableContent(f"unsupported content type {content_type}")
+
+        limit = MAX_PDF_BYTES if kind == "pdf" else MAX_HTML_BYTES
+        declared = response.headers.get("content-length", "")
+        if kind == "pdf" and declared.isdigit() and int(declared) > limit:
+            raise UnfetchableContent(f"PDF too large ({int(declared):,} bytes)")
+
+        body, truncated = await read_capped(response, limit)
+        if kind == "pdf" and truncated:
+            raise UnfetchableContent(f"PDF larger than {limit:,} bytes")
+
+        return Download(
+            status=response.status_code,
+            kind=kind,
+            content_type=content_type,
+            body=body,
+            truncated=truncated,
+            encoding=response.encoding or "utf-8",
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            cacheable="no-store" not in response.headers.get("cache-control", "").lower(),
+        )
 
 
-async def fetch_single_url(client: httpx.AsyncClient, url: str) -> FetchedURL:
-    """Fetch a single URL and extract content"""
+def from_cache(url: str, page: CachedPage, cache_status: str) -> FetchedURL:
+    domain = urlparse(url).netloc
+    return FetchedURL(
+        url=url,
+        title=page.title,
+        content=page.content,
+        domain=domain,
+        tier=domain_tiers.tier(domain),
+        success=True,
+        content_type=page.content_type,
+        cache_status=cache_status,
+    )
+
+
+async def fetch_from_origin(
+    client: httpx.AsyncClient,
+    url: str,
+    cached: Optional[CachedPage] = None,
+) -> FetchedURL:
+    """Fetch and extract a URL, revalidating `cached` and storing the result when caching is on"""
     domain = urlparse(url).netloc
-    tier = get_domain_tier(domain)
+    tier = domain_tiers.tier(domain)
+    started = time.perf_counter()
 
     try:
-        response = await client.get(
-            url,
-            follow_redirects=True,
-            timeout=FETCH_TIMEOUT,
+        result = await asyncio.wait_for(download(client, url, cached), MAX_FETCH_SECONDS)
+
+        if result.status == 304:
+            cached.validated_at = time.time()
+            await url_cache.put(cached)
+            logger.info(f"Revalidated {url} (not modified) in {time.perf_counter() - started:.2f}s")
+            return from_cache(url, cached, "revalidated")
+
+        body = result.body
+        content_type = result.content_type
+        truncated = result.truncated
+        if result.kind == "pdf":
+            title, content = await asyncio.to_thread(extract_text_from_pdf, body)
+            fetch_stats["pdfs"] += 1
+        else:
+            title, content = await asyncio.to_thread(
+                extract_page_bytes, body, result.encoding, MAX_CONTENT_LENGTH
+            )
+
+        cache_status = ""
+        if url_cache is not None:
+            cache_status = "changed" if cached is not None else "miss"
+            if result.cacheable:
+                await url_cache.put(CachedPage(
+                    url=url,
+                    title=title,
+                    content=content,
+                    content_type=content_type,
+                    etag=result.etag,
+                    last_modified=result.last_modified,
+                    validated_at=time.time(),
+                ))
+
+        elapsed = time.perf_counter() - started
+        fetch_stats["fetched"] += 1
+        fetch_stats["bytes_total"] += len(body)
+        fetch_stats["seconds_total"] += elapsed
+        if truncated:
+            fetch_stats["truncated"] += 1
+
+        logger.info(
+            f"Fetched {url}: {len(content)} chars from {len(body):,} bytes "
+            f"{content_type or result.kind}{' (truncated)' if truncated else ''} in {elapsed:.2f}s"
         )
-        response.raise_for_status()
-
-        html = response.text
-        title = extract_title(html)
-        content = extract_text_from_html(html)
-
-        logger.info(f"Fetched {url}: {len(content)} chars")
 
         return FetchedURL(
             url=url,
@@ -117,10 +250,29 @@ async def fetch_single_url(client: httpx.AsyncClient, url: str) -> FetchedURL:
             domain=domain,
             tier=tier,
             success=True,
+            content_type=content_type,
+            bytes_read=len(body),
+            fetch_seconds=round(elapsed, 3),
+            truncated=truncated,
+            cache_status=cache_status,
         )
 
     except Exception as e:
-        logger.warning(f"Failed to fetch {url}: {e}")
+        elapsed = time.perf_counter() - started
+        if isinstance(e, UnfetchableContent):
+            fetch_stats["skipped"] += 1
+            error = str(e)
+        elif isinstance(e, asyncio.TimeoutError):
+            error = f"timed out after {MAX_FETCH_SECONDS:.0f}s"
+        else:
+            error = str(e)
+        fetch_stats["failed"] += 1
+        fetch_stats["seconds_total"] += elapsed
+        if cached is not None:
+            # Better an old copy than no evidence
+            logger.warning(f"Failed to revalidate {url} after {elapsed:.2f}s, using cached copy: {error}")
+            return from_cache(url, cached, "stale")
+        logger.warning(f"Failed to fetch {url} after {elapsed:.2f}s: {error}")
         return FetchedURL(
             url=url,
             title="",
@@ -128,10 +280,51 @@ async def fetch_single_url(client: httpx.AsyncClient, url: str) -> FetchedURL:
             domain=domain,
             tier=tier,
             success=False,
-            error=str(e),
+            error=error,
+            fetch_seconds=round(elapsed, 3),
         )
 
 
+# Background revalidations by normalized URL, so a stale page is refreshed once
+_revalidating: Dict[str, asyncio.Task] = {}
+
+
+def revalidate_in_background(client: httpx.AsyncClient, url: str, cached: CachedPage):
+    key = normalize_url(url)
+    if key in _revalidating:
+        return
+    task = asyncio.create_task(fetch_from_origin(client, url, cached))
+    _revalidating[key] = task
+    task.add_done_callback(lambda _: _revalidating.pop(key, None))
+
+
+async def fetch_single_url(client: httpx.AsyncClient, url: str) -> FetchedURL:
+    """
+    Fetch a single URL and extract content, going through the URL cache:
+    fresh entries are returned directly, stale ones are returned while a
+    background request revalidates them, and older ones are revalidated
+    with a conditional request before returning.
+    """
+    if url_cache is None:
+        return await fetch_from_origin(client, url)
+
+    cached = await url_cache.get(url)
+    if cached is not None:
+        freshness = url_cache.freshness(cached)
+        if freshness == FRESH:
+            url_cache.count("fresh")
+            return from_cache(url, cached, "fresh")
+        if freshness == STALE:
+            url_cache.count("stale")
+            revalidate_in_background(client, url, cached)
+            return from_cache(url, cached, "stale")
+
+    result = await fetch_from_origin(client, url, cached)
+    if result.cache_status:
+        url_cache.count(result.cache_status)
+    return result
+
+
 async def fetch_urls(urls: List[str], max_concurrent: int = 10) -> List[FetchedURL]:
     """
     Fetch multiple URLs concurrently.
@@ -157,41 +350,29 @@ async def fetch_urls(urls: List[str], max_concurrent: int = 10) -> List[FetchedU
         async with semaphore:
             return await fetch_single_url(client, url)
 
-    async with httpx.AsyncClient(
-        headers={"User-Agent": USER_AGENT},
-        follow_redirects=True,
-    ) as client:
-        tasks = [fetch_with_semaphore(client, url) for url in unique_urls]
-        results = await asyncio.gather(*tasks)
+    # Shared keep-alive client; it also caps concurrent requests per host
+    client = http_clients.get("web")
+    tasks = [fetch_with_semaphore(client, url) for url in unique_urls]
+    results = await asyncio.gather(*tasks)
 
     # Sort by tier (lower is better)
     results.sort(key=lambda x: (x.tier, not x.success))
 
     success_count = sum(1 for r in results if r.success)
-    logger.info(f"Successfully fetched {success_count}/{len(results)} URLs")
+    cached_count = sum(1 for r in results if r.cache_status in ("fresh", "stale", "revalidated"))
+    logger.info(f"Successfully fetched {success_count}/{len(results)} URLs ({cached_count} from cache)")
 
     return results
 
 
 def analyze_publication_quality(domain: str) -> dict:
     """Analyze the quality/tier of a publication domain"""
-    tier = get_domain_tier(domain)
-
-    tier_names = {
-        1: "Major Media",
-        2: "Trade Publication",
-        3: "Online Media",
-    }
-
-    reach_estimates = {
-        1: "Millions (national/international)",
-        2: "Hundreds of thousands (industry-specific)",
-        3: "Thousands to tens of thousands",
-    }
+    tier = domain_tiers.tier(domain)
+    info = domain_tiers.describe(tier)
 
     return {
-        "tier": tier_names.get(tier, "Unknown"),
+        "tier": info.get("name", "Unknown"),
         "tier_number": tier,
-        "estimated_reach": reach_estimates.get(tier, "Unknown"),
+        "estimated_reach": info.get("reach", "Unknown"),
         "domain": domain,
     }
@@ -0,0 +1,106 @@
+"""
+HTML extraction benchmark - single-pass parser vs. the previous regex passes
+
+Usage (from backend/):
+    python -m scripts.bench_html_extract [PAGES_DIR] [--repeat N]
+
+PAGES_DIR holds saved pages (*.html / *.htm). Without it a synthetic corpus
+is generated: a short article, a script-heavy news page and a multi-megabyte
+listing page.
+"""
+import argparse
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.html_extractor import extract_page  # noqa: E402
+
+MAX_CONTENT_LENGTH = 15000
+
+
+def regex_extract(html: str) -> Tuple[str, str]:
+    """The extractor this replaced (six re.sub passes plus two title searches)"""
+    title = "Untitled"
+    match = re.search(r'<title[^>]*>([^<]+)</title>', html, re.IGNORECASE)
+    if match:
+        title = match.group(1).strip()
+    else:
+        match = re.search(r'<meta[^>]*property=["\']og:title["\'][^>]*content=["\']([^"\']+)["\']', html, re.IGNORECASE)
+        if match:
+            title = match.group(1).strip()
+
+    html = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    html = re.sub(r'<nav[^>]*>.*?</nav>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    html = re.sub(r'<footer[^>]*>.*?</footer>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    text = re.sub(r'<[^>]+>', ' ', html)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return title, text[:MAX_CONTENT_LENGTH]
+
+
+def synthetic_corpus() -> Dict[str, str]:
+    paragraph = (
+        "<p>The athlete won the <b>national championship</b> in 2023, defeating the "
+        "defending champion in a unanimous decision that was covered by major outlets.</p>\n"
+    )
+    script = "<script>var data = " + "{\"k\": [1, 2, 3], \"v\": \"<div>x</div>\"}, " * 2000 + ";</script>\n"
+    nav = "<nav><ul>" + "<li><a href='/x'>Section</a></li>" * 300 + "</ul></nav>\n"
+    head = "<head><title>Champion profile</title><meta property='og:title' content='Profile'><style>body{}</style></head>"
+    return {
+        "article.html": f"<html>{head}<body>{nav}{paragraph * 40}<footer>(c) 2024</footer></body></html>",
+        "news_scripts.html": f"<html>{head}<body>{script * 5}{nav}{paragraph * 200}{script * 5}</body></html>",
+        "listing_large.html": f"<html>{head}<body>{(nav + script + paragraph * 50) * 40}</body></html>",
+    }
+
+
+def load_corpus(directory: str) -> Dict[str, str]:
+    pages = {}
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() in (".html", ".htm"):
+            pages[path.name] = path.read_text(encoding="utf-8", errors="replace")
+    return pages
+
+
+def time_call(fn, html: str, repeat: int) -> Tuple[float, Tuple[str, str]]:
+    samples: List[float] = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(html)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages_dir", nargs="?", help="Directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page (median is reported)")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.pages_dir) if args.pages_dir else synthetic_corpus()
+    if not pages:
+        print("No .html pages found")
+        return
+
+    print(f"{'page':32} {'size':>10} {'regex ms':>10} {'parser ms':>10} {'speedup':>8}  title")
+    total_regex = total_parser = 0.0
+    for name, html in pages.items():
+        regex_ms, _ = time_call(regex_extract, html, args.repeat)
+        parser_ms, (title, text) = time_call(lambda h: extract_page(h, MAX_CONTENT_LENGTH), html, args.repeat)
+        total_regex += regex_ms
+        total_parser += parser_ms
+        print(
+            f"{name[:32]:32} {len(html):>10,} {regex_ms:>10.2f} {parser_ms:>10.2f} "
+            f"{regex_ms / parser_ms if parser_ms else 0:>7.1f}x  {title[:40]}"
+        )
+
+    print(f"{'total':32} {'':>10} {total_regex:>10.2f} {total_parser:>10.2f} {total_regex / total_parser:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
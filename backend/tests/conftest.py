@@ -0,0 +1,38 @@
+"""
+Test setup - settings and local caches pointed at a temporary directory
+
+Environment variables are set here, before any test imports `app`, because
+settings and the module-level caches are created at import time.
+"""
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="visa-generator-tests-")
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["MISTRAL_API_KEY"] = ""
+
+# The prompt library is deployed separately; generators only need the names to exist
+try:
+    import app.prompts.system  # noqa: F401
+except ImportError:
+    system = types.ModuleType("app.prompts.system")
+    for name in (
+        "COMPREHENSIVE_ANALYSIS_SYSTEM",
+        "PUBLICATION_ANALYSIS_SYSTEM",
+        "TEMPLATE_ENFORCEMENT_PROMPT",
+        "LEGAL_BRIEF_SYSTEM",
+    ):
+        setattr(system, name, f"<{name}>")
+    prompts = types.ModuleType("app.prompts")
+    prompts.__path__ = []
+    prompts.system = system
+    sys.modules["app.prompts"] = prompts
+    sys.modules["app.prompts.system"] = system
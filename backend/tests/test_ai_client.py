@@ -0,0 +1,58 @@
+"""
+AI client - the shared evidence prefix is sent with a stable prompt cache breakpoint
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.services import ai_client
+from app.services.documents import doc1_comprehensive
+
+
+class FakeMessages:
+    """Stands in for AsyncAnthropic.messages, recording each request"""
+
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=f"part {len(self.requests)} text")],
+            usage=SimpleNamespace(input_tokens=10, cache_read_input_tokens=0, cache_creation_input_tokens=0),
+        )
+
+
+def test_doc1_parts_share_byte_identical_cached_prefix(monkeypatch):
+    messages = FakeMessages()
+    monkeypatch.setattr(ai_client, "claude_client", SimpleNamespace(messages=messages))
+    monkeypatch.setattr(ai_client, "llm_cache", None)
+
+    beneficiary = SimpleNamespace(
+        full_name="Jane Doe",
+        visa_type="O-1A",
+        profession="Machine learning research",
+        background_info=None,
+        additional_info=None,
+    )
+    base_context = "BENEFICIARY INFORMATION:\n- Name: Jane Doe\n\nKNOWLEDGE BASE:\n8 CFR 214.2(o)"
+
+    async def run():
+        part1 = await doc1_comprehensive.generate_part1(beneficiary, base_context)
+        await doc1_comprehensive.generate_part2(beneficiary, base_context, part1)
+
+    asyncio.run(run())
+
+    assert len(messages.requests) == 2
+    prefixes = []
+    for request in messages.requests:
+        content = request["messages"][0]["content"]
+        assert content[0]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in content[1]
+        prefixes.append(json.dumps(content[0], sort_keys=True).encode("utf-8"))
+
+    assert prefixes[0] == prefixes[1]
+    assert json.loads(prefixes[0])["text"] == base_context
+    assert messages.requests[0]["system"] == messages.requests[1]["system"]
+    # Only the part-specific instructions differ between the calls
+    assert messages.requests[0]["messages"][0]["content"][1] != messages.requests[1]["messages"][0]["content"][1]
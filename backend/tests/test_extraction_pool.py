@@ -0,0 +1,117 @@
+"""
+Extraction pool - timeouts, dead workers and pool restarts
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.services.extraction_pool import ExtractionError, ExtractionPool
+
+
+# Worker functions are module-level so spawned workers can import them
+
+def add(a, b):
+    return a + b
+
+
+def sleep_then_pid(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def crash():
+    os._exit(1)
+
+
+def run_out_of_memory():
+    raise MemoryError()
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(workers=2, timeout_seconds=30, memory_limit_mb=0)
+    yield pool
+    pool.shutdown()
+
+
+def test_runs_tasks_in_worker_processes(pool):
+    async def run():
+        return await asyncio.gather(pool.run(add, 1, 2), pool.run(sleep_then_pid, 0))
+
+    total, pid = asyncio.run(run())
+    assert total == 3
+    assert pid != os.getpid()
+    assert pool.stats()["completed"] == 2
+
+
+def test_timeout_restarts_pool_and_next_task_succeeds(pool):
+    async def run():
+        first_pid = await pool.run(sleep_then_pid, 0)  # start the workers first
+        pool.timeout_seconds = 0.5
+        with pytest.raises(ExtractionError, match="timed out"):
+            await pool.run(sleep_then_pid, 30)
+        pool.timeout_seconds = 30
+        return first_pid, await pool.run(sleep_then_pid, 0)
+
+    first_pid, next_pid = asyncio.run(run())
+    assert pool.timeouts == 1
+    assert pool.restarts == 1
+    assert next_pid != first_pid
+
+
+def test_dead_worker_raises_and_pool_recovers(pool):
+    async def run():
+        with pytest.raises(ExtractionError, match="worker died"):
+            await pool.run(crash)
+        return await pool.run(add, 2, 3)
+
+    assert asyncio.run(run()) == 5
+    assert pool.crashes == 1
+    assert pool.restarts == 1
+
+
+def test_memory_error_maps_to_extraction_error_without_restart(pool):
+    async def run():
+        with pytest.raises(ExtractionError, match="memory limit"):
+            await pool.run(run_out_of_memory)
+        return await pool.run(add, 1, 1)
+
+    assert asyncio.run(run()) == 2
+    assert pool.crashes == 1
+    assert pool.restarts == 0
+
+
+def test_task_on_a_pool_restarted_by_another_timeout_is_retried(pool):
+    async def run():
+        await asyncio.gather(pool.run(add, 0, 0), pool.run(add, 0, 0))  # start both workers
+        pool.timeout_seconds = 3
+
+        async def victim():
+            # Running when the other task's timeout kills the pool
+            await asyncio.sleep(2)
+            return await pool.run(sleep_then_pid, 1.5)
+
+        stuck = pool.run(sleep_then_pid, 30)
+        return await asyncio.gather(stuck, victim(), return_exceptions=True)
+
+    stuck, victim = asyncio.run(run())
+    assert isinstance(stuck, ExtractionError)
+    assert isinstance(victim, int)
+    assert pool.restarts == 1
+    assert pool.crashes == 0
+
+
+def test_named_pool_reports_its_own_failures():
+    pool = ExtractionPool(workers=1, timeout_seconds=30, memory_limit_mb=0, name="PDF rendering")
+
+    async def run():
+        with pytest.raises(ExtractionError, match="^PDF rendering worker died"):
+            await pool.run(crash)
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert pool.stats()["name"] == "PDF rendering"
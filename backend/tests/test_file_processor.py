@@ -0,0 +1,74 @@
+"""
+File processor - PDF extraction provenance and the extraction cache
+"""
+import asyncio
+
+import fitz  # PyMuPDF
+import pytest
+
+from app.config import settings
+from app.services import file_processor
+from app.services.extraction_pool import extraction_pool
+
+
+@pytest.fixture(autouse=True, scope="module")
+def shutdown_pool():
+    yield
+    extraction_pool.shutdown()
+
+
+def scanned_bundle(marker: str) -> bytes:
+    """A text page followed by two pages without a text layer"""
+    pdf = fitz.open()
+    page = pdf.new_page()
+    page.insert_textbox(page.rect + (72, 72, -72, -72), f"Recommendation letter {marker}. " * 8)
+    pdf.new_page()
+    pdf.new_page()
+    return pdf.tobytes()
+
+
+def fake_ocr(results):
+    async def ocr(image_data, filename):
+        return results[filename.rsplit("_page_", 1)[1].split(".")[0]]
+    return ocr
+
+
+def test_blank_scanned_page_is_cached(monkeypatch):
+    monkeypatch.setattr(settings, "MISTRAL_API_KEY", "test-key")
+    monkeypatch.setattr(file_processor, "extract_with_mistral_vision", fake_ocr({"1": "", "2": "Signed: J. Doe"}))
+    content = scanned_bundle("blank-page")
+
+    async def run():
+        return await file_processor.process_file("bundle.pdf", content), await file_processor.process_file("bundle.pdf", content)
+
+    first, second = asyncio.run(run())
+    assert [p["source"] for p in first["pages"]] == ["text", "ocr", "ocr"]
+    assert "Signed: J. Doe" in first["extracted_text"]
+    assert not first["cache_hit"]
+    assert second["cache_hit"]
+    assert second["extracted_text"] == first["extracted_text"]
+
+
+def test_failed_ocr_page_is_not_cached(monkeypatch):
+    monkeypatch.setattr(settings, "MISTRAL_API_KEY", "test-key")
+    monkeypatch.setattr(file_processor, "extract_with_mistral_vision", fake_ocr({"1": None, "2": "Signed: J. Doe"}))
+    content = scanned_bundle("failed-page")
+
+    async def run():
+        return await file_processor.process_file("bundle.pdf", content), await file_processor.process_file("bundle.pdf", content)
+
+    first, second = asyncio.run(run())
+    assert [p["source"] for p in first["pages"]] == ["text", "ocr_failed", "ocr"]
+    assert not second["cache_hit"]
+
+
+def test_scanned_pages_without_ocr_key_are_not_cached(monkeypatch):
+    monkeypatch.setattr(settings, "MISTRAL_API_KEY", "")
+    content = scanned_bundle("no-key")
+
+    async def run():
+        return await file_processor.process_file("bundle.pdf", content), await file_processor.process_file("bundle.pdf", content)
+
+    first, second = asyncio.run(run())
+    assert [p["source"] for p in first["pages"]] == ["text", "ocr_unavailable", "ocr_unavailable"]
+    assert not second["cache_hit"]
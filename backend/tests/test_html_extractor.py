@@ -0,0 +1,22 @@
+"""
+HTML extractor - title and text selection
+"""
+from app.services.html_extractor import extract_page
+
+
+def test_svg_title_is_not_the_page_title():
+    html = '<svg><title>icon</title></svg><p>Award announcement</p>'
+    assert extract_page(html, 1000) == ("Untitled", "Award announcement")
+
+
+def test_og_title_beats_svg_title():
+    html = (
+        '<html><head><meta property="og:title" content="Jane Doe Wins Prize"></head>'
+        '<body><svg><title>search icon</title><path d=""/></svg><p>Story</p></body></html>'
+    )
+    assert extract_page(html, 1000) == ("Jane Doe Wins Prize", "Story")
+
+
+def test_head_title_still_used():
+    html = '<html><head><title>Real  Title</title></head><body><svg><title>x</title></svg>Body</body></html>'
+    assert extract_page(html, 1000) == ("Real Title", "Body")
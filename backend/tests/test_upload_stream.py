@@ -0,0 +1,159 @@
+"""
+Upload stream - /api/upload limits, NDJSON events and temp file cleanup
+"""
+import asyncio
+import json
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.config import settings
+from app.main import app
+from app.services import upload_stream
+from app.services.upload_stream import SpooledUpload, discard_abandoned, process_uploads
+
+BOUNDARY = "test-boundary"
+MB = 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def upload_limits(monkeypatch, tmp_path):
+    """Small limits, every file spooled to disk, temp files under tmp_path"""
+    monkeypatch.setattr(settings, "UPLOAD_MAX_FILE_MB", 1)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_TOTAL_MB", 3)
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_MB", 0)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+def text_file(name: str, words: int) -> tuple:
+    return ("files", (name, (" ".join(["evidence"] * words)).encode(), "text/plain"))
+
+
+def test_file_over_size_limit_is_reported_as_failed(client, upload_limits):
+    response = client.post("/api/upload", files=[
+        text_file("letter.txt", 50),
+        ("files", ("huge.txt", b"x" * (MB + MB // 2), "text/plain")),
+    ])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [f["filename"] for f in body["files"]] == ["letter.txt"]
+    assert body["files"][0]["word_count"] == 50
+    assert [f["filename"] for f in body["failed"]] == ["huge.txt"]
+    assert "1 MB limit" in body["failed"][0]["error"]
+    assert list(upload_limits.iterdir()) == []
+
+
+def test_content_length_over_total_limit_is_rejected(client, upload_limits):
+    response = client.post("/api/upload", files=[
+        ("files", (f"part{i}.txt", b"x" * (MB - 1024), "text/plain")) for i in range(4)
+    ])
+
+    assert response.status_code == 413
+    assert "3 MB limit" in response.json()["detail"]
+    assert list(upload_limits.iterdir()) == []
+
+
+def test_ndjson_reports_each_file_with_its_index_then_done(client, upload_limits):
+    names = ["a.txt", "b.txt", "c.txt"]
+    response = client.post(
+        "/api/upload",
+        files=[text_file(name, 10 * (i + 1)) for i, name in enumerate(names)],
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    files = sorted((e for e in events if e["event"] == "file"), key=lambda e: e["index"])
+    assert [(e["index"], e["filename"], e["word_count"]) for e in files] == [
+        (0, "a.txt", 10), (1, "b.txt", 20), (2, "c.txt", 30),
+    ]
+    assert events[-1] == {"event": "done", "processed": 3, "failed": 0}
+    assert list(upload_limits.iterdir()) == []
+
+
+def multipart_body(files) -> bytes:
+    parts = []
+    for name, content in files:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+            f"Content-Type: text/plain\r\n\r\n".encode() + content + b"\r\n"
+        )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def streaming_request(chunks) -> Request:
+    """A request whose body arrives in `chunks`, then stalls like a slow client"""
+    body_size = sum(len(chunk) for chunk in chunks)
+    pending = list(chunks)
+
+    async def receive():
+        if pending:
+            return {"type": "http.request", "body": pending.pop(0), "more_body": True}
+        await asyncio.sleep(3600)
+
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/api/upload",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+            (b"content-length", str(body_size + 100).encode()),
+        ],
+    }, receive)
+
+
+def test_abandoned_upload_leaves_no_temp_files(monkeypatch, upload_limits):
+    async def slow_process_file(filename, content=None, path=None, sha256=None):
+        if filename != "first.txt":
+            await asyncio.sleep(3600)
+        return {"filename": filename, "file_type": "txt", "extracted_text": "ok",
+                "word_count": 1, "page_count": 1, "cache_hit": False}
+
+    monkeypatch.setattr(upload_stream, "process_file", slow_process_file)
+    body = multipart_body([("first.txt", b"one"), ("second.txt", b"two"), ("third.txt", b"three")])
+    # The last file's closing boundary never arrives: it is still being received
+    request = streaming_request([body[:-len(f"--{BOUNDARY}--\r\n") - 4]])
+
+    async def run():
+        events = process_uploads(request)
+        first = await events.__anext__()
+        assert first["event"] == "file" and first["filename"] == "first.txt"
+        assert len(list(upload_limits.iterdir())) >= 1
+        await events.aclose()
+
+    asyncio.run(run())
+    assert list(upload_limits.iterdir()) == []
+
+
+def test_upload_whose_task_was_cancelled_before_starting_is_discarded(upload_limits):
+    async def run():
+        upload = SpooledUpload("late.pdf", spool_bytes=0, max_bytes=MB)
+        await upload.write(b"%PDF-1.4 spooled")
+        await upload.finish()
+        assert upload.path is not None
+
+        async def handle():
+            try:
+                await asyncio.sleep(3600)
+            finally:
+                await upload.discard()
+
+        task = asyncio.create_task(handle())
+        task.cancel()  # before its first step: handle()'s finally never runs
+        ingest = asyncio.create_task(asyncio.sleep(0))
+        await discard_abandoned(ingest, [task], [upload])
+        return upload.path
+
+    assert asyncio.run(run()) is None
+    assert list(upload_limits.iterdir()) == []
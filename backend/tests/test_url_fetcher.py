@@ -0,0 +1,36 @@
+"""
+URL fetcher - origin fetches, extraction and the URL cache
+"""
+import asyncio
+
+import httpx
+
+from app.services.url_fetcher import fetch_single_url
+
+PAGE = b"<html><head><title>Award Announcement</title></head><body><p>Jane Doe won the national prize.</p></body></html>"
+
+
+def test_response_without_content_type_is_fetched_then_served_from_cache():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=PAGE)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            first = await fetch_single_url(client, "https://news.example.com/no-content-type")
+            second = await fetch_single_url(client, "https://news.example.com/no-content-type")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert "content-type" not in {name.lower() for name in httpx.Response(200, content=PAGE).headers}
+    assert first.success, first.error
+    assert first.cache_status == "miss"
+    assert first.title == "Award Announcement"
+    assert "national prize" in first.content
+    assert second.success
+    assert second.cache_status == "fresh"
+    assert second.content == first.content
+    assert len(requests) == 1